@@ -30,6 +30,8 @@ INSTALLED_APPS = [
     'keyword_research',
     'gap_analysis',
     'billing',
+    'ai_analyzer',
+    'serp',
     # Third-party
     'channels',
     'defender',
@@ -115,8 +117,49 @@ APIFY_TOKEN = config('APIFY_TOKEN', default='')
 SERPER_API_KEY = config('SERPER_API_KEY', default='')
 
 # ✅ انتخاب SERP API Provider
-# گزینه‌ها: 'serper' یا 'apify'
+# گزینه‌ها: 'serper'، 'apify' یا 'fake' (محلی، بدون هزینه)
 SERP_PROVIDER = config('SERP_PROVIDER', default='serper')
+SERP_MAX_QPS = config('SERP_MAX_QPS', default=45, cast=int)  # سقف مشترک همه Worker ها (Serper)
+SERP_CONCURRENCY = config('SERP_CONCURRENCY', default=50, cast=int)  # Query همزمان در هر Task
+SERP_REQUEST_TIMEOUT = config('SERP_REQUEST_TIMEOUT', default=30, cast=int)  # ثانیه
+SERP_MAX_RETRIES = config('SERP_MAX_RETRIES', default=3, cast=int)
+APIFY_MAX_CONCURRENT_RUNS = config('APIFY_MAX_CONCURRENT_RUNS', default=5, cast=int)  # Run همزمان در هر Task
+APIFY_MAX_PAGES_PER_QUERY = config('APIFY_MAX_PAGES_PER_QUERY', default=2, cast=int)
+APIFY_QUERIES_PER_RUN = config('APIFY_QUERIES_PER_RUN', default=200, cast=int)  # Query در هر Actor Run
+SERP_FAKE_DELAY = config('SERP_FAKE_DELAY', default=0.0, cast=float)  # تاخیر هر Query در Provider fake
+# 'direct': هر Task خودش Query میزنه | 'stream': از طریق SERP Dispatcher مرکزی (python manage.py serp_dispatcher)
+SERP_DISPATCH_MODE = config('SERP_DISPATCH_MODE', default='direct')
+SERP_DISPATCH_MAX_INFLIGHT = config('SERP_DISPATCH_MAX_INFLIGHT', default=100, cast=int)  # Query همزمان Dispatcher
+SERP_DISPATCH_TIMEOUT = config('SERP_DISPATCH_TIMEOUT', default=120, cast=int)  # Dispatcher بدون Heartbeat → خطا (ثانیه)
+SERP_DISPATCH_RESULT_TTL = config('SERP_DISPATCH_RESULT_TTL', default=3600, cast=int)  # عمر لیست نتایج هر Job (ثانیه)
+SERP_DISPATCH_CLAIM_IDLE = config('SERP_DISPATCH_CLAIM_IDLE', default=60, cast=int)  # Query Ack نشده → اجرای دوباره (ثانیه)
+SERP_DISPATCH_LINGER = config('SERP_DISPATCH_LINGER', default=1.0, cast=float)  # حداکثر انتظار برای Batch کامل Provider (ثانیه)
+GAP_SERP_PROVIDER = config('GAP_SERP_PROVIDER', default='serper')  # Provider تحلیل گپ (Async، همزمان)
+GAP_DEEP_SERP_DEPTH = config('GAP_DEEP_SERP_DEPTH', default=100, cast=int)  # حالت reuse: تعداد نتایج SERP هر کلمه
+GAP_DEEP_QUERY_CREDITS = config('GAP_DEEP_QUERY_CREDITS', default=2, cast=int)  # کردیت هر SERP عمیق
+GAP_REUSE_FALLBACK = config('GAP_REUSE_FALLBACK', default=True, cast=bool)  # رقبای پیدا نشده → Query برند
+GAP_BULK_CHUNK_SIZE = config('GAP_BULK_CHUNK_SIZE', default=2000, cast=int)  # ردیف در هر Transaction ذخیره نتایج
+GAP_CHECKPOINT_QUERIES = config('GAP_CHECKPOINT_QUERIES', default=200, cast=int)  # Query در هر Checkpoint (بعد از Restart حداکثر همینقدر دوباره جستجو میشه)
+GAP_HEARTBEAT_INTERVAL = config('GAP_HEARTBEAT_INTERVAL', default=30, cast=int)  # ثانیه
+GAP_LEASE_TIMEOUT = config('GAP_LEASE_TIMEOUT', default=120, cast=int)  # Heartbeat قدیمی‌تر از این = Task مرده (ثانیه)
+GAP_RESUME_INTERVAL = config('GAP_RESUME_INTERVAL', default=60, cast=int)  # فاصله چک درخواست‌های متوقف شده (Celery Beat)
+GAP_SHARD_KEYWORDS = config('GAP_SHARD_KEYWORDS', default=500, cast=int)  # حداقل کلمه هر Shard (0 = بدون Shard)
+GAP_MAX_SHARDS = config('GAP_MAX_SHARDS', default=32, cast=int)  # سقف Shard همزمان یک درخواست (= کل ظرفیت Worker ها)
+GAP_SHARD_QUEUE_TIMEOUT = config('GAP_SHARD_QUEUE_TIMEOUT', default=3600, cast=int)  # Shard های در صف: حداکثر انتظار بین شروع Shard ها (ثانیه)
+
+# ✅ گزارش پیشرفت Task ها (Result Backend + WebSocket)
+PROGRESS_MIN_INTERVAL = config('PROGRESS_MIN_INTERVAL', default=0.5, cast=float)  # حداقل فاصله دو انتشار (ثانیه)
+PROGRESS_MIN_STEP = config('PROGRESS_MIN_STEP', default=0.01, cast=float)  # حداقل پیشرفت بین دو انتشار (کسری از کل)
+
+# ✅ موتور خوشه‌بندی PKW/AKW
+# گزینه‌ها: 'exact'، 'approx' (MinHash/LSH) یا 'auto' (تقریبی از CLUSTERING_APPROX_MIN_KEYWORDS به بالا)
+CLUSTERING_MODE = config('CLUSTERING_MODE', default='auto')
+CLUSTERING_APPROX_MIN_KEYWORDS = config('CLUSTERING_APPROX_MIN_KEYWORDS', default=100000, cast=int)
+CLUSTERING_LSH_BANDS = config('CLUSTERING_LSH_BANDS', default=32, cast=int)
+CLUSTERING_LSH_ROWS = config('CLUSTERING_LSH_ROWS', default=2, cast=int)
+# پردازش موازی مؤلفه‌ها (0 = تعداد هسته‌های CPU)
+CLUSTERING_WORKERS = config('CLUSTERING_WORKERS', default=0, cast=int)
+CLUSTERING_PARALLEL_MIN_KEYWORDS = config('CLUSTERING_PARALLEL_MIN_KEYWORDS', default=20000, cast=int)
 
 # Celery Configuration
 CELERY_BROKER_URL = 'redis://127.0.0.1:6379/0'
@@ -136,6 +179,14 @@ CELERY_TASK_DEFAULT_QUEUE = 'chaboktool_queue'
 CELERY_TASK_DEFAULT_EXCHANGE = 'chaboktool_exchange'
 CELERY_TASK_DEFAULT_ROUTING_KEY = 'chaboktool'
 
+# ✅ Celery Beat: ادامه خودکار Gap Analysis هایی که Worker شون کشته شده
+CELERY_BEAT_SCHEDULE = {
+    'resume-stale-gap-requests': {
+        'task': 'gap_analysis.tasks.resume_stale_gap_requests',
+        'schedule': GAP_RESUME_INTERVAL,
+    },
+}
+
 # Login Settings
 LOGIN_URL = 'signin'
 LOGIN_REDIRECT_URL = 'index'
@@ -155,8 +206,41 @@ GEMINI_API_KEY = config('GEMINI_API_KEY', default='')
 OPENAI_API_KEY = config('OPENAI_API_KEY', default='')
 ANTHROPIC_API_KEY = config('ANTHROPIC_API_KEY', default='')
 
-# Rate Limiting
-AI_RATE_LIMIT_DELAY = config('AI_RATE_LIMIT_DELAY', default=4, cast=int)
+# HTTP Providers (Base URL قابل تغییر برای Proxy / سرور Fake)
+OPENAI_BASE_URL = config('OPENAI_BASE_URL', default='https://api.openai.com/v1')
+OPENAI_MODEL = config('OPENAI_MODEL', default='gpt-4o-mini')
+ANTHROPIC_BASE_URL = config('ANTHROPIC_BASE_URL', default='https://api.anthropic.com')
+ANTHROPIC_MODEL = config('ANTHROPIC_MODEL', default='claude-3-5-haiku-latest')
+AI_REQUEST_TIMEOUT = config('AI_REQUEST_TIMEOUT', default=60, cast=int)
+
+# Failover / Hedging
+AI_FALLBACK_PROVIDERS = config('AI_FALLBACK_PROVIDERS', default='')  # مثلاً: gpt,claude
+AI_LATENCY_SLO = config('AI_LATENCY_SLO', default=20, cast=float)  # ثانیه (تک Keyword)
+AI_BATCH_LATENCY_SLO = config('AI_BATCH_LATENCY_SLO', default=60, cast=float)  # ثانیه (Batch)
+AI_HEDGE_ENABLED = config('AI_HEDGE_ENABLED', default=False, cast=bool)  # بعد از p95 از Provider بعدی هم بپرس
+AI_FAILOVER_COOLDOWN = config('AI_FAILOVER_COOLDOWN', default=60, cast=int)  # ثانیه کنار گذاشتن Provider خراب
+
+# Rate Limiting (مشترک بین همه Worker ها از طریق Redis)
+AI_MAX_RPM = config('AI_MAX_RPM', default=15, cast=int)  # Requests per minute
+AI_MAX_TPM = config('AI_MAX_TPM', default=1000000, cast=int)  # Tokens per minute
+AI_CONCURRENCY = config('AI_CONCURRENCY', default=8, cast=int)  # فراخوانی همزمان در هر Task
+AI_BATCH_SIZE = config('AI_BATCH_SIZE', default=20, cast=int)  # تعداد Keyword در هر Prompt (1 = بدون Batch)
+AI_CHUNK_SIZE = config('AI_CHUNK_SIZE', default=500, cast=int)  # تعداد PKW در هر Task صف AI
+AI_CHUNK_TIME_LIMIT = config('AI_CHUNK_TIME_LIMIT', default=1800, cast=int)  # ثانیه (Soft؛ Hard = +60)
+AI_STALE_TIMEOUT = config('AI_STALE_TIMEOUT', default=21600, cast=int)  # ثانیه بدون فعالیت Chunk → تکمیل درخواست با نتایج موجود
+AI_STALE_CHECK_INTERVAL = config('AI_STALE_CHECK_INTERVAL', default=300, cast=int)  # فاصله چک (Celery Beat)
+AI_CACHE_TTL_DAYS = config('AI_CACHE_TTL_DAYS', default=30, cast=int)  # عمر کش نتایج AI (0 = غیرفعال)
+AI_HEURISTIC_ENABLED = config('AI_HEURISTIC_ENABLED', default=True, cast=bool)  # تشخیص محلی SERP های واضح
+AI_HEURISTIC_MIN_CONFIDENCE = config('AI_HEURISTIC_MIN_CONFIDENCE', default=0.8, cast=float)  # کمتر از این میره سراغ LLM
+AI_INTENT_MODEL_ENABLED = config('AI_INTENT_MODEL_ENABLED', default=True, cast=bool)  # مدل محلی (manage.py train_intent_model)
+AI_INTENT_MODEL_PATH = config('AI_INTENT_MODEL_PATH', default=str(BASE_DIR / 'ai_analyzer' / 'intent_model.npz'))
+AI_INTENT_MODEL_MIN_CONFIDENCE = config('AI_INTENT_MODEL_MIN_CONFIDENCE', default=0.9, cast=float)  # کمتر از این میره سراغ LLM
+
+# ✅ Celery Beat: تکمیل درخواست‌هایی که Chunk AI شون گم شده (Chord هیچ‌وقت تموم نمیشه)
+CELERY_BEAT_SCHEDULE['finish-stale-ai-analysis'] = {
+    'task': 'ai_analyzer.tasks.finish_stale_ai_analysis',
+    'schedule': AI_STALE_CHECK_INTERVAL,
+}
 
 # ✅ Redis Configuration (اضافه کن)
 REDIS_HOST = config('REDIS_HOST', default='localhost')
@@ -274,5 +358,10 @@ LOGGING = {
             'level': 'WARNING',
             'propagate': False,
         },
+        'keyword_research': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
     },
 }
\ No newline at end of file
@@ -148,6 +148,8 @@ urlpatterns = [
     path('gap-analysis/', include('gap_analysis.urls')),
     # billing routes ✅ جدید
     path('billing/', include('billing.urls')),
+    # ai usage routes
+    path('ai/', include('ai_analyzer.urls')),
     # Login/Logout URLs
     path('accounts/login/', accounts_views.signin_view, name='login'),
 ]
\ No newline at end of file
@@ -0,0 +1,21 @@
+from django.contrib import admin
+from .models import IntentCache, AIUsageRecord
+
+
+@admin.register(IntentCache)
+class IntentCacheAdmin(admin.ModelAdmin):
+    list_display = ['keyword', 'search_intent', 'intent_mapping', 'provider', 'model_name', 'created_date']
+    list_filter = ['provider', 'model_name', 'created_date']
+    search_fields = ['keyword']
+    readonly_fields = ['created_date']
+
+
+@admin.register(AIUsageRecord)
+class AIUsageRecordAdmin(admin.ModelAdmin):
+    list_display = ['id', 'request', 'provider', 'kind', 'keywords_count', 'input_tokens', 'output_tokens',
+                    'cost', 'latency_ms', 'cache_hits', 'local_hits', 'success', 'created_date']
+    list_filter = ['provider', 'model_name', 'kind', 'success', 'created_date']
+    search_fields = ['request__name', 'request__user__username']
+    readonly_fields = ['created_date']
+    raw_id_fields = ['request']
+    date_hierarchy = 'created_date'
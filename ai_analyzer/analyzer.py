@@ -2,31 +2,58 @@
 Main AI Analyzer
 """
 
+from decouple import RepositoryEnv
 from django.conf import settings
-from keyword_research.models import Keyword
+from keyword_research.models import Keyword, ResearchRequest
+from .heuristics import classify_confident
+from .intent_model import predict_confident
+from .cache import get_cached_intents, store_intents, evict_expired_intents
+from .providers import BatchRequestError
+from .rate_limiter import LLMRateLimiter
+from .usage import save_usage
+import asyncio
+import hashlib
 import time
+from collections import Counter
+from pathlib import Path
 
 
-def get_ai_provider():
-    """انتخاب Provider"""
+_CREDENTIAL_SETTINGS = ('GEMINI_API_KEY', 'OPENAI_API_KEY', 'ANTHROPIC_API_KEY')
+
+
+def _credential(name):
+    """
+    کلید API در لحظه فراخوانی (نه مقدار settings که یک بار موقع Import خونده شده)
+
+    ✅ فایل BASE_DIR/.env هر بار دوباره خونده میشه و بر settings (و Environment Process) مقدمه:
+    چرخش کلید = ویرایش .env، بدون Restart Worker. اگه کلید اونجا نبود، مقدار settings
+    (کلیدی که فقط در Environment تعریف شده تا Restart Worker همون مقدار قبلی می‌مونه).
+    """
+    env_path = Path(settings.BASE_DIR) / '.env'
+    if env_path.is_file():
+        value = RepositoryEnv(env_path).data.get(name)
+        if value:
+            return value
+    return getattr(settings, name, '')
+
+
+def _build_provider(provider_name):
     from .providers import GeminiProvider, GPTProvider, ClaudeProvider
     
-    provider_name = getattr(settings, 'AI_PROVIDER', 'gemini')
-    
     if provider_name == 'gemini':
-        api_key = getattr(settings, 'GEMINI_API_KEY', '')
+        api_key = _credential('GEMINI_API_KEY')
         if not api_key:
             raise ValueError("GEMINI_API_KEY is not set")
         return GeminiProvider(api_key)
     
     elif provider_name == 'gpt':
-        api_key = getattr(settings, 'OPENAI_API_KEY', '')
+        api_key = _credential('OPENAI_API_KEY')
         if not api_key:
             raise ValueError("OPENAI_API_KEY is not set")
         return GPTProvider(api_key)
     
     elif provider_name == 'claude':
-        api_key = getattr(settings, 'ANTHROPIC_API_KEY', '')
+        api_key = _credential('ANTHROPIC_API_KEY')
         if not api_key:
             raise ValueError("ANTHROPIC_API_KEY is not set")
         return ClaudeProvider(api_key)
@@ -35,61 +62,345 @@ def get_ai_provider():
         raise ValueError(f"Unknown AI provider: {provider_name}")
 
 
-def analyze_all_pkw(research_request, worker_name="", task_id_short=""):
-    """تحلیل همه PKW ها"""
+# ✅ Provider مشترک هر Worker Process (Connection های HTTP/gRPC بین Task ها گرم می‌مونن)
+_PROVIDER_CACHE = {}
+
+# هر تغییری در این تنظیمات (یا کلیدهای _CREDENTIAL_SETTINGS) Provider جدید می‌سازه
+_PROVIDER_SETTINGS = (
+    'AI_PROVIDER', 'AI_FALLBACK_PROVIDERS',
+    'OPENAI_BASE_URL', 'OPENAI_MODEL', 'ANTHROPIC_BASE_URL', 'ANTHROPIC_MODEL', 'AI_REQUEST_TIMEOUT',
+    'AI_LATENCY_SLO', 'AI_BATCH_LATENCY_SLO', 'AI_HEDGE_ENABLED', 'AI_FAILOVER_COOLDOWN',
+)
+
+
+def _provider_cache_key():
+    values = [repr(getattr(settings, name, None)) for name in _PROVIDER_SETTINGS]
+    values += [repr(_credential(name)) for name in _CREDENTIAL_SETTINGS]
+    return hashlib.sha256("\n".join(values).encode('utf-8')).hexdigest()
+
+
+def get_ai_provider():
+    """
+    Provider کش‌شده این Process
+
+    اگه تنظیمات/کلیدها عوض شده باشن، یا Provider قبلی خطای 401/403 گرفته باشه، دوباره ساخته میشه.
+    """
+    key = _provider_cache_key()
+    provider = _PROVIDER_CACHE.get(key)
     
-    if not getattr(settings, 'AI_ENABLED', False):
-        print(f"[{worker_name}] [{task_id_short}] ⚠️ AI disabled")
-        return
+    if provider is not None and provider.auth_failed:
+        print(f"🔑 [{provider.NAME}] Authentication failed → rebuilding provider with current credentials")
+        provider = None
     
-    try:
-        provider = get_ai_provider()
-    except Exception as e:
-        print(f"[{worker_name}] [{task_id_short}] ❌ Provider init failed: {str(e)}")
-        return
+    if provider is None:
+        for old_provider in _PROVIDER_CACHE.values():
+            try:
+                _run_async(old_provider.close())
+            except Exception as e:
+                print(f"⚠️ Provider close failed: {str(e)}")
+        _PROVIDER_CACHE.clear()
+        
+        provider = _create_ai_provider()
+        _PROVIDER_CACHE[key] = provider
+    
+    return provider
+
+
+def _create_ai_provider():
+    """انتخاب Provider (با AI_FALLBACK_PROVIDERS → Router با Failover/Hedge)"""
+    from .router import ProviderRouter
+    
+    provider_name = getattr(settings, 'AI_PROVIDER', 'gemini')
+    primary = _build_provider(provider_name)
+    
+    fallback_names = [
+        name.strip() for name in getattr(settings, 'AI_FALLBACK_PROVIDERS', '').split(',')
+        if name.strip() and name.strip() != provider_name
+    ]
+    
+    fallbacks = []
+    for name in fallback_names:
+        try:
+            fallbacks.append(_build_provider(name))
+        except ValueError as e:
+            print(f"⚠️ Fallback provider '{name}' skipped: {str(e)}")
+    
+    if not fallbacks:
+        return primary
+    
+    return ProviderRouter([primary, *fallbacks])
+
+
+# ✅ Event Loop ثابت برای هر Process (Client های gRPC/HTTP به Loop خودشون وابسته هستن)
+_EVENT_LOOP = None
+
+
+def _run_async(coro):
+    global _EVENT_LOOP
+    if _EVENT_LOOP is None or _EVENT_LOOP.is_closed():
+        _EVENT_LOOP = asyncio.new_event_loop()
+    return _EVENT_LOOP.run_until_complete(coro)
+
+
+STAT_KEYS = ('total', 'no_links', 'heuristic', 'cache', 'model', 'llm', 'llm_failed')
+
+
+def merge_ai_stats(chunk_stats):
+    """جمع آمار Chunk ها"""
+    merged = dict.fromkeys(STAT_KEYS, 0)
+    for stats in chunk_stats:
+        for key in STAT_KEYS:
+            merged[key] += (stats or {}).get(key, 0)
+    return merged
+
+
+def save_ai_stats(research_request, chunk_stats):
+    stats = merge_ai_stats(chunk_stats)
+    evict_expired_intents()
+    
+    # ✅ update مستقیم (بدون post_save سیگنال)
+    ResearchRequest.objects.filter(pk=research_request.pk).update(ai_stats=stats)
+    research_request.ai_stats = stats
+    return stats
+
+
+def recount_ai_stats(research_request):
+    """
+    آمار AI از روی برچسب‌های ذخیره شده (وقتی آمار Chunk ها در دسترس نیست، مثلاً Chunk گم شده)
+
+    PKW هایی که تحلیل نشدن N/A میشن و در llm_failed شمرده میشن.
+    """
+    pkw_keywords = Keyword.objects.filter(request=research_request, status=1)
+    pkw_keywords.filter(search_intent__isnull=True).update(search_intent="N/A", intent_mapping="N/A")
+    
+    sources = Counter(pkw_keywords.values_list('intent_source', flat=True))
+    stats = dict.fromkeys(STAT_KEYS, 0)
+    stats['total'] = sum(sources.values())
+    for key in ('heuristic', 'cache', 'model', 'llm'):
+        stats[key] = sources[key]
+    stats['llm_failed'] = stats['total'] - sum(sources[key] for key in ('heuristic', 'cache', 'model', 'llm'))
     
-    pkw_keywords = Keyword.objects.filter(request=research_request, status=1).order_by('id')
-    total_pkw = pkw_keywords.count()
+    ResearchRequest.objects.filter(pk=research_request.pk).update(ai_stats=stats)
+    research_request.ai_stats = stats
+    return stats
+
+
+def analyze_pkw_chunk(research_request, pkw_ids, worker_name="", task_id_short=""):
+    """
+    تحلیل یک دسته از PKW ها (همزمان، با Rate Limiter مشترک RPM/TPM)
+
+    ترتیب: Heuristic → کش → مدل محلی → LLM
+
+    Returns:
+        dict: آمار این دسته (کلیدهای STAT_KEYS)
+    """
+    
+    pkw_keywords = list(
+        Keyword.objects.filter(request=research_request, id__in=pkw_ids).order_by('id').only('id', 'keyword', 'links', 'meta_titles')
+    )
+    total_pkw = len(pkw_keywords)
     
     print(f"[{worker_name}] [{task_id_short}] 🤖 AI Analysis: {total_pkw} PKW")
     
     ai_start_time = time.time()
     
-    for index, pkw in enumerate(pkw_keywords, 1):
-        try:
-            keyword = pkw.keyword
-            
-            if pkw.links and pkw.links != "خطا":
-                links = pkw.links.split(" -------------- ")[:10]
-            else:
-                links = []
-            
-            if not links:
-                print(f"[{worker_name}] [{task_id_short}] ⚠️ [{index}/{total_pkw}] No links: {keyword}")
-                pkw.search_intent = "N/A"
-                pkw.intent_mapping = "N/A"
-                pkw.save()
-                continue
-            
-            print(f"[{worker_name}] [{task_id_short}] 🤖 [{index}/{total_pkw}] {keyword}")
-            
-            search_intent, intent_mapping = provider.analyze(keyword, links, [])
-            
-            pkw.search_intent = search_intent
-            pkw.intent_mapping = intent_mapping
-            pkw.save()
-            
-            print(f"[{worker_name}] [{task_id_short}] ✅ {search_intent} | {intent_mapping}")
-            
-            # Rate Limit
-            delay = getattr(settings, 'AI_RATE_LIMIT_DELAY', 4)
-            time.sleep(delay)
+    items = []
+    stats = dict.fromkeys(STAT_KEYS, 0)
+    stats['total'] = total_pkw
+    for pkw in pkw_keywords:
+        if pkw.links and pkw.links != "خطا":
+            links = pkw.links.split(" -------------- ")[:10]
+        else:
+            links = []
+        
+        if not links:
+            print(f"[{worker_name}] [{task_id_short}] ⚠️ No links: {pkw.keyword}")
+            pkw.search_intent = "N/A"
+            pkw.intent_mapping = "N/A"
+            pkw.intent_source = None
+            stats['no_links'] += 1
+            continue
         
+        # ✅ اول SERP های واضح (همه محصول / همه دسته / همه بلاگ) بدون LLM
+        titles = pkw.meta_titles.split("\n")[:10] if pkw.meta_titles else []
+        local_result = classify_confident(links, titles)
+        if local_result:
+            pkw.search_intent, pkw.intent_mapping = local_result
+            pkw.intent_source = 'heuristic'
+            stats['heuristic'] += 1
+        else:
+            items.append((pkw, links, titles))
+    
+    print(f"[{worker_name}] [{task_id_short}] 🧮 Heuristic: {stats['heuristic']} resolved locally")
+    
+    # ✅ بعد کش (همون Keyword با همون SERP قبلاً تحلیل شده)
+    cached = get_cached_intents([(pkw.keyword, links) for pkw, links, _ in items])
+    for i, (search_intent, intent_mapping) in cached.items():
+        pkw = items[i][0]
+        pkw.search_intent = search_intent
+        pkw.intent_mapping = intent_mapping
+        pkw.intent_source = 'cache'
+    stats['cache'] = len(cached)
+    
+    items = [item for i, item in enumerate(items) if i not in cached]
+    print(f"[{worker_name}] [{task_id_short}] 💾 AI Cache: {len(cached)} hit, {len(items)} miss")
+    
+    # ✅ بعد مدل محلی (آموزش‌دیده روی برچسب های قبلی LLM)؛ فقط پیش‌بینی های مطمئن
+    predicted = predict_confident([(pkw.keyword, links, titles) for pkw, links, titles in items])
+    for i, (search_intent, intent_mapping) in predicted.items():
+        pkw = items[i][0]
+        pkw.search_intent = search_intent
+        pkw.intent_mapping = intent_mapping
+        pkw.intent_source = 'model'
+    stats['model'] = len(predicted)
+    
+    misses = [(pkw, links) for i, (pkw, links, _) in enumerate(items) if i not in predicted]
+    print(f"[{worker_name}] [{task_id_short}] 🧠 Local Model: {len(predicted)} resolved, {len(misses)} → LLM")
+    
+    provider = None
+    if misses:
+        try:
+            provider = get_ai_provider()
         except Exception as e:
-            print(f"[{worker_name}] [{task_id_short}] ❌ {keyword}: {str(e)}")
+            print(f"[{worker_name}] [{task_id_short}] ❌ Provider init failed: {str(e)}")
+    
+    if provider is None:
+        # بدون Provider فقط نتایج Heuristic و کش ذخیره میشن
+        for pkw, _ in misses:
             pkw.search_intent = "N/A"
             pkw.intent_mapping = "N/A"
-            pkw.save()
+            pkw.intent_source = None
+        stats['llm_failed'] = len(misses)
+    else:
+        results = _run_async(_analyze_concurrently(provider, misses, worker_name, task_id_short))
+        
+        # ✅ کش با Provider / مدلی که واقعاً جواب داده (با Router ممکنه Fallback باشه)
+        answered_by = {}
+        for (pkw, links), (search_intent, intent_mapping, answered) in zip(misses, results):
+            pkw.search_intent = search_intent
+            pkw.intent_mapping = intent_mapping
+            if search_intent == "N/A" or intent_mapping == "N/A" or answered is None:
+                pkw.intent_source = None
+                stats['llm_failed'] += 1
+            else:
+                pkw.intent_source = 'llm'
+                stats['llm'] += 1
+                answered_by.setdefault((answered.NAME, answered.MODEL_NAME), []).append(
+                    (pkw.keyword, links, search_intent, intent_mapping)
+                )
+        
+        for (provider_name, model_name), entries in answered_by.items():
+            store_intents(entries, provider_name, model_name)
+    
+    Keyword.objects.bulk_update(pkw_keywords, ['search_intent', 'intent_mapping', 'intent_source'], batch_size=500)
+    
+    save_usage(
+        research_request,
+        provider.NAME if provider else getattr(settings, 'AI_PROVIDER', 'gemini'),
+        provider.MODEL_NAME if provider else '',
+        provider.drain_usage() if provider else [],
+        cache_hits=stats['cache'],
+        local_hits=stats['heuristic'] + stats['model']
+    )
     
     ai_duration = time.time() - ai_start_time
-    print(f"[{worker_name}] [{task_id_short}] 🤖 Completed in {ai_duration:.2f}s")
\ No newline at end of file
+    print(f"[{worker_name}] [{task_id_short}] 🤖 Completed in {ai_duration:.2f}s")
+    
+    return stats
+
+
+async def _analyze_concurrently(provider, items, worker_name, task_id_short):
+    """
+    فراخوانی همزمان Provider برای همه PKW ها
+
+    تعداد فراخوانی همزمان با AI_CONCURRENCY و سهمیه واقعی هر Provider با
+    LLMRateLimiter همون Provider (مشترک بین همه Worker ها) کنترل میشه؛
+    با Router، تلاش های Failover / Hedge هم سهمیه Provider خودشون رو میگیرن.
+    اگه Provider از Batch پشتیبانی کنه، هر AI_BATCH_SIZE کلمه در یک Prompt میره و
+    فقط آیتم هایی که جواب معتبر نگرفتن تکی دوباره فرستاده میشن.
+
+    Returns:
+        list: برای هر آیتم (search_intent, intent_mapping, provider ای که جواب داده یا None)
+    """
+    limiters = {}
+    semaphore = asyncio.Semaphore(getattr(settings, 'AI_CONCURRENCY', 8))
+    batch_size = getattr(settings, 'AI_BATCH_SIZE', 20)
+    total = len(items)
+    done = 0
+    
+    async def acquire(target, tokens):
+        limiter = limiters.get(target.NAME)
+        if limiter is None:
+            limiter = limiters[target.NAME] = LLMRateLimiter(target.NAME)
+        if await limiter.acquire(tokens=tokens):
+            return True
+        print(f"[{worker_name}] [{task_id_short}] ⚠️ [{target.NAME}] LLM Rate Limit Timeout!")
+        return False
+    
+    def report(pkw, search_intent, intent_mapping):
+        nonlocal done
+        done += 1
+        print(f"[{worker_name}] [{task_id_short}] ✅ [{done}/{total}] {pkw.keyword}: {search_intent} | {intent_mapping}")
+    
+    async def analyze_one(pkw, links):
+        async with semaphore:
+            try:
+                (search_intent, intent_mapping), answered = await provider.analyze_routed_async(
+                    pkw.keyword, links, [], acquire
+                )
+            except Exception as e:
+                print(f"[{worker_name}] [{task_id_short}] ❌ {pkw.keyword}: {str(e)}")
+                return "N/A", "N/A", None
+            
+            report(pkw, search_intent, intent_mapping)
+            return search_intent, intent_mapping, answered
+    
+    async def analyze_batch(batch):
+        results = None
+        answered = None
+        
+        # ✅ خطای خود Request (429، Timeout، 5xx): یک بار دیگه کل Batch؛ بعد همه llm_failed
+        # (تکی فرستادن 20 کلمه به Provider ای که الان جواب نمیده فقط سهمیه و System Instruction هدر میده)
+        for attempt in range(2):
+            async with semaphore:
+                try:
+                    results, answered = await provider.analyze_batch_routed_async(
+                        [(pkw.keyword, links) for pkw, links in batch], acquire
+                    )
+                    break
+                except BatchRequestError as e:
+                    print(f"[{worker_name}] [{task_id_short}] ❌ Batch of {len(batch)} failed (attempt {attempt + 1}/2): {str(e)}")
+                except Exception as e:
+                    print(f"[{worker_name}] [{task_id_short}] ❌ Batch of {len(batch)}: {str(e)}")
+                    results = [None] * len(batch)
+                    break
+        
+        if results is None:
+            return [("N/A", "N/A", None)] * len(batch)
+        
+        failed = [i for i, result in enumerate(results) if result is None]
+        if failed:
+            print(f"[{worker_name}] [{task_id_short}] 🔁 Batch: {len(failed)}/{len(batch)} invalid, retrying one by one")
+        
+        for i, result in enumerate(results):
+            if result is not None:
+                report(batch[i][0], *result)
+                results[i] = (*result, answered)
+        
+        # ✅ Fallback تکی فقط برای آیتم های نامعتبر
+        retried = await asyncio.gather(*[analyze_one(*batch[i]) for i in failed])
+        for i, result in zip(failed, retried):
+            results[i] = result
+        
+        return results
+    
+    try:
+        if provider.SUPPORTS_BATCH and batch_size > 1:
+            batches = [items[i:i + batch_size] for i in range(0, total, batch_size)]
+            batch_results = await asyncio.gather(*[analyze_batch(batch) for batch in batches])
+            return [result for results in batch_results for result in results]
+        
+        return await asyncio.gather(*[analyze_one(pkw, links) for pkw, links in items])
+    finally:
+        for limiter in limiters.values():
+            await limiter.close()
@@ -0,0 +1,114 @@
+"""
+Persistent AI Intent Cache (Keyword + SERP Fingerprint)
+"""
+
+import hashlib
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import IntentCache
+
+
+_ARABIC_CHARS = str.maketrans({'ي': 'ی', 'ك': 'ک', '‌': ' '})
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_keyword(keyword):
+    """یکسان‌سازی Keyword (حروف عربی/فارسی، نیم‌فاصله، فاصله‌ها، حروف بزرگ)"""
+    keyword = (keyword or '').translate(_ARABIC_CHARS)
+    return _WHITESPACE.sub(' ', keyword).strip().lower()[:255]
+
+
+def serp_fingerprint(links):
+    """هش لیست مرتب URL ها (ترتیب نتایج هم بخشی از کلیده)"""
+    normalized = [link.strip().rstrip('/') for link in links]
+    return hashlib.sha1("\n".join(normalized).encode('utf-8')).hexdigest()
+
+
+def _ttl_cutoff():
+    return timezone.now() - timedelta(days=getattr(settings, 'AI_CACHE_TTL_DAYS', 30))
+
+
+def cache_enabled():
+    return getattr(settings, 'AI_CACHE_TTL_DAYS', 30) > 0
+
+
+def get_cached_intents(items):
+    """
+    جستجوی نتایج کش‌شده
+
+    Args:
+        items: لیست (keyword, links)
+
+    Returns:
+        dict: {index: (search_intent, intent_mapping)} فقط برای آیتم هایی که کش معتبر دارن
+    """
+    if not cache_enabled() or not items:
+        return {}
+
+    keys = [(normalize_keyword(keyword), serp_fingerprint(links)) for keyword, links in items]
+    cutoff = _ttl_cutoff()
+
+    found = {}
+    batch_size = 500
+    for start in range(0, len(keys), batch_size):
+        batch = keys[start:start + batch_size]
+        rows = IntentCache.objects.filter(
+            serp_hash__in={serp_hash for _, serp_hash in batch},
+            created_date__gte=cutoff
+        ).values_list('keyword', 'serp_hash', 'search_intent', 'intent_mapping')
+
+        for keyword, serp_hash, search_intent, intent_mapping in rows:
+            found[(keyword, serp_hash)] = (search_intent, intent_mapping)
+
+    return {i: found[key] for i, key in enumerate(keys) if key in found}
+
+
+def store_intents(entries, provider_name, model_name=''):
+    """
+    ذخیره نتایج جدید در کش (نتایج N/A ذخیره نمیشن)
+
+    Args:
+        entries: لیست (keyword, links, search_intent, intent_mapping)
+    """
+    if not cache_enabled():
+        return 0
+
+    objects = {}
+    for keyword, links, search_intent, intent_mapping in entries:
+        if not search_intent or not intent_mapping or 'N/A' in (search_intent, intent_mapping):
+            continue
+        key = (normalize_keyword(keyword), serp_fingerprint(links))
+        objects[key] = IntentCache(
+            keyword=key[0],
+            serp_hash=key[1],
+            search_intent=search_intent[:100],
+            intent_mapping=intent_mapping[:50],
+            provider=provider_name,
+            model_name=model_name,
+            created_date=timezone.now(),
+        )
+
+    if objects:
+        with transaction.atomic():
+            IntentCache.objects.bulk_create(
+                list(objects.values()),
+                batch_size=500,
+                update_conflicts=True,
+                unique_fields=['keyword', 'serp_hash'],
+                update_fields=['search_intent', 'intent_mapping', 'provider', 'model_name', 'created_date'],
+            )
+
+    return len(objects)
+
+
+def evict_expired_intents():
+    """حذف نتایج قدیمی‌تر از AI_CACHE_TTL_DAYS"""
+    if not cache_enabled():
+        return 0
+    deleted, _ = IntentCache.objects.filter(created_date__lt=_ttl_cutoff()).delete()
+    return deleted
@@ -0,0 +1,131 @@
+"""
+Fake LLM HTTP Server (OpenAI + Anthropic compatible) برای تست Provider ها و Router
+
+اجرا:
+    python -m ai_analyzer.fake_llm_server --port 8765 --delay 0.2 --fail-rate 0.1
+
+بعد در .env:
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8765
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+
+from aiohttp import web
+
+
+_KEYWORD_LINE = re.compile(r'^(?:\[(\d+)\] )?Keyword: (.*)$', re.MULTILINE)
+
+_PRODUCT_URL = re.compile(r'/(product|p)/|dkp-')
+_BLOG_URL = re.compile(r'/(blog|mag|article|wiki)/')
+
+
+def _classify(block):
+    """جواب قطعی بر اساس URL ها (تا تست ها قابل پیش‌بینی باشن)"""
+    if _PRODUCT_URL.search(block):
+        return {"intent": "Transactional", "type": "product"}
+    if _BLOG_URL.search(block):
+        return {"intent": "Informational", "type": "blog"}
+    return {"intent": "Commercial-Transactional", "type": "product category"}
+
+
+def fake_completion(prompt):
+    """متن جواب برای یک Prompt (تک Keyword → Object، Batch → Array)"""
+    matches = list(_KEYWORD_LINE.finditer(prompt))
+    if not matches:
+        return "{}"
+
+    blocks = [
+        prompt[match.start():(matches[i + 1].start() if i + 1 < len(matches) else len(prompt))]
+        for i, match in enumerate(matches)
+    ]
+
+    if matches[0].group(1) is None:
+        return json.dumps(_classify(blocks[0]))
+
+    return json.dumps([
+        {"id": int(match.group(1)), **_classify(block)}
+        for match, block in zip(matches, blocks)
+    ])
+
+
+def build_app(delay=0.0, fail_rate=0.0, slow_rate=0.0, slow_delay=5.0, api_key=None):
+    """
+    Args:
+        delay: تاخیر هر جواب (ثانیه)
+        fail_rate: احتمال HTTP 500
+        slow_rate / slow_delay: احتمال و مقدار تاخیر اضافه (برای تست Hedge / SLO)
+        api_key: اگه تنظیم شده باشه، کلید دیگه HTTP 401 میگیره (برای تست چرخش کلید)
+    """
+    app = web.Application()
+    app['stats'] = {'requests': 0, 'failed': 0}
+
+    async def respond(request, build_body):
+        app['stats']['requests'] += 1
+        payload = await request.json()
+
+        sent_key = request.headers.get('x-api-key') or request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if api_key is not None and sent_key != api_key:
+            return web.json_response({"error": {"message": "invalid api key"}}, status=401)
+
+        wait = delay + (slow_delay if random.random() < slow_rate else 0)
+        if wait:
+            await asyncio.sleep(wait)
+
+        if random.random() < fail_rate:
+            app['stats']['failed'] += 1
+            return web.json_response({"error": {"message": "fake server error"}}, status=500)
+
+        return web.json_response(build_body(payload))
+
+    async def chat_completions(request):
+        def body(payload):
+            prompt = payload["messages"][-1]["content"]
+            text = fake_completion(prompt)
+            return {
+                "model": payload.get("model", "fake"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4},
+            }
+        return await respond(request, body)
+
+    async def messages(request):
+        def body(payload):
+            prompt = payload["messages"][-1]["content"]
+            text = fake_completion(prompt)
+            return {
+                "model": payload.get("model", "fake"),
+                "type": "message",
+                "content": [{"type": "text", "text": text}],
+                "usage": {"input_tokens": len(prompt) // 4, "output_tokens": len(text) // 4},
+            }
+        return await respond(request, body)
+
+    app.router.add_post('/v1/chat/completions', chat_completions)
+    app.router.add_post('/v1/messages', messages)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake OpenAI/Anthropic server for ai_analyzer')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay', type=float, default=0.0)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    parser.add_argument('--slow-rate', type=float, default=0.0)
+    parser.add_argument('--slow-delay', type=float, default=5.0)
+    parser.add_argument('--api-key', default=None)
+    args = parser.parse_args()
+
+    web.run_app(
+        build_app(args.delay, args.fail_rate, args.slow_rate, args.slow_delay, args.api_key),
+        host=args.host, port=args.port
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+Rule-based Intent Pre-Classifier (URL Patterns + Meta Titles)
+"""
+
+import re
+from collections import Counter
+from urllib.parse import urlparse
+
+from django.conf import settings
+
+
+# ✅ ترتیب مهمه: product-category قبل از product چک میشه
+_TYPE_PATTERNS = [
+    ('product category', re.compile(
+        r'/(product-category|product-cat|category|categories|cat|collections?|browse)/|/search/category-|/c/[^/]+/?$'
+    )),
+    ('product', re.compile(
+        r'/(product|products|p|item|goods)/[^/]+|/dkp-\d+'
+    )),
+    ('blog', re.compile(
+        r'/(blog|mag|magazine|article|articles|news|wiki|post|posts|learn|tutorials?|guide|weblog)/'
+    )),
+]
+
+_BLOG_HOSTS = re.compile(r'^(blog|mag|magazine|news)\.|(^|\.)wikipedia\.org$')
+
+# Intent پیش‌فرض هر نوع صفحه (همون مثال های System Instruction)
+_TYPE_INTENTS = {
+    'product category': 'Commercial-Transactional',
+    'product': 'Transactional',
+    'blog': 'Informational',
+}
+
+_COMMERCIAL_TOKENS = {'خرید', 'قیمت', 'فروش', 'فروشگاه', 'سفارش', 'تخفیف', 'ارزان', 'buy', 'price', 'shop', 'sale'}
+_INFORMATIONAL_TOKENS = {'چیست', 'چیه', 'چگونه', 'آموزش', 'راهنما', 'معرفی', 'روش', 'دلیل', 'علت', 'تفاوت', 'how', 'what', 'why', 'guide'}
+
+_TOKEN_SPLIT = re.compile(r'[\s\-|:،,؟?!()«»\[\]]+')
+
+
+def url_page_type(url):
+    """نوع صفحه از روی آدرس (یا None اگه الگوی مشخصی نداشت)"""
+    try:
+        parsed = urlparse(url.strip().lower())
+    except ValueError:
+        return None
+
+    host = parsed.netloc
+    if host.startswith('www.'):
+        host = host[4:]
+    path = parsed.path or '/'
+
+    for page_type, pattern in _TYPE_PATTERNS:
+        if pattern.search(path):
+            return page_type
+
+    if _BLOG_HOSTS.search(host):
+        return 'blog'
+
+    return None
+
+
+def _title_shares(titles):
+    """سهم عنوان های تجاری و اطلاعاتی"""
+    if not titles:
+        return 0.0, 0.0
+
+    commercial = informational = 0
+    for title in titles:
+        tokens = set(_TOKEN_SPLIT.split(title.lower()))
+        commercial += bool(tokens & _COMMERCIAL_TOKENS)
+        informational += bool(tokens & _INFORMATIONAL_TOKENS)
+
+    return commercial / len(titles), informational / len(titles)
+
+
+def classify(links, titles):
+    """
+    تشخیص Intent بدون LLM
+
+    Args:
+        links: لیست URL های SERP (به ترتیب)
+        titles: لیست Meta Title ها
+
+    Returns:
+        tuple: (intent, type, confidence) یا None اگه هیچ الگویی غالب نبود
+    """
+    if not links:
+        return None
+
+    votes = Counter(page_type for page_type in map(url_page_type, links) if page_type)
+    if not votes:
+        return None
+
+    page_type, count = votes.most_common(1)[0]
+    confidence = count / len(links)
+
+    commercial_share, informational_share = _title_shares(titles)
+    intent = _TYPE_INTENTS[page_type]
+
+    if page_type == 'blog':
+        if commercial_share >= 0.5:
+            intent = 'Informational-Commercial'
+        confidence *= 1 - commercial_share / 4
+    else:
+        # ✅ عنوان های آموزشی روی صفحه محصول/دسته یعنی SERP قاطی هست
+        confidence *= 1 - informational_share / 2
+
+    return intent, page_type, confidence
+
+
+def classify_confident(links, titles):
+    """
+    نتیجه Heuristic فقط وقتی اطمینانش از AI_HEURISTIC_MIN_CONFIDENCE بیشتر باشه
+
+    Returns:
+        tuple: (intent, type) یا None
+    """
+    if not getattr(settings, 'AI_HEURISTIC_ENABLED', True):
+        return None
+
+    result = classify(links, titles)
+    if result is None:
+        return None
+
+    intent, page_type, confidence = result
+    if confidence < getattr(settings, 'AI_HEURISTIC_MIN_CONFIDENCE', 0.8):
+        return None
+
+    return intent, page_type
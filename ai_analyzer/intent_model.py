@@ -0,0 +1,257 @@
+"""
+Local Intent Model (Hashed N-grams + Logistic Regression, CPU Only)
+"""
+
+import os
+import re
+import zlib
+
+import numpy as np
+from django.conf import settings
+
+from .cache import normalize_keyword
+
+
+DEFAULT_DIM = 2 ** 18
+
+_URL_SPLIT = re.compile(r'[/\-_.?=&+%#:]+')
+_WORD_SPLIT = re.compile(r'[\s\-|:،,؟?!()«»\[\]/.]+')
+
+
+def tokenize(keyword, links, titles):
+    """توکن های ویژگی: کلمات Keyword (تک و دوتایی)، دامنه و مسیر URL ها، کلمات Title ها"""
+    tokens = ['b:']
+
+    words = normalize_keyword(keyword).split()
+    tokens.extend(f"k:{word}" for word in words)
+    tokens.extend(f"k2:{a}_{b}" for a, b in zip(words, words[1:]))
+
+    for link in links[:10]:
+        link = link.strip().lower()
+        if '://' in link:
+            link = link.split('://', 1)[1]
+        host, _, path = link.partition('/')
+        if host.startswith('www.'):
+            host = host[4:]
+        tokens.append(f"h:{host}")
+
+        parts = [part for part in _URL_SPLIT.split(path) if part]
+        if parts:
+            tokens.append(f"us:{'#' if parts[0].isdigit() else parts[0]}")
+        tokens.extend(f"u:{'#' if part.isdigit() else part}" for part in parts[:8])
+
+    for title in titles[:10]:
+        tokens.extend(f"t:{word}" for word in _WORD_SPLIT.split(title.lower()) if word)
+
+    return tokens
+
+
+def featurize(keyword, links, titles, dim=DEFAULT_DIM):
+    """
+    Hash کردن توکن ها (crc32 تا بین Process ها ثابت بمونه)
+
+    Returns:
+        tuple: (indices int32, values float32) نرمال‌شده با L2
+    """
+    hashed = np.fromiter(
+        (zlib.crc32(token.encode('utf-8')) % dim for token in tokenize(keyword, links, titles)),
+        dtype=np.int64
+    )
+    indices, counts = np.unique(hashed, return_counts=True)
+    values = counts.astype(np.float32)
+    values /= np.sqrt((values ** 2).sum())
+    return indices.astype(np.int32), values
+
+
+def build_matrix(samples, dim=DEFAULT_DIM):
+    """samples: لیست (keyword, links, titles) → CSR (indptr, indices, values)"""
+    indptr = [0]
+    all_indices = []
+    all_values = []
+    for keyword, links, titles in samples:
+        indices, values = featurize(keyword, links, titles, dim)
+        all_indices.append(indices)
+        all_values.append(values)
+        indptr.append(indptr[-1] + len(indices))
+
+    if not all_indices:
+        return np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+
+    return np.array(indptr, dtype=np.int64), np.concatenate(all_indices), np.concatenate(all_values)
+
+
+def _softmax(logits):
+    logits = logits - logits.max(axis=1, keepdims=True)
+    np.exp(logits, out=logits)
+    logits /= logits.sum(axis=1, keepdims=True)
+    return logits
+
+
+class IntentModel:
+    """دو Softmax خطی (Intent و نوع صفحه) روی ویژگی های Hash شده"""
+
+    def __init__(self, intent_classes, type_classes, dim=DEFAULT_DIM):
+        self.dim = dim
+        self.intent_classes = list(intent_classes)
+        self.type_classes = list(type_classes)
+        self.intent_weights = np.zeros((dim, len(self.intent_classes)), dtype=np.float32)
+        self.type_weights = np.zeros((dim, len(self.type_classes)), dtype=np.float32)
+
+    # ------------------------------------------------------------------
+    # Train
+    # ------------------------------------------------------------------
+
+    def fit(self, indptr, indices, values, intent_labels, type_labels,
+            epochs=5, batch_size=256, learning_rate=0.5, l2=1e-6, seed=1):
+        """Mini-batch AdaGrad روی CSR (فقط سطرهای درگیر هر Batch آپدیت میشن)"""
+        rng = np.random.default_rng(seed)
+        total = len(indptr) - 1
+        heads = [
+            (self.intent_weights, np.asarray(intent_labels), np.zeros_like(self.intent_weights)),
+            (self.type_weights, np.asarray(type_labels), np.zeros_like(self.type_weights)),
+        ]
+
+        for _ in range(epochs):
+            order = rng.permutation(total)
+            for start in range(0, total, batch_size):
+                rows = order[start:start + batch_size]
+                batch_indptr, batch_indices, batch_values = gather_rows(indptr, indices, values, rows)
+                row_of_nnz = np.repeat(np.arange(len(rows)), np.diff(batch_indptr))
+                unique_indices, inverse = np.unique(batch_indices, return_inverse=True)
+
+                for weights, labels, accumulator in heads:
+                    probs = _softmax(self._logits(weights, batch_indptr, batch_indices, batch_values))
+                    probs[np.arange(len(rows)), labels[rows]] -= 1.0
+                    probs /= len(rows)
+
+                    gradient = np.zeros((len(unique_indices), weights.shape[1]), dtype=np.float32)
+                    np.add.at(gradient, inverse, batch_values[:, None] * probs[row_of_nnz])
+                    gradient += l2 * weights[unique_indices]
+
+                    accumulator[unique_indices] += gradient ** 2
+                    weights[unique_indices] -= learning_rate * gradient / (np.sqrt(accumulator[unique_indices]) + 1e-8)
+
+        return self
+
+    # ------------------------------------------------------------------
+    # Predict
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _logits(weights, indptr, indices, values):
+        contributions = weights[indices] * values[:, None]
+        return np.add.reduceat(contributions, indptr[:-1], axis=0)
+
+    def predict_matrix(self, indptr, indices, values):
+        """
+        Returns:
+            tuple: (intent_idx, type_idx, confidence) - confidence = کمترین احتمال دو Head
+        """
+        intent_probs = _softmax(self._logits(self.intent_weights, indptr, indices, values))
+        type_probs = _softmax(self._logits(self.type_weights, indptr, indices, values))
+        confidence = np.minimum(intent_probs.max(axis=1), type_probs.max(axis=1))
+        return intent_probs.argmax(axis=1), type_probs.argmax(axis=1), confidence
+
+    def predict(self, samples):
+        """
+        Args:
+            samples: لیست (keyword, links, titles)
+
+        Returns:
+            list: (intent, type, confidence) برای هر نمونه
+        """
+        if not samples:
+            return []
+        intent_idx, type_idx, confidence = self.predict_matrix(*build_matrix(samples, self.dim))
+        return [
+            (self.intent_classes[i], self.type_classes[t], float(c))
+            for i, t, c in zip(intent_idx, type_idx, confidence)
+        ]
+
+    # ------------------------------------------------------------------
+    # Save / Load
+    # ------------------------------------------------------------------
+
+    def save(self, path):
+        # ✅ فقط سطرهای غیرصفر ذخیره میشن (بیشتر Hash ها هیچ وقت دیده نشدن)
+        used = np.flatnonzero(np.abs(self.intent_weights).sum(axis=1) + np.abs(self.type_weights).sum(axis=1))
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'wb') as f:
+            np.savez_compressed(
+                f,
+                dim=np.int64(self.dim),
+                intent_classes=np.array(self.intent_classes),
+                type_classes=np.array(self.type_classes),
+                rows=used.astype(np.int32),
+                intent_weights=self.intent_weights[used],
+                type_weights=self.type_weights[used],
+            )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            model = cls(data['intent_classes'].tolist(), data['type_classes'].tolist(), int(data['dim']))
+            model.intent_weights[data['rows']] = data['intent_weights']
+            model.type_weights[data['rows']] = data['type_weights']
+        return model
+
+
+def gather_rows(indptr, indices, values, rows):
+    starts = indptr[rows]
+    lengths = indptr[rows + 1] - starts
+    batch_indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=batch_indptr[1:])
+    positions = np.repeat(starts - batch_indptr[:-1], lengths) + np.arange(batch_indptr[-1])
+    return batch_indptr, indices[positions], values[positions]
+
+
+# ✅ هر Worker Process فقط یک بار مدل رو Load میکنه
+_MODEL = None
+_MODEL_MTIME = None
+
+
+def get_intent_model():
+    """مدل Load شده (یا None اگه فایلش نبود / غیرفعال بود)"""
+    global _MODEL, _MODEL_MTIME
+
+    if not getattr(settings, 'AI_INTENT_MODEL_ENABLED', True):
+        return None
+
+    path = getattr(settings, 'AI_INTENT_MODEL_PATH', '')
+    try:
+        mtime = os.path.getmtime(path)
+    except (OSError, TypeError):
+        return None
+
+    # فایل جدید (بعد از Train دوباره) → Load مجدد
+    if _MODEL is None or _MODEL_MTIME != mtime:
+        try:
+            _MODEL = IntentModel.load(path)
+            _MODEL_MTIME = mtime
+            print(f"✅ Intent Model Loaded ({len(_MODEL.intent_classes)} intents, {len(_MODEL.type_classes)} types)")
+        except Exception as e:
+            print(f"❌ Intent Model Load Error: {str(e)}")
+            _MODEL = None
+            return None
+
+    return _MODEL
+
+
+def predict_confident(samples):
+    """
+    Args:
+        samples: لیست (keyword, links, titles)
+
+    Returns:
+        dict: {index: (intent, type)} فقط برای پیش‌بینی های بالای AI_INTENT_MODEL_MIN_CONFIDENCE
+    """
+    model = get_intent_model()
+    if model is None or not samples:
+        return {}
+
+    min_confidence = getattr(settings, 'AI_INTENT_MODEL_MIN_CONFIDENCE', 0.9)
+    return {
+        i: (intent, page_type)
+        for i, (intent, page_type, confidence) in enumerate(model.predict(samples))
+        if confidence >= min_confidence
+    }
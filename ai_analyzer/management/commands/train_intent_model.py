@@ -0,0 +1,118 @@
+"""
+آموزش مدل محلی Intent از روی برچسب‌های قبلی LLM (Keyword های PKW)
+
+فقط برچسب‌هایی که LLM داده (مستقیم یا از کش) استفاده میشن؛ برچسب Heuristic و خود مدل محلی
+وارد آموزش نمیشن تا مدل روی پیش‌بینی‌های خودش آموزش نبینه.
+"""
+
+import time
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from keyword_research.clustering import LINK_SEPARATOR, ERROR_MARK
+from keyword_research.models import Keyword
+from ai_analyzer.cache import normalize_keyword, serp_fingerprint
+from ai_analyzer.intent_model import DEFAULT_DIM, IntentModel, build_matrix, gather_rows
+
+
+# برچسب‌های LLM (کش فقط جواب‌های LLM رو نگه می‌داره)
+LLM_SOURCES = ('llm', 'cache')
+
+
+class Command(BaseCommand):
+    help = 'Train the local hashed n-gram intent model from historical LLM labels'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=None, help='مسیر فایل مدل (پیش‌فرض AI_INTENT_MODEL_PATH)')
+        parser.add_argument('--dim', type=int, default=DEFAULT_DIM, help='تعداد Bucket های Hash')
+        parser.add_argument('--epochs', type=int, default=5)
+        parser.add_argument('--min-class-count', type=int, default=20, help='کلاس های کم‌تکرارتر حذف میشن')
+        parser.add_argument('--holdout', type=float, default=0.1, help='سهم داده ارزیابی (0 = بدون ارزیابی)')
+
+    def handle(self, *args, **options):
+        output = options['output'] or getattr(settings, 'AI_INTENT_MODEL_PATH', '')
+        if not output:
+            raise CommandError("AI_INTENT_MODEL_PATH is not set")
+
+        samples, intents, types = self._load_samples(options['min_class_count'])
+        if not samples:
+            raise CommandError("No LLM-labeled keywords found")
+
+        intent_classes = sorted(set(intents))
+        type_classes = sorted(set(types))
+        intent_labels = np.array([intent_classes.index(label) for label in intents])
+        type_labels = np.array([type_classes.index(label) for label in types])
+
+        self.stdout.write(
+            f"Dataset: {len(samples)} keywords | {len(intent_classes)} intents | {len(type_classes)} types"
+        )
+
+        start = time.time()
+        indptr, indices, values = build_matrix(samples, options['dim'])
+        self.stdout.write(f"Features: {len(indices)} non-zero ({time.time() - start:.2f}s)")
+
+        if 0 < options['holdout'] < 1:
+            self._evaluate(options, intent_classes, type_classes, indptr, indices, values, intent_labels, type_labels)
+
+        start = time.time()
+        model = IntentModel(intent_classes, type_classes, options['dim'])
+        model.fit(indptr, indices, values, intent_labels, type_labels, epochs=options['epochs'])
+        model.save(output)
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Model saved to {output} ({time.time() - start:.2f}s)"))
+
+    def _load_samples(self, min_class_count):
+        rows = (
+            Keyword.objects.filter(status=1, intent_source__in=LLM_SOURCES)
+            .exclude(links='').exclude(links=ERROR_MARK)
+            .exclude(search_intent__isnull=True).exclude(search_intent__in=['', 'N/A'])
+            .exclude(intent_mapping__isnull=True).exclude(intent_mapping__in=['', 'N/A'])
+            .order_by('-id')
+            .values_list('keyword', 'links', 'meta_titles', 'search_intent', 'intent_mapping')
+        )
+
+        # ✅ هر (Keyword, SERP) فقط یک بار (جدیدترین برچسب)
+        seen = set()
+        records = []
+        for keyword, links, titles, search_intent, intent_mapping in rows.iterator(chunk_size=2000):
+            links = links.split(LINK_SEPARATOR)[:10]
+            key = (normalize_keyword(keyword), serp_fingerprint(links))
+            if key in seen:
+                continue
+            seen.add(key)
+            titles = titles.split("\n")[:10] if titles else []
+            records.append(((keyword, links, titles), search_intent, intent_mapping))
+
+        intent_counts = Counter(record[1] for record in records)
+        type_counts = Counter(record[2] for record in records)
+        records = [
+            record for record in records
+            if intent_counts[record[1]] >= min_class_count and type_counts[record[2]] >= min_class_count
+        ]
+
+        return [r[0] for r in records], [r[1] for r in records], [r[2] for r in records]
+
+    def _evaluate(self, options, intent_classes, type_classes, indptr, indices, values, intent_labels, type_labels):
+        total = len(indptr) - 1
+        order = np.random.default_rng(0).permutation(total)
+        split = int(total * (1 - options['holdout']))
+        train_rows, test_rows = np.sort(order[:split]), np.sort(order[split:])
+
+        def subset(rows):
+            return gather_rows(indptr, indices, values, rows)
+
+        model = IntentModel(intent_classes, type_classes, options['dim'])
+        model.fit(*subset(train_rows), intent_labels[train_rows], type_labels[train_rows], epochs=options['epochs'])
+
+        intent_pred, type_pred, confidence = model.predict_matrix(*subset(test_rows))
+        correct = (intent_pred == intent_labels[test_rows]) & (type_pred == type_labels[test_rows])
+        self.stdout.write(f"Holdout: {len(test_rows)} keywords | accuracy {correct.mean():.2%}")
+
+        min_confidence = getattr(settings, 'AI_INTENT_MODEL_MIN_CONFIDENCE', 0.9)
+        for threshold in sorted({0.7, 0.8, 0.9, 0.95, min_confidence}):
+            confident = confidence >= threshold
+            coverage = confident.mean()
+            accuracy = correct[confident].mean() if confident.any() else 0.0
+            self.stdout.write(f"  confidence>={threshold:.2f}: coverage {coverage:.2%} | accuracy {accuracy:.2%}")
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.2 on 2026-10-19 13:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IntentCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('keyword', models.CharField(max_length=255)),
+                ('serp_hash', models.CharField(max_length=40)),
+                ('search_intent', models.CharField(max_length=100)),
+                ('intent_mapping', models.CharField(max_length=50)),
+                ('provider', models.CharField(max_length=50)),
+                ('model_name', models.CharField(blank=True, max_length=100)),
+                ('created_date', models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'کش تحلیل AI',
+                'verbose_name_plural': 'کش تحلیل AI',
+                'constraints': [models.UniqueConstraint(fields=('keyword', 'serp_hash'), name='unique_intent_cache_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.2 on 2026-10-19 13:30
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_analyzer', '0001_initial'),
+        ('keyword_research', '0008_researchrequest_ai_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIUsageRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(max_length=50)),
+                ('model_name', models.CharField(blank=True, max_length=100)),
+                ('kind', models.CharField(choices=[('single', 'تک Keyword'), ('batch', 'Batch'), ('local', 'کش / محلی')], max_length=10)),
+                ('keywords_count', models.IntegerField(default=0)),
+                ('input_tokens', models.IntegerField(default=0)),
+                ('output_tokens', models.IntegerField(default=0)),
+                ('cost', models.FloatField(default=0)),
+                ('latency_ms', models.IntegerField(default=0)),
+                ('cache_hits', models.IntegerField(default=0)),
+                ('local_hits', models.IntegerField(default=0)),
+                ('success', models.BooleanField(default=True)),
+                ('created_date', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('request', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ai_usage', to='keyword_research.researchrequest')),
+            ],
+            options={
+                'verbose_name': 'مصرف AI',
+                'verbose_name_plural': 'مصرف AI',
+                'ordering': ['-created_date'],
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+from django.db import models
+from django.utils import timezone
+
+
+class IntentCache(models.Model):
+    """نتیجه تحلیل AI برای یک Keyword با SERP مشخص (مشترک بین همه درخواست‌ها و کاربران)"""
+    keyword = models.CharField(max_length=255)  # نرمال‌شده
+    serp_hash = models.CharField(max_length=40)  # SHA1 لیست مرتب URL ها
+    search_intent = models.CharField(max_length=100)
+    intent_mapping = models.CharField(max_length=50)
+    provider = models.CharField(max_length=50)
+    model_name = models.CharField(max_length=100, blank=True)
+    created_date = models.DateTimeField(auto_now=True, db_index=True)
+    
+    def __str__(self):
+        return f"{self.keyword} - {self.search_intent} | {self.intent_mapping}"
+    
+    class Meta:
+        verbose_name = "کش تحلیل AI"
+        verbose_name_plural = "کش تحلیل AI"
+        constraints = [
+            models.UniqueConstraint(fields=['keyword', 'serp_hash'], name='unique_intent_cache_key'),
+        ]
+
+
+class AIUsageRecord(models.Model):
+    """مصرف هر فراخوانی LLM (و یک ردیف خلاصه کش/محلی برای هر Chunk)"""
+    KIND_CHOICES = [
+        ('single', 'تک Keyword'),
+        ('batch', 'Batch'),
+        ('local', 'کش / محلی'),
+    ]
+    request = models.ForeignKey(
+        'keyword_research.ResearchRequest', on_delete=models.SET_NULL,
+        null=True, blank=True, related_name='ai_usage'
+    )
+    provider = models.CharField(max_length=50)
+    model_name = models.CharField(max_length=100, blank=True)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    keywords_count = models.IntegerField(default=0)
+    input_tokens = models.IntegerField(default=0)
+    output_tokens = models.IntegerField(default=0)
+    cost = models.FloatField(default=0)  # دلار
+    latency_ms = models.IntegerField(default=0)
+    cache_hits = models.IntegerField(default=0)  # فقط ردیف local
+    local_hits = models.IntegerField(default=0)  # Heuristic + مدل محلی (فقط ردیف local)
+    success = models.BooleanField(default=True)
+    created_date = models.DateTimeField(default=timezone.now, db_index=True)
+    
+    def __str__(self):
+        return f"{self.provider} {self.kind} - {self.keywords_count} keywords - ${self.cost:.6f}"
+    
+    class Meta:
+        verbose_name = "مصرف AI"
+        verbose_name_plural = "مصرف AI"
+        ordering = ['-created_date']
@@ -1,24 +1,41 @@
 """
-AI Provider with Robust JSON Parsing & Cost Calculation
+AI Providers with Robust JSON Parsing & Cost Calculation
 Verified & Tested: Dec 2025
-Model: gemini-flash-latest
+Models: gemini-flash-latest (gRPC SDK), OpenAI / Anthropic (aiohttp)
 """
 
+import asyncio
+import aiohttp
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 from django.conf import settings
 import json
 import re
 import time
 
 
-class AIProvider:
-    """Base class"""
-    def analyze(self, keyword, links, titles):
-        raise NotImplementedError
+class BatchRequestError(Exception):
+    """
+    کل Request یک Batch شکست خورد (شبکه، Timeout، HTTP 429/5xx، سهمیه Rate Limiter)
 
+    با جوابی که فقط چند عنصرش نامعتبره فرق داره: اینجا فرستادن تک تک آیتم ها به همون Provider خراب فایده ای نداره.
+    """
 
-class GeminiProvider(AIProvider):
-    """Gemini Provider with Robust JSON Parsing"""
+
+class AIProvider:
+    """Base class"""
+    
+    # Provider هایی که analyze_batch_async دارن True میذارن
+    SUPPORTS_BATCH = False
+    
+    NAME = ""
+    MODEL_NAME = ""
+    
+    # ✅ بعد از 401/403 True میشه؛ get_ai_provider این Provider رو دور میندازه (کلید چرخیده)
+    auth_failed = False
+    
+    PRICE_PER_1M_INPUT = 0.0
+    PRICE_PER_1M_OUTPUT = 0.0
     
     SYSTEM_INSTRUCTION = """You are a strictly technical SEO data extractor.
 Your ONLY task is to return a JSON object based on the user input.
@@ -58,6 +75,224 @@ Examples:
 {"intent": "Navigational", "type": "page-landing"}
 {"intent": "Informational-Commercial", "type": "blog"}"""
     
+    BATCH_SYSTEM_INSTRUCTION = """You are a strictly technical SEO data extractor.
+The user sends a numbered list of keywords, each as "[N] Keyword: ..." followed by its URLs.
+Your ONLY task is to return a JSON array with exactly ONE object per keyword, in the same order.
+NO intro text. NO outro text. NO markdown formatting (like ```json).
+Start your response with '[' and end with ']'.
+
+Required JSON Structure:
+[
+  {"id": N, "intent": "Select from allowed Intent Mapping values", "type": "Select from allowed Search Intent values"}
+]
+
+Intent Mapping Options (select ONE or COMBINATION):
+- Informational
+- Navigational
+- Commercial
+- Transactional
+- Commercial-Transactional
+- Informational-Commercial
+
+Search Intent Options (select ONE):
+- product category
+- product
+- blog
+- page-landing
+
+Guidelines:
+- "id" must be the number N of the keyword in the input list
+- Intent Mapping: Can be single or hyphenated combination
+- Search Intent: Must be exactly one of the 4 options
+- Use lowercase for "product category", "product", "blog", "page-landing"
+- Use proper case for Intent Mapping (e.g., "Commercial-Transactional")
+
+Example:
+[{"id": 1, "intent": "Commercial-Transactional", "type": "product category"}, {"id": 2, "intent": "Informational", "type": "blog"}]"""
+    
+    INTENT_OPTIONS = {"Informational", "Navigational", "Commercial", "Transactional"}
+    TYPE_OPTIONS = {"product category", "product", "blog", "page-landing"}
+    
+    def analyze(self, keyword, links, titles):
+        raise NotImplementedError
+    
+    async def analyze_async(self, keyword, links, titles):
+        """پیش‌فرض: همون analyze در Thread جدا (برای Provider هایی که Client Async ندارن)"""
+        return await asyncio.to_thread(self.analyze, keyword, links, titles)
+    
+    async def analyze_batch_async(self, items):
+        """
+        تحلیل چند Keyword با هم
+
+        Args:
+            items: لیست (keyword, links)
+
+        Returns:
+            list: برای هر آیتم (intent, type) یا None (اگه جوابش معتبر نبود)
+
+        Raises:
+            BatchRequestError: خود Request شکست خورد (هیچ جوابی نیومد)
+        """
+        raise NotImplementedError
+    
+    async def analyze_routed_async(self, keyword, links, titles, acquire=None):
+        """
+        analyze_async + Provider ای که جواب داده (Router ممکنه از Provider دوم جواب بگیره)
+
+        Args:
+            acquire: coroutine(provider, tokens) → bool؛ سهمیه Rate Limiter همون Provider (None = بدون Limiter)
+
+        Returns:
+            tuple: ((intent, type), provider) - provider None اگه سهمیه نگرفت
+        """
+        if acquire is not None and not await acquire(self, self.estimate_tokens(self.build_prompt(keyword, links))):
+            return ("N/A", "N/A"), None
+        return await self.analyze_async(keyword, links, titles), self
+    
+    async def analyze_batch_routed_async(self, items, acquire=None):
+        """
+        analyze_batch_async + Provider ای که جواب داده (مثل analyze_routed_async)
+
+        Raises:
+            BatchRequestError: Request شکست خورد یا سهمیه Rate Limiter نگرفت
+        """
+        prompt = self.build_batch_prompt(items)
+        if acquire is not None and not await acquire(self, self.estimate_batch_tokens(prompt, len(items))):
+            raise BatchRequestError(f"[{self.NAME}] LLM rate limit timeout")
+        return await self.analyze_batch_async(items), self
+    
+    @staticmethod
+    def build_prompt(keyword, links):
+        urls_str = "\n".join([f"{i+1}. {link}" for i, link in enumerate(links[:10])])
+        return f"Keyword: {keyword}\nURLs:\n{urls_str}"
+    
+    @classmethod
+    def build_batch_prompt(cls, items):
+        blocks = [f"[{i+1}] {cls.build_prompt(keyword, links)}" for i, (keyword, links) in enumerate(items)]
+        return "\n\n".join(blocks)
+    
+    def record_usage(self, kind, keywords_count, input_tokens=0, output_tokens=0, cost=0.0, latency=0.0, success=True):
+        """ثبت مصرف یک فراخوانی (Caller بعداً با drain_usage برمیداره و ذخیره میکنه)"""
+        if not hasattr(self, 'usage_log'):
+            self.usage_log = []
+        self.usage_log.append({
+            'provider': self.NAME,
+            'model_name': self.MODEL_NAME,
+            'kind': kind,
+            'keywords_count': keywords_count,
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'cost': cost,
+            'latency_ms': int(latency * 1000),
+            'success': success,
+        })
+    
+    def drain_usage(self):
+        usage_log = getattr(self, 'usage_log', [])
+        self.usage_log = []
+        return usage_log
+    
+    def log_call(self, kind, batch_size, in_tokens, out_tokens, start_time):
+        """چاپ و ثبت هزینه یک فراخوانی موفق"""
+        end_time = time.time()
+        
+        cost_input = (in_tokens / 1_000_000) * self.PRICE_PER_1M_INPUT
+        cost_output = (out_tokens / 1_000_000) * self.PRICE_PER_1M_OUTPUT
+        total_cost = cost_input + cost_output
+        
+        batch_str = f" | Batch: {batch_size}" if kind == 'batch' else ""
+        print(f"📊 [{self.NAME}] Time: {end_time - start_time:.2f}s | Tokens: {in_tokens + out_tokens} | Cost: ${total_cost:.8f}{batch_str}")
+        
+        self.record_usage(
+            kind, batch_size,
+            input_tokens=in_tokens, output_tokens=out_tokens, cost=total_cost, latency=end_time - start_time
+        )
+    
+    def _parse_single_response(self, raw_text):
+        match = re.search(r'\{[\s\S]*\}', raw_text)
+        
+        if match:
+            clean_json_text = match.group(0)
+            data = json.loads(clean_json_text)
+            return data.get('intent', 'N/A'), data.get('type', 'N/A')
+        else:
+            print(f"❌ No JSON found. Raw: {raw_text[:100]}")
+            return "N/A", "N/A"
+    
+    def _parse_batch_response(self, raw_text, batch_size):
+        results = [None] * batch_size
+        
+        match = re.search(r'\[[\s\S]*\]', raw_text)
+        if not match:
+            print(f"❌ No JSON array found. Raw: {raw_text[:100]}")
+            return results
+        
+        try:
+            data = json.loads(match.group(0))
+        except ValueError as e:
+            print(f"❌ Invalid JSON array: {str(e)}")
+            return results
+        
+        if not isinstance(data, list):
+            return results
+        
+        for position, element in enumerate(data):
+            if not isinstance(element, dict):
+                continue
+            
+            # ✅ id اولویت داره؛ اگه نبود ترتیب آرایه ملاکه
+            index = element.get('id', position + 1)
+            if isinstance(index, str) and index.isdigit():
+                index = int(index)
+            if not isinstance(index, int) or not 1 <= index <= batch_size or results[index - 1] is not None:
+                continue
+            
+            parsed = self._validate_result(element)
+            if parsed:
+                results[index - 1] = parsed
+        
+        return results
+    
+    def _validate_result(self, element):
+        intent = element.get('intent')
+        page_type = element.get('type')
+        
+        if not isinstance(intent, str) or not isinstance(page_type, str):
+            return None
+        
+        intent = intent.strip()
+        page_type = page_type.strip().lower()
+        
+        if page_type not in self.TYPE_OPTIONS:
+            return None
+        if not intent or any(part not in self.INTENT_OPTIONS for part in intent.split('-')):
+            return None
+        
+        return intent, page_type
+    
+    async def close(self):
+        """آزاد کردن Connection ها (Provider های HTTP)"""
+        return None
+    
+    def estimate_tokens(self, prompt, max_output_tokens=100, system_instruction=None):
+        """تخمین تقریبی Token ها برای Rate Limiter (حدود 4 کاراکتر = 1 Token)"""
+        if system_instruction is None:
+            system_instruction = getattr(self, 'SYSTEM_INSTRUCTION', '')
+        return (len(system_instruction) + len(prompt)) // 4 + max_output_tokens
+    
+    def estimate_batch_tokens(self, prompt, batch_size):
+        system_instruction = getattr(self, 'BATCH_SYSTEM_INSTRUCTION', None)
+        return self.estimate_tokens(prompt, max_output_tokens=40 * batch_size, system_instruction=system_instruction)
+
+
+class GeminiProvider(AIProvider):
+    """Gemini Provider with Robust JSON Parsing"""
+    
+    SUPPORTS_BATCH = True
+    
+    NAME = "gemini"
+    MODEL_NAME = "models/gemini-flash-latest"
+    
     PRICE_PER_1M_INPUT = 0.075
     PRICE_PER_1M_OUTPUT = 0.30
 
@@ -73,70 +308,282 @@ Examples:
         ]
         
         self.model = genai.GenerativeModel(
-            'models/gemini-flash-latest', 
+            self.MODEL_NAME,
             system_instruction=self.SYSTEM_INSTRUCTION,
             safety_settings=safety_settings
         )
         
+        self.batch_model = genai.GenerativeModel(
+            self.MODEL_NAME,
+            system_instruction=self.BATCH_SYSTEM_INSTRUCTION,
+            safety_settings=safety_settings
+        )
+        
         print("✅ Gemini Flash Provider Initialized (Robust Mode)")
     
+    GENERATION_CONFIG = {
+        "temperature": 0.1,
+        "max_output_tokens": 2000,
+        "response_mime_type": "application/json"
+    }
+    
     def analyze(self, keyword, links, titles):
         """Analyzes keyword intent with cost tracking and regex parsing"""
         
         start_time = time.time()
+        response = None
         
         try:
-            urls_str = "\n".join([f"{i+1}. {link}" for i, link in enumerate(links[:10])])
-            prompt = f"Keyword: {keyword}\nURLs:\n{urls_str}"
-            
             response = self.model.generate_content(
-                prompt,
-                generation_config={
-                    "temperature": 0.1,
-                    "max_output_tokens": 2000,
-                    "response_mime_type": "application/json"
-                }
+                self.build_prompt(keyword, links),
+                generation_config=self.GENERATION_CONFIG
             )
-            
-            end_time = time.time()
-            
-            usage = response.usage_metadata
-            in_tokens = usage.prompt_token_count
-            out_tokens = usage.candidates_token_count
-            
-            cost_input = (in_tokens / 1_000_000) * self.PRICE_PER_1M_INPUT
-            cost_output = (out_tokens / 1_000_000) * self.PRICE_PER_1M_OUTPUT
-            total_cost = cost_input + cost_output
-            
-            print(f"📊 Time: {end_time - start_time:.2f}s | Tokens: {usage.total_token_count} | Cost: ${total_cost:.8f}")
-
-            raw_text = response.text
-            match = re.search(r'\{[\s\S]*\}', raw_text)
-            
-            if match:
-                clean_json_text = match.group(0)
-                data = json.loads(clean_json_text)
-                return data.get('intent', 'N/A'), data.get('type', 'N/A')
-            else:
-                print(f"❌ No JSON found. Raw: {raw_text[:100]}")
-                return "N/A", "N/A"
+            return self._parse_response(response, start_time)
+        
+        except Exception as e:
+            print(f"❌ Error: {str(e)}")
+            self._check_auth_error(e)
+            if response is None:
+                self.record_usage('single', 1, latency=time.time() - start_time, success=False)
+            return "N/A", "N/A"
+    
+    async def analyze_async(self, keyword, links, titles):
+        """نسخه Async (بدون بلاک کردن Event Loop)"""
+        
+        start_time = time.time()
+        response = None
+        
+        try:
+            response = await self.model.generate_content_async(
+                self.build_prompt(keyword, links),
+                generation_config=self.GENERATION_CONFIG
+            )
+            return self._parse_response(response, start_time)
         
         except Exception as e:
             print(f"❌ Error: {str(e)}")
+            self._check_auth_error(e)
+            if response is None:
+                self.record_usage('single', 1, latency=time.time() - start_time, success=False)
             return "N/A", "N/A"
+    
+    async def analyze_batch_async(self, items):
+        """
+        تحلیل چند Keyword در یک Request (System Instruction فقط یک بار حساب میشه)
 
+        هر عنصر آرایه جواب جدا Validate میشه؛ آیتم هایی که جواب معتبر ندارن None برمیگردن
+        تا Caller فقط همون ها رو تکی دوباره بفرسته. خطای خود Request → BatchRequestError.
+        """
+        
+        start_time = time.time()
+        generation_config = dict(self.GENERATION_CONFIG)
+        generation_config["max_output_tokens"] = max(self.GENERATION_CONFIG["max_output_tokens"], 60 * len(items))
+        
+        response = None
+        
+        try:
+            response = await self.batch_model.generate_content_async(
+                self.build_batch_prompt(items),
+                generation_config=generation_config
+            )
+            self._log_usage(response, start_time, kind='batch', batch_size=len(items))
+            return self._parse_batch_response(response.text, len(items))
+        
+        except Exception as e:
+            print(f"❌ Batch Error ({len(items)} keywords): {str(e)}")
+            self._check_auth_error(e)
+            if response is None:
+                self.record_usage('batch', len(items), latency=time.time() - start_time, success=False)
+                raise BatchRequestError(str(e)) from e
+            return [None] * len(items)
+    
+    def _check_auth_error(self, error):
+        if isinstance(error, (google_exceptions.Unauthenticated, google_exceptions.PermissionDenied)):
+            self.auth_failed = True
+    
+    def _log_usage(self, response, start_time, kind='single', batch_size=1):
+        usage = response.usage_metadata
+        self.log_call(kind, batch_size, usage.prompt_token_count, usage.candidates_token_count, start_time)
+    
+    def _parse_response(self, response, start_time):
+        self._log_usage(response, start_time)
+        return self._parse_single_response(response.text)
 
-class GPTProvider(AIProvider):
-    def __init__(self, api_key):
+
+class HTTPProvider(AIProvider):
+    """
+    پایه Provider های HTTP (aiohttp)
+
+    Session برای هر Event Loop یک بار ساخته میشه و Connection ها بین فراخوانی ها باز می‌مونن.
+    """
+    
+    SUPPORTS_BATCH = True
+    
+    def __init__(self, api_key, base_url, model_name=None, timeout=None):
         self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        if model_name:
+            self.MODEL_NAME = model_name
+        self.timeout = timeout or getattr(settings, 'AI_REQUEST_TIMEOUT', 60)
+        self._session = None
+        self._session_loop = None
+    
+    # --- هر Provider این سه تا رو پیاده میکنه ---
+    
+    def build_request(self, system_instruction, prompt, max_output_tokens):
+        """Returns: (path, headers, payload)"""
+        raise NotImplementedError
+    
+    def parse_text(self, data):
+        raise NotImplementedError
+    
+    def parse_usage(self, data):
+        """Returns: (input_tokens, output_tokens)"""
+        raise NotImplementedError
+    
+    # ---
+    
+    def _get_session(self):
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                connector=aiohttp.TCPConnector(limit=100, ttl_dns_cache=300)
+            )
+            self._session_loop = loop
+        return self._session
+    
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+    
+    async def _complete(self, system_instruction, prompt, max_output_tokens, kind, batch_size, session=None):
+        """یک فراخوانی کامل: ارسال، ثبت هزینه، برگردوندن متن جواب"""
+        start_time = time.time()
+        path, headers, payload = self.build_request(system_instruction, prompt, max_output_tokens)
+        
+        try:
+            async with (session or self._get_session()).post(f"{self.base_url}{path}", headers=headers, json=payload) as response:
+                if response.status in (401, 403):
+                    self.auth_failed = True
+                if response.status != 200:
+                    body = await response.text()
+                    raise RuntimeError(f"HTTP {response.status}: {body[:200]}")
+                data = await response.json(content_type=None)
+        except Exception:
+            self.record_usage(kind, batch_size, latency=time.time() - start_time, success=False)
+            raise
+        
+        in_tokens, out_tokens = self.parse_usage(data)
+        self.log_call(kind, batch_size, in_tokens, out_tokens, start_time)
+        return self.parse_text(data)
     
     def analyze(self, keyword, links, titles):
-        return "N/A", "N/A"
+        """نسخه Sync (Session موقت، فقط برای استفاده خارج از Pipeline همزمان)"""
+        async def run():
+            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
+                return await self._analyze_with_session(keyword, links, session)
+        
+        return asyncio.run(run())
+    
+    async def analyze_async(self, keyword, links, titles):
+        return await self._analyze_with_session(keyword, links, None)
+    
+    async def _analyze_with_session(self, keyword, links, session):
+        try:
+            raw_text = await self._complete(
+                self.SYSTEM_INSTRUCTION, self.build_prompt(keyword, links), 200, 'single', 1, session
+            )
+            return self._parse_single_response(raw_text)
+        except Exception as e:
+            print(f"❌ [{self.NAME}] Error: {str(e)}")
+            return "N/A", "N/A"
+    
+    async def analyze_batch_async(self, items):
+        try:
+            raw_text = await self._complete(
+                self.BATCH_SYSTEM_INSTRUCTION, self.build_batch_prompt(items),
+                max(2000, 60 * len(items)), 'batch', len(items)
+            )
+        except Exception as e:
+            print(f"❌ [{self.NAME}] Batch Error ({len(items)} keywords): {str(e)}")
+            raise BatchRequestError(str(e)) from e
+        
+        return self._parse_batch_response(raw_text, len(items))
 
 
-class ClaudeProvider(AIProvider):
-    def __init__(self, api_key):
-        self.api_key = api_key
+class GPTProvider(HTTPProvider):
+    """OpenAI Chat Completions (یا هر API سازگار با OpenAI)"""
     
-    def analyze(self, keyword, links, titles):
-        return "N/A", "N/A"
\ No newline at end of file
+    NAME = "gpt"
+    MODEL_NAME = "gpt-4o-mini"
+    
+    PRICE_PER_1M_INPUT = 0.15
+    PRICE_PER_1M_OUTPUT = 0.60
+    
+    def __init__(self, api_key, base_url=None, model_name=None, timeout=None):
+        super().__init__(
+            api_key,
+            base_url or getattr(settings, 'OPENAI_BASE_URL', 'https://api.openai.com/v1'),
+            model_name or getattr(settings, 'OPENAI_MODEL', None),
+            timeout
+        )
+    
+    def build_request(self, system_instruction, prompt, max_output_tokens):
+        headers = {"Authorization": f"Bearer {self.api_key}"}
+        payload = {
+            "model": self.MODEL_NAME,
+            "messages": [
+                {"role": "system", "content": system_instruction},
+                {"role": "user", "content": prompt},
+            ],
+            "temperature": 0.1,
+            "max_tokens": max_output_tokens,
+        }
+        return "/chat/completions", headers, payload
+    
+    def parse_text(self, data):
+        return data["choices"][0]["message"]["content"] or ""
+    
+    def parse_usage(self, data):
+        usage = data.get("usage") or {}
+        return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+
+
+class ClaudeProvider(HTTPProvider):
+    """Anthropic Messages API"""
+    
+    NAME = "claude"
+    MODEL_NAME = "claude-3-5-haiku-latest"
+    
+    PRICE_PER_1M_INPUT = 0.80
+    PRICE_PER_1M_OUTPUT = 4.00
+    
+    API_VERSION = "2023-06-01"
+    
+    def __init__(self, api_key, base_url=None, model_name=None, timeout=None):
+        super().__init__(
+            api_key,
+            base_url or getattr(settings, 'ANTHROPIC_BASE_URL', 'https://api.anthropic.com'),
+            model_name or getattr(settings, 'ANTHROPIC_MODEL', None),
+            timeout
+        )
+    
+    def build_request(self, system_instruction, prompt, max_output_tokens):
+        headers = {"x-api-key": self.api_key, "anthropic-version": self.API_VERSION}
+        payload = {
+            "model": self.MODEL_NAME,
+            "system": system_instruction,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": 0.1,
+            "max_tokens": max_output_tokens,
+        }
+        return "/v1/messages", headers, payload
+    
+    def parse_text(self, data):
+        return "".join(block.get("text", "") for block in data.get("content", []) if block.get("type") == "text")
+    
+    def parse_usage(self, data):
+        usage = data.get("usage") or {}
+        return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
@@ -0,0 +1,93 @@
+"""
+Global Rate Limiter for LLM Providers (RPM + TPM)
+"""
+
+import asyncio
+import time
+import uuid
+import redis.asyncio as aioredis
+from django.conf import settings
+
+
+# اسکریپت اتمیک: پنجره 60 ثانیه‌ای برای تعداد Request و مجموع Token
+_ACQUIRE_SCRIPT = """
+local requests_key = KEYS[1]
+local tokens_key = KEYS[2]
+local now = tonumber(ARGV[1])
+local window_start = now - 60
+local max_rpm = tonumber(ARGV[2])
+local max_tpm = tonumber(ARGV[3])
+local tokens = tonumber(ARGV[4])
+local member = ARGV[5]
+
+redis.call('ZREMRANGEBYSCORE', requests_key, 0, window_start)
+redis.call('ZREMRANGEBYSCORE', tokens_key, 0, window_start)
+
+if redis.call('ZCARD', requests_key) + 1 > max_rpm then
+    return 0
+end
+
+local used_tokens = 0
+for _, entry in ipairs(redis.call('ZRANGE', tokens_key, 0, -1)) do
+    used_tokens = used_tokens + tonumber(string.match(entry, ':(%d+)$'))
+end
+if used_tokens > 0 and used_tokens + tokens > max_tpm then
+    return 0
+end
+
+redis.call('ZADD', requests_key, now, member)
+redis.call('ZADD', tokens_key, now, member .. ':' .. tokens)
+redis.call('EXPIRE', requests_key, 61)
+redis.call('EXPIRE', tokens_key, 61)
+return 1
+"""
+
+
+class LLMRateLimiter:
+    """Rate Limiter مشترک بین همه Worker ها برای LLM (Requests/Minute و Tokens/Minute)"""
+
+    def __init__(self, provider_name, max_rpm=None, max_tpm=None):
+        self.max_rpm = max_rpm or getattr(settings, 'AI_MAX_RPM', 15)
+        self.max_tpm = max_tpm or getattr(settings, 'AI_MAX_TPM', 1000000)
+        self.requests_key = f"llm_rate_limiter:{provider_name}:requests"
+        self.tokens_key = f"llm_rate_limiter:{provider_name}:tokens"
+        self.redis_client = aioredis.Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+            decode_responses=True
+        )
+        self._script = self.redis_client.register_script(_ACQUIRE_SCRIPT)
+
+    async def acquire(self, tokens=0, timeout=300):
+        """
+        درخواست سهمیه برای یک فراخوانی LLM
+
+        Args:
+            tokens: تخمین Token های این فراخوانی (ورودی + خروجی)
+            timeout: حداکثر زمان انتظار (ثانیه)
+
+        Returns:
+            bool: True اگه سهمیه گرفت، False اگه Timeout شد
+        """
+        start_time = time.time()
+
+        while time.time() - start_time < timeout:
+            try:
+                granted = await self._script(
+                    keys=[self.requests_key, self.tokens_key],
+                    args=[time.time(), self.max_rpm, self.max_tpm, int(tokens), uuid.uuid4().hex]
+                )
+                if granted:
+                    return True
+
+                await asyncio.sleep(0.1)
+
+            except Exception as e:
+                print(f"❌ LLM Rate Limiter Error: {str(e)}")
+                await asyncio.sleep(0.5)
+
+        return False
+
+    async def close(self):
+        await self.redis_client.aclose()
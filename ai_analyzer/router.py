@@ -0,0 +1,212 @@
+"""
+Provider Router: Failover (Error / Latency SLO) + Hedged Requests
+"""
+
+import asyncio
+import time
+from collections import deque
+
+import numpy as np
+from django.conf import settings
+
+from .providers import AIProvider, BatchRequestError
+
+
+class ProviderRouter(AIProvider):
+    """
+    چند Provider پشت همون قرارداد AIProvider
+
+    - خطا یا عبور از AI_LATENCY_SLO → Provider بعدی (و Provider خراب تا AI_FAILOVER_COOLDOWN ثانیه کنار میره)
+    - AI_HEDGE_ENABLED: اگه جواب از p95 اخیر Provider دیرتر شد، همزمان از Provider بعدی هم میپرسه
+    - هر تلاش (اصلی، Failover یا Hedge) سهمیه Rate Limiter همون Provider رو میگیره (acquire)
+    """
+
+    MIN_HEDGE_SAMPLES = 20
+
+    def __init__(self, providers, latency_slo=None, batch_latency_slo=None, hedge=None, cooldown=None):
+        self.providers = list(providers)
+        self.NAME = self.providers[0].NAME
+        self.MODEL_NAME = self.providers[0].MODEL_NAME
+        self.SUPPORTS_BATCH = any(provider.SUPPORTS_BATCH for provider in self.providers)
+
+        self.latency_slo = latency_slo or getattr(settings, 'AI_LATENCY_SLO', 20)
+        self.batch_latency_slo = batch_latency_slo or getattr(settings, 'AI_BATCH_LATENCY_SLO', 60)
+        self.hedge = getattr(settings, 'AI_HEDGE_ENABLED', False) if hedge is None else hedge
+        self.cooldown = getattr(settings, 'AI_FAILOVER_COOLDOWN', 60) if cooldown is None else cooldown
+
+        self._unhealthy_until = {}
+        self._latencies = {}
+
+    # ------------------------------------------------------------------
+    # Health / Latency
+    # ------------------------------------------------------------------
+
+    def _ordered(self):
+        """سالم ها به ترتیب تنظیمات، بعد خراب ها (آخرین شانس)"""
+        now = time.time()
+        healthy = [i for i in range(len(self.providers)) if self._unhealthy_until.get(i, 0) <= now]
+        unhealthy = [i for i in range(len(self.providers)) if i not in healthy]
+        return healthy + unhealthy
+
+    def _mark_failure(self, index):
+        self._unhealthy_until[index] = time.time() + self.cooldown
+
+    def _mark_success(self, index, kind, latency):
+        self._unhealthy_until.pop(index, None)
+        self._latencies.setdefault((index, kind), deque(maxlen=200)).append(latency)
+
+    def hedge_delay(self, index, kind):
+        """p95 تاخیر اخیر Provider (None اگه نمونه کافی نبود)"""
+        latencies = self._latencies.get((index, kind))
+        if not latencies or len(latencies) < self.MIN_HEDGE_SAMPLES:
+            return None
+        return float(np.percentile(latencies, 95))
+
+    # ------------------------------------------------------------------
+    # Routing
+    # ------------------------------------------------------------------
+
+    async def _attempt(self, index, kind, call, is_ok, timeout, tokens, acquire):
+        provider = self.providers[index]
+
+        # ✅ انتظار برای سهمیه جزو Latency SLO نیست
+        if acquire is not None and not await acquire(provider, tokens(provider)):
+            print(f"⚠️ [{provider.NAME}] LLM Rate Limit Timeout → failover")
+            return None
+
+        start_time = time.time()
+
+        try:
+            result = await asyncio.wait_for(call(provider), timeout=timeout)
+        except asyncio.TimeoutError:
+            print(f"⏱️ [{provider.NAME}] Latency SLO breached ({timeout}s) → failover")
+            self._mark_failure(index)
+            return None
+        except Exception as e:
+            print(f"❌ [{provider.NAME}] {str(e)} → failover")
+            self._mark_failure(index)
+            return None
+
+        if not is_ok(result):
+            self._mark_failure(index)
+            return None
+
+        self._mark_success(index, kind, time.time() - start_time)
+        return result, provider
+
+    async def _route(self, kind, call, is_ok, fallback, tokens, acquire=None):
+        """
+        Returns:
+            tuple: (result, provider) - provider ای که جواب داده، یا (fallback, None)
+        """
+        timeout = self.batch_latency_slo if kind == 'batch' else self.latency_slo
+        order = self._ordered()
+        position = 0
+
+        while position < len(order):
+            index = order[position]
+            primary = asyncio.ensure_future(self._attempt(index, kind, call, is_ok, timeout, tokens, acquire))
+
+            delay = self.hedge_delay(index, kind) if self.hedge and position + 1 < len(order) else None
+            if delay is not None:
+                done, _ = await asyncio.wait({primary}, timeout=delay)
+                if not done:
+                    hedge_index = order[position + 1]
+                    print(f"🔀 [{self.providers[index].NAME}] slower than p95 ({delay:.2f}s) → hedging {self.providers[hedge_index].NAME}")
+                    hedge = asyncio.ensure_future(self._attempt(hedge_index, kind, call, is_ok, timeout, tokens, acquire))
+
+                    pending = {primary, hedge}
+                    while pending:
+                        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                        for task in done:
+                            result = task.result()
+                            if result is not None:
+                                for task_left in pending:
+                                    task_left.cancel()
+                                return result
+
+                    position += 2
+                    continue
+
+            result = await primary
+            if result is not None:
+                return result
+            position += 1
+
+        return fallback, None
+
+    # ------------------------------------------------------------------
+    # AIProvider Contract
+    # ------------------------------------------------------------------
+
+    def analyze(self, keyword, links, titles):
+        return asyncio.run(self.analyze_async(keyword, links, titles))
+
+    async def analyze_async(self, keyword, links, titles):
+        result, _ = await self.analyze_routed_async(keyword, links, titles)
+        return result
+
+    async def analyze_routed_async(self, keyword, links, titles, acquire=None):
+        prompt = self.build_prompt(keyword, links)
+        return await self._route(
+            'single',
+            lambda provider: provider.analyze_async(keyword, links, titles),
+            lambda result: bool(result) and "N/A" not in result,
+            ("N/A", "N/A"),
+            lambda provider: provider.estimate_tokens(prompt),
+            acquire
+        )
+
+    async def analyze_batch_async(self, items):
+        results, _ = await self.analyze_batch_routed_async(items)
+        return results
+
+    async def analyze_batch_routed_async(self, items, acquire=None):
+        """
+        Raises:
+            BatchRequestError: هیچ Provider ای جواب نداد (فقط خطای Request / Timeout / سهمیه)
+        """
+        prompt = self.build_batch_prompt(items)
+        answered = []
+
+        async def call(provider):
+            if provider.SUPPORTS_BATCH:
+                results = await provider.analyze_batch_async(items)
+            else:
+                results = await asyncio.gather(*[provider.analyze_async(keyword, links, []) for keyword, links in items])
+                results = [None if "N/A" in result else result for result in results]
+            answered.append(results)
+            return results
+
+        results, provider = await self._route(
+            'batch',
+            call,
+            lambda results: any(result is not None for result in results),
+            None,
+            lambda provider: provider.estimate_batch_tokens(prompt, len(items)),
+            acquire
+        )
+
+        if results is None:
+            # ✅ جوابی اومد ولی هیچ عنصرش معتبر نبود → Fallback تکی؛ هیچ جوابی نیومد → خطای Request
+            if answered:
+                return [None] * len(items), None
+            raise BatchRequestError(f"All providers failed for batch of {len(items)}")
+        return results, provider
+
+    @property
+    def auth_failed(self):
+        return any(provider.auth_failed for provider in self.providers)
+
+    def estimate_tokens(self, prompt, max_output_tokens=100, system_instruction=None):
+        return self.providers[0].estimate_tokens(prompt, max_output_tokens, system_instruction)
+
+    def estimate_batch_tokens(self, prompt, batch_size):
+        return self.providers[0].estimate_batch_tokens(prompt, batch_size)
+
+    def drain_usage(self):
+        return [call for provider in self.providers for call in provider.drain_usage()]
+
+    async def close(self):
+        for provider in self.providers:
+            await provider.close()
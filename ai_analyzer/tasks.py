@@ -0,0 +1,229 @@
+"""
+AI Analysis Tasks (صف جدا: chaboktool_ai_queue)
+"""
+
+import json
+import uuid
+from datetime import timedelta
+
+import redis
+from celery import shared_task, chord
+from celery.exceptions import SoftTimeLimitExceeded
+from django.conf import settings
+from django.utils import timezone
+from keyword_research.models import Keyword, ResearchRequest
+from .analyzer import analyze_pkw_chunk, recount_ai_stats, save_ai_stats
+
+
+AI_QUEUE = 'chaboktool_ai_queue'
+
+AI_CHUNK_TIME_LIMIT = getattr(settings, 'AI_CHUNK_TIME_LIMIT', 1800)
+
+
+def _touch_ai_heartbeat(request_id):
+    ResearchRequest.objects.filter(id=request_id).update(ai_heartbeat_at=timezone.now())
+
+
+def _queued_task_ids():
+    """
+    Task id پیام های صف AI که هنوز شروع نشدن (در صف Broker، یا Prefetch شده توسط Worker در unacked)
+
+    Returns:
+        set
+    """
+    client = redis.Redis.from_url(settings.CELERY_BROKER_URL)
+    try:
+        messages = [json.loads(payload) for payload in client.lrange(AI_QUEUE, 0, -1)]
+        messages += [json.loads(payload)[0] for payload in client.hvals('unacked')]
+    finally:
+        client.close()
+
+    return {(message.get('headers') or {}).get('id') for message in messages if isinstance(message, dict)}
+
+
+def _complete_ai_request(research_request):
+    """تکمیل درخواست بعد از مرحله AI (save() تا Signal تکمیل ارسال بشه)"""
+    research_request.status = 'completed'
+    research_request.completed_date = timezone.now()
+    research_request.ai_heartbeat_at = None
+    research_request.save()
+
+
+def dispatch_ai_analysis(research_request, worker_name="", task_id_short="", pkw_ids=None):
+    """
+    ارسال تحلیل AI به صف AI به صورت Chunk های AI_CHUNK_SIZE تایی (Chord)
+
+    Worker تحقیق منتظر نمی‌مونه؛ درخواست در finalize_ai_analysis تکمیل میشه.
+    اگه Chunk ای با خطا تموم بشه ai_analysis_failed، و اگه گم بشه finish_stale_ai_analysis درخواست رو تکمیل میکنه.
+    Task id Chunk ها ذخیره میشن تا Chunk ای که فقط در صف شلوغ منتظره گم شده حساب نشه.
+
+    Args:
+        pkw_ids: فقط این PKW ها (مثلاً PKW های تازه بعد از خوشه‌بندی مجدد)؛ آمار در پایان از روی
+            برچسب‌های همه PKW ها شمرده میشه
+
+    Returns:
+        bool: True اگه Task ها ارسال شدن (وضعیت درخواست رو finalize عوض میکنه)
+    """
+    if not getattr(settings, 'AI_ENABLED', False):
+        print(f"[{worker_name}] [{task_id_short}] ⚠️ AI disabled")
+        return False
+
+    recount = pkw_ids is not None
+    if pkw_ids is None:
+        pkw_ids = list(
+            Keyword.objects.filter(request=research_request, status=1).order_by('id').values_list('id', flat=True)
+        )
+    if not pkw_ids:
+        return False
+
+    chunk_size = max(1, getattr(settings, 'AI_CHUNK_SIZE', 500))
+    chunks = [pkw_ids[i:i + chunk_size] for i in range(0, len(pkw_ids), chunk_size)]
+    task_ids = [str(uuid.uuid4()) for _ in chunks]
+
+    ResearchRequest.objects.filter(id=research_request.id).update(
+        ai_heartbeat_at=timezone.now(), ai_chunk_task_ids=task_ids
+    )
+
+    chord(
+        [analyze_pkw_chunk_task.s(research_request.id, chunk).set(task_id=task_id) for chunk, task_id in zip(chunks, task_ids)]
+    )(finalize_ai_analysis.s(research_request.id, recount=recount).on_error(ai_analysis_failed.s(research_request.id)))
+
+    print(f"[{worker_name}] [{task_id_short}] 🤖 AI Analysis queued: {len(pkw_ids)} PKW in {len(chunks)} chunks")
+    return True
+
+
+def analyze_reclustered_pkws(research_request):
+    """
+    بعد از ذخیره خوشه‌بندی جدید: PKW های تازه (بدون برچسب Intent) به صف AI میرن
+
+    درخواست تا finalize_ai_analysis دوباره running میشه. بدون PKW تازه، با AI خاموش یا خطای ارسال،
+    فقط آمار AI از روی PKW های فعلی دوباره شمرده میشه (PKW تحلیل نشده → N/A).
+
+    Returns:
+        bool: True اگه Task ها ارسال شدن
+    """
+    new_pkw_ids = list(
+        Keyword.objects.filter(request=research_request, status=1, search_intent__isnull=True)
+        .order_by('id').values_list('id', flat=True)
+    )
+
+    if new_pkw_ids and getattr(settings, 'AI_ENABLED', False):
+        # ✅ update مستقیم (بدون post_save سیگنال): Chunk ها فقط درخواست running رو تحلیل میکنن
+        ResearchRequest.objects.filter(pk=research_request.pk).update(status='running')
+        research_request.status = 'running'
+        try:
+            if dispatch_ai_analysis(research_request, pkw_ids=new_pkw_ids):
+                return True
+        except Exception as e:
+            print(f"❌ AI Analysis dispatch failed for request {research_request.id}: {str(e)}")
+
+        ResearchRequest.objects.filter(pk=research_request.pk).update(status='completed', ai_heartbeat_at=None)
+        research_request.status = 'completed'
+
+    recount_ai_stats(research_request)
+    return False
+
+
+@shared_task(
+    bind=True, max_retries=0, queue=AI_QUEUE,
+    soft_time_limit=AI_CHUNK_TIME_LIMIT, time_limit=AI_CHUNK_TIME_LIMIT + 60
+)
+def analyze_pkw_chunk_task(self, request_id, pkw_ids):
+    """تحلیل یک Chunk از PKW ها"""
+
+    worker_name = self.request.hostname
+    task_id_short = self.request.id[:8]
+
+    research_request = ResearchRequest.objects.filter(id=request_id).first()
+    if not research_request:
+        print(f"[{worker_name}] [{task_id_short}] ⚠️ Request {request_id} not found (deleted?)")
+        return {}
+
+    # ✅ درخواست قبلاً تکمیل شده (finish_stale_ai_analysis یا Errback) → بدون مصرف Token و بازنویسی برچسب ها
+    if research_request.status != 'running':
+        print(f"[{worker_name}] [{task_id_short}] ⚠️ Request {request_id} is {research_request.status} → AI chunk skipped")
+        return {}
+
+    _touch_ai_heartbeat(request_id)
+
+    # ✅ خطا نباید Chord رو متوقف کنه (وگرنه درخواست هیچ وقت تکمیل نمیشه)
+    try:
+        return analyze_pkw_chunk(research_request, pkw_ids, worker_name, task_id_short)
+    except SoftTimeLimitExceeded:
+        print(f"[{worker_name}] [{task_id_short}] ⏱️ AI Chunk exceeded {AI_CHUNK_TIME_LIMIT}s")
+        return {'total': len(pkw_ids), 'llm_failed': len(pkw_ids)}
+    except Exception as e:
+        print(f"[{worker_name}] [{task_id_short}] ❌ AI Chunk failed: {str(e)}")
+        return {'total': len(pkw_ids), 'llm_failed': len(pkw_ids)}
+    finally:
+        _touch_ai_heartbeat(request_id)
+
+
+@shared_task(bind=True, max_retries=0, queue=AI_QUEUE)
+def finalize_ai_analysis(self, chunk_stats, request_id, recount=False):
+    """بعد از همه Chunk ها: ذخیره آمار (recount: از روی برچسب‌های همه PKW ها) و تکمیل درخواست"""
+
+    worker_name = self.request.hostname
+    task_id_short = self.request.id[:8]
+
+    research_request = ResearchRequest.objects.filter(id=request_id, status='running').first()
+    if not research_request:
+        return {'status': 'missing'}
+
+    stats = recount_ai_stats(research_request) if recount else save_ai_stats(research_request, chunk_stats)
+    _complete_ai_request(research_request)
+
+    print(f"[{worker_name}] [{task_id_short}] ✅ AI Analysis finished for request {request_id}: {stats}")
+    return {'status': 'completed', 'stats': stats}
+
+
+@shared_task(queue=AI_QUEUE)
+def ai_analysis_failed(request, exc, traceback, request_id):
+    """
+    Errback Chord: یک Chunk با خطا تموم شد (مثلاً Hard Time Limit یا Worker کشته شد)
+
+    finalize_ai_analysis اجرا نمیشه، پس درخواست با برچسب‌های ذخیره شده تکمیل میشه.
+    """
+    research_request = ResearchRequest.objects.filter(id=request_id, status='running').first()
+    if not research_request:
+        return {'status': 'missing'}
+
+    stats = recount_ai_stats(research_request)
+    _complete_ai_request(research_request)
+
+    print(f"⚠️ AI Analysis chord failed for request {request_id} ({exc!r}) → completed with {stats}")
+    return {'status': 'completed', 'stats': stats}
+
+
+@shared_task(queue=AI_QUEUE)
+def finish_stale_ai_analysis():
+    """
+    Celery Beat: درخواست‌هایی که بیشتر از AI_STALE_TIMEOUT ثانیه هیچ Chunk AI شون فعالیت نداشته
+    (پیام Task گم شده و Errback هم اجرا نمیشه) با برچسب‌های ذخیره شده تکمیل میشن.
+
+    Chunk ای که هنوز در صف Broker (یا Prefetch یک Worker) ـه گم نشده: درخواستش دست نمیخوره.
+    """
+    stale_before = timezone.now() - timedelta(seconds=getattr(settings, 'AI_STALE_TIMEOUT', 21600))
+    stale_requests = list(ResearchRequest.objects.filter(status='running', ai_heartbeat_at__lt=stale_before))
+    if not stale_requests:
+        return {'finished': []}
+
+    try:
+        queued = _queued_task_ids()
+    except (redis.RedisError, ValueError) as e:
+        print(f"❌ AI queue check failed: {str(e)} → stale requests left running")
+        return {'finished': []}
+
+    finished = []
+    for research_request in stale_requests:
+        waiting = queued.intersection(research_request.ai_chunk_task_ids or [])
+        if waiting:
+            print(f"⏳ AI Analysis for request {research_request.id}: {len(waiting)} chunks still queued → waiting")
+            continue
+
+        stats = recount_ai_stats(research_request)
+        _complete_ai_request(research_request)
+        finished.append(research_request.id)
+        print(f"⚠️ AI Analysis for request {research_request.id} stalled → completed with {stats}")
+
+    return {'finished': finished}
@@ -0,0 +1,503 @@
+import asyncio
+import json
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+import redis
+from aiohttp import web
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from keyword_research.models import Keyword, ResearchRequest
+from .analyzer import _PROVIDER_CACHE, _analyze_concurrently, _credential, _run_async, analyze_pkw_chunk, get_ai_provider
+from .fake_llm_server import build_app
+from .models import AIUsageRecord, IntentCache
+from .providers import BatchRequestError, ClaudeProvider, GPTProvider
+from .router import ProviderRouter
+from .tasks import (
+    ai_analysis_failed, analyze_pkw_chunk_task, analyze_reclustered_pkws, finalize_ai_analysis, finish_stale_ai_analysis,
+)
+
+
+def create_request(name='req', **fields):
+    user = get_user_model().objects.create_user(
+        username=f"user-{name}", password='x', email=f"{name}@example.com", phone_number=f"0912{abs(hash(name)) % 10**7:07d}"
+    )
+    fields.setdefault('status', 'running')
+    return ResearchRequest.objects.create(user=user, name=name, ai_analysis_enabled=True, **fields)
+
+
+class StaleAIAnalysisTests(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch('ai_analyzer.tasks._queued_task_ids', return_value=set())
+        self.queued_task_ids = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.research_request = create_request(
+            ai_heartbeat_at=timezone.now() - timedelta(days=1), ai_chunk_task_ids=['chunk-1', 'chunk-2']
+        )
+        for index, (intent, source) in enumerate([('blog', 'llm'), ('product', 'heuristic'), (None, None)]):
+            Keyword.objects.create(
+                user=self.research_request.user, request=self.research_request, keyword=f"kw{index}",
+                search_volume=10, status=1, search_intent=intent, intent_mapping=intent and 'Informational',
+                intent_source=source,
+            )
+
+    def test_stalled_request_is_completed_with_stored_labels(self):
+        result = finish_stale_ai_analysis()
+
+        self.assertEqual(result['finished'], [self.research_request.id])
+        self.research_request.refresh_from_db()
+        self.assertEqual(self.research_request.status, 'completed')
+        self.assertIsNone(self.research_request.ai_heartbeat_at)
+        self.assertEqual(self.research_request.ai_stats['llm'], 1)
+        self.assertEqual(self.research_request.ai_stats['heuristic'], 1)
+        self.assertEqual(self.research_request.ai_stats['llm_failed'], 1)
+        self.assertEqual(Keyword.objects.filter(search_intent='N/A').count(), 1)
+
+    def test_active_request_is_left_running(self):
+        ResearchRequest.objects.filter(pk=self.research_request.pk).update(ai_heartbeat_at=timezone.now())
+
+        self.assertEqual(finish_stale_ai_analysis()['finished'], [])
+        self.research_request.refresh_from_db()
+        self.assertEqual(self.research_request.status, 'running')
+
+    def test_queued_chunks_keep_request_running(self):
+        # Chunk دوم هنوز در صف شلوغ Broker منتظره (Heartbeat فقط با شروع Chunk تازه میشه)
+        self.queued_task_ids.return_value = {'chunk-2', 'other-request-chunk'}
+
+        self.assertEqual(finish_stale_ai_analysis()['finished'], [])
+        self.research_request.refresh_from_db()
+        self.assertEqual(self.research_request.status, 'running')
+
+    def test_broker_error_leaves_request_running(self):
+        self.queued_task_ids.side_effect = redis.ConnectionError('down')
+
+        self.assertEqual(finish_stale_ai_analysis()['finished'], [])
+        self.research_request.refresh_from_db()
+        self.assertEqual(self.research_request.status, 'running')
+
+    def test_late_chunk_skips_finished_request(self):
+        finish_stale_ai_analysis()
+
+        with mock.patch('ai_analyzer.tasks.analyze_pkw_chunk') as analyze:
+            self.assertEqual(analyze_pkw_chunk_task.apply(args=(self.research_request.id, [1, 2])).get(), {})
+        analyze.assert_not_called()
+
+        # Finalize دیرهنگام Chord درخواست تکمیل شده رو دوباره تکمیل نمیکنه
+        self.assertEqual(finalize_ai_analysis.apply(args=([{}], self.research_request.id)).get(), {'status': 'missing'})
+
+    def test_chord_errback_completes_request(self):
+        ai_analysis_failed(None, RuntimeError('worker lost'), None, self.research_request.id)
+
+        self.research_request.refresh_from_db()
+        self.assertEqual(self.research_request.status, 'completed')
+        self.assertEqual(self.research_request.ai_stats['total'], 3)
+
+
+class ReclusterAIAnalysisTests(TestCase):
+
+    def setUp(self):
+        self.research_request = create_request(status='completed', ai_stats={'total': 1, 'llm': 1})
+        self.keywords = [
+            Keyword.objects.create(
+                user=self.research_request.user, request=self.research_request, keyword=f"kw{index}",
+                search_volume=10, status=status, search_intent=intent, intent_source=intent and 'llm',
+            )
+            for index, (status, intent) in enumerate([(1, 'blog'), (1, None), (2, 'product')])
+        ]
+
+    @override_settings(AI_ENABLED=True)
+    def test_new_pkws_are_queued(self):
+        with mock.patch('ai_analyzer.tasks.chord') as chord:
+            self.assertTrue(analyze_reclustered_pkws(self.research_request))
+
+        self.research_request.refresh_from_db()
+        self.assertEqual(self.research_request.status, 'running')
+        self.assertEqual(len(self.research_request.ai_chunk_task_ids), 1)
+        header = chord.call_args.args[0]
+        self.assertEqual([task.args for task in header], [(self.research_request.id, [self.keywords[1].id])])
+        self.assertEqual(chord.return_value.call_args.args[0].kwargs, {'recount': True})
+
+    @override_settings(AI_ENABLED=False)
+    def test_stats_are_recounted_without_ai(self):
+        self.assertFalse(analyze_reclustered_pkws(self.research_request))
+
+        self.research_request.refresh_from_db()
+        self.assertEqual(self.research_request.status, 'completed')
+        self.assertEqual(self.research_request.ai_stats['total'], 2)
+        self.assertEqual(self.research_request.ai_stats['llm_failed'], 1)
+
+    def test_finalize_recounts_all_pkws(self):
+        ResearchRequest.objects.filter(pk=self.research_request.pk).update(status='running')
+        Keyword.objects.filter(pk=self.keywords[1].pk).update(search_intent='guide', intent_source='cache')
+
+        result = finalize_ai_analysis.apply(args=([{'total': 1, 'cache': 1}], self.research_request.id), kwargs={'recount': True}).get()
+
+        self.assertEqual(result['stats']['total'], 2)
+        self.assertEqual((result['stats']['llm'], result['stats']['cache']), (1, 1))
+        self.research_request.refresh_from_db()
+        self.assertEqual(self.research_request.status, 'completed')
+
+
+class FakeLLMServers:
+    """چند fake_llm_server روی Port آزاد، در یک Thread با Event Loop خودش"""
+
+    def __init__(self, *configs):
+        self.configs = configs
+        self.ports = []
+        self.stats = []  # app['stats'] هر Server (تعداد Request ها)
+        self._loop = asyncio.new_event_loop()
+        self._runners = []
+
+    def __enter__(self):
+        started = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self._start())
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        started.wait(10)
+        return self
+
+    async def _start(self):
+        for config in self.configs:
+            app = build_app(**config)
+            self.stats.append(app['stats'])
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, '127.0.0.1', 0)
+            await site.start()
+            self._runners.append(runner)
+            self.ports.append(runner.addresses[0][1])
+
+    def __exit__(self, *exc_info):
+        async def stop():
+            for runner in self._runners:
+                await runner.cleanup()
+
+        asyncio.run_coroutine_threadsafe(stop(), self._loop).result(10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(10)
+
+
+PRODUCT_LINKS = ['https://shop.example.com/product/1', 'https://shop.example.com/product/2']
+
+
+class ProviderRouterTests(SimpleTestCase):
+
+    def build_router(self, servers, **options):
+        gpt = GPTProvider('test-key', base_url=f"http://127.0.0.1:{servers.ports[0]}/v1")
+        claude = ClaudeProvider('test-key', base_url=f"http://127.0.0.1:{servers.ports[1]}")
+        return ProviderRouter([gpt, claude], **options)
+
+    def test_failover_answers_from_next_provider(self):
+        acquired = []
+
+        async def acquire(provider, tokens):
+            acquired.append(provider.NAME)
+            return True
+
+        async def run(router):
+            try:
+                first = await router.analyze_routed_async('buy phone', PRODUCT_LINKS, [], acquire)
+                second = await router.analyze_routed_async('buy phone', PRODUCT_LINKS, [], acquire)
+                return first, second
+            finally:
+                await router.close()
+
+        with FakeLLMServers({'fail_rate': 1.0}, {}) as servers:
+            router = self.build_router(servers, hedge=False)
+            (result, answered), (_, answered_again) = asyncio.run(run(router))
+
+        self.assertEqual(result, ('Transactional', 'product'))
+        self.assertEqual(answered.NAME, 'claude')
+        # ✅ هر تلاش سهمیه Provider خودش رو میگیره؛ بعد از خطا Provider خراب در Cooldown هست
+        self.assertEqual(acquired, ['gpt', 'claude', 'claude'])
+        self.assertEqual(answered_again.NAME, 'claude')
+
+    def test_batch_failover_reports_answering_provider(self):
+        items = [('buy phone', PRODUCT_LINKS), ('phone review', ['https://example.com/blog/phones'])]
+
+        async def run(router):
+            try:
+                return await router.analyze_batch_routed_async(items)
+            finally:
+                await router.close()
+
+        with FakeLLMServers({'fail_rate': 1.0}, {}) as servers:
+            results, answered = asyncio.run(run(self.build_router(servers, hedge=False)))
+
+        self.assertEqual(results, [('Transactional', 'product'), ('Informational', 'blog')])
+        self.assertEqual(answered.NAME, 'claude')
+
+    def test_all_providers_failing_returns_fallback(self):
+        async def run(router):
+            try:
+                return await router.analyze_routed_async('buy phone', PRODUCT_LINKS, [])
+            finally:
+                await router.close()
+
+        with FakeLLMServers({'fail_rate': 1.0}, {'fail_rate': 1.0}) as servers:
+            result, answered = asyncio.run(run(self.build_router(servers, hedge=False)))
+
+        self.assertEqual(result, ('N/A', 'N/A'))
+        self.assertIsNone(answered)
+
+    def test_batch_request_failure_raises(self):
+        async def run(router):
+            try:
+                return await router.analyze_batch_routed_async([('buy phone', PRODUCT_LINKS)] * 3)
+            finally:
+                await router.close()
+
+        with FakeLLMServers({'fail_rate': 1.0}, {'fail_rate': 1.0}) as servers:
+            with self.assertRaises(BatchRequestError):
+                asyncio.run(run(self.build_router(servers, hedge=False)))
+
+    def test_hedge_answers_from_faster_provider(self):
+        async def run(router):
+            try:
+                start = time.time()
+                result = await router.analyze_routed_async('buy phone', PRODUCT_LINKS, [])
+                return result, time.time() - start
+            finally:
+                await router.close()
+
+        with FakeLLMServers({'delay': 3.0}, {}) as servers:
+            router = self.build_router(servers, hedge=True, latency_slo=10)
+            # p95 اخیر Provider اول = 0.05 ثانیه
+            for _ in range(ProviderRouter.MIN_HEDGE_SAMPLES):
+                router._mark_success(0, 'single', 0.05)
+
+            (result, answered), elapsed = asyncio.run(run(router))
+
+        self.assertEqual(result, ('Transactional', 'product'))
+        self.assertEqual(answered.NAME, 'claude')
+        self.assertLess(elapsed, 2.0)
+
+    def test_latency_slo_breach_fails_over(self):
+        async def run(router):
+            try:
+                return await router.analyze_routed_async('buy phone', PRODUCT_LINKS, [])
+            finally:
+                await router.close()
+
+        with FakeLLMServers({'delay': 2.0}, {}) as servers:
+            result, answered = asyncio.run(run(self.build_router(servers, hedge=False, latency_slo=0.3)))
+
+        self.assertEqual(result, ('Transactional', 'product'))
+        self.assertEqual(answered.NAME, 'claude')
+
+
+class BatchResponseParsingTests(SimpleTestCase):
+
+    def setUp(self):
+        self.provider = GPTProvider('test-key', base_url='http://127.0.0.1:1/v1')
+
+    def test_elements_are_mapped_by_id(self):
+        raw = 'Sure! ```json\n[{"id": 2, "intent": "Informational", "type": "blog"}, {"id": "1", "intent": "Transactional", "type": "Product "}]\n```'
+
+        self.assertEqual(
+            self.provider._parse_batch_response(raw, 3),
+            [('Transactional', 'product'), ('Informational', 'blog'), None],
+        )
+
+    def test_position_is_used_without_id(self):
+        raw = '[{"intent": "Commercial-Transactional", "type": "product category"}, {"intent": "Navigational", "type": "page-landing"}]'
+
+        self.assertEqual(
+            self.provider._parse_batch_response(raw, 2),
+            [('Commercial-Transactional', 'product category'), ('Navigational', 'page-landing')],
+        )
+
+    def test_invalid_elements_are_left_for_single_retry(self):
+        raw = json.dumps([
+            {"id": 1, "intent": "Transactional", "type": "article"},     # type نامعتبر
+            {"id": 2, "intent": "Buying-Commercial", "type": "blog"},    # بخش نامعتبر در intent
+            {"id": 2, "intent": "Informational", "type": "blog"},        # id تکراری بعد از عنصر نامعتبر → قبول
+            {"id": 3, "intent": "Informational", "type": "blog"},
+            {"id": 3, "intent": "Transactional", "type": "product"},     # id تکراری → اولی میمونه
+            {"id": 9, "intent": "Informational", "type": "blog"},        # خارج از محدوده
+            "not an object",
+            {"id": 4, "intent": None, "type": "blog"},
+        ])
+
+        self.assertEqual(
+            self.provider._parse_batch_response(raw, 4),
+            [None, ('Informational', 'blog'), ('Informational', 'blog'), None],
+        )
+
+    def test_unparseable_response_fails_every_item(self):
+        for raw in ('no json here', '[{"id": 1,', '{"intent": "Informational", "type": "blog"}'):
+            with self.subTest(raw=raw):
+                self.assertEqual(self.provider._parse_batch_response(raw, 2), [None, None])
+
+    def test_validate_result_normalizes(self):
+        self.assertEqual(
+            self.provider._validate_result({'intent': ' Informational-Commercial ', 'type': ' Blog'}),
+            ('Informational-Commercial', 'blog'),
+        )
+        self.assertIsNone(self.provider._validate_result({'intent': '', 'type': 'blog'}))
+        self.assertIsNone(self.provider._validate_result({'intent': 'Informational'}))
+
+
+def use_settings_credentials(test):
+    """کلیدها فقط از override_settings (نه .env یا Environment سیستمی که تست روش اجرا میشه)"""
+    patcher = mock.patch('ai_analyzer.analyzer._credential', lambda name: getattr(settings, name, ''))
+    patcher.start()
+    test.addCleanup(patcher.stop)
+
+
+def redis_available():
+    try:
+        return redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB).ping()
+    except redis.RedisError:
+        return False
+
+
+class AnalyzeChunkFailoverTests(TestCase):
+
+    @staticmethod
+    def close_cached_providers():
+        for provider in _PROVIDER_CACHE.values():
+            _run_async(provider.close())
+        _PROVIDER_CACHE.clear()
+
+    def test_cache_and_usage_record_the_answering_provider(self):
+        if not redis_available():
+            self.skipTest("Redis is not available (LLMRateLimiter)")
+        self.addCleanup(self.close_cached_providers)
+        use_settings_credentials(self)
+
+        research_request = create_request('failover')
+        keywords = [
+            Keyword.objects.create(
+                user=research_request.user, request=research_request, keyword=f"buy phone {index}",
+                search_volume=10, status=1, links=" -------------- ".join(PRODUCT_LINKS),
+            )
+            for index in range(3)
+        ]
+
+        with FakeLLMServers({'fail_rate': 1.0}, {}) as servers, override_settings(
+            AI_PROVIDER='gpt', AI_FALLBACK_PROVIDERS='claude', AI_HEDGE_ENABLED=False,
+            OPENAI_API_KEY='test-key', ANTHROPIC_API_KEY='test-key',
+            OPENAI_BASE_URL=f"http://127.0.0.1:{servers.ports[0]}/v1",
+            ANTHROPIC_BASE_URL=f"http://127.0.0.1:{servers.ports[1]}",
+            AI_HEURISTIC_ENABLED=False, AI_INTENT_MODEL_ENABLED=False, AI_CACHE_TTL_DAYS=30,
+        ):
+            stats = analyze_pkw_chunk(research_request, [kw.id for kw in keywords])
+
+        self.assertEqual(stats['llm'], 3)
+        self.assertEqual(set(IntentCache.objects.values_list('provider', 'model_name')), {('claude', ClaudeProvider.MODEL_NAME)})
+        self.assertTrue(AIUsageRecord.objects.filter(provider='claude', success=True).exists())
+        self.assertTrue(AIUsageRecord.objects.filter(provider='gpt', success=False).exists())
+
+
+class BatchFallbackTests(SimpleTestCase):
+
+    def setUp(self):
+        if not redis_available():
+            self.skipTest("Redis is not available (LLMRateLimiter)")
+
+    def test_failed_batch_request_is_not_split_into_single_calls(self):
+        items = [(SimpleNamespace(keyword=f"buy phone {index}"), PRODUCT_LINKS) for index in range(5)]
+
+        async def run(provider):
+            try:
+                return await _analyze_concurrently(provider, items, '', '')
+            finally:
+                await provider.close()
+
+        with FakeLLMServers({'fail_rate': 1.0}) as servers, override_settings(AI_BATCH_SIZE=5):
+            provider = GPTProvider('test-key', base_url=f"http://127.0.0.1:{servers.ports[0]}/v1")
+            results = asyncio.run(run(provider))
+
+        self.assertEqual(results, [("N/A", "N/A", None)] * 5)
+        # یک Batch + یک تلاش دوباره، بدون 5 فراخوانی تکی
+        self.assertEqual(servers.stats[0]['requests'], 2)
+
+
+class ProviderCredentialTests(SimpleTestCase):
+
+    def setUp(self):
+        self.addCleanup(AnalyzeChunkFailoverTests.close_cached_providers)
+
+    def test_env_file_takes_precedence(self):
+        with tempfile.TemporaryDirectory() as base_dir, override_settings(
+            BASE_DIR=Path(base_dir), OPENAI_API_KEY='settings-key', ANTHROPIC_API_KEY='settings-key',
+        ):
+            env_path = Path(base_dir) / '.env'
+            env_path.write_text("OPENAI_API_KEY=env-key\n")
+            self.assertEqual(_credential('OPENAI_API_KEY'), 'env-key')
+            self.assertEqual(_credential('ANTHROPIC_API_KEY'), 'settings-key')
+
+            # چرخش کلید بدون Restart: .env هر بار دوباره خونده میشه
+            env_path.write_text("OPENAI_API_KEY='rotated-key'\n")
+            self.assertEqual(_credential('OPENAI_API_KEY'), 'rotated-key')
+
+    def test_rotated_key_builds_new_provider(self):
+        use_settings_credentials(self)
+
+        with override_settings(AI_PROVIDER='gpt', AI_FALLBACK_PROVIDERS='', OPENAI_API_KEY='old-key'):
+            old_provider = get_ai_provider()
+            self.assertIs(get_ai_provider(), old_provider)
+
+        with override_settings(AI_PROVIDER='gpt', AI_FALLBACK_PROVIDERS='', OPENAI_API_KEY='new-key'):
+            new_provider = get_ai_provider()
+
+        self.assertIsNot(new_provider, old_provider)
+        self.assertEqual(new_provider.api_key, 'new-key')
+
+    def test_unauthorized_provider_is_dropped(self):
+        use_settings_credentials(self)
+        with FakeLLMServers({'api_key': 'new-key'}) as servers, override_settings(
+            AI_PROVIDER='gpt', AI_FALLBACK_PROVIDERS='', OPENAI_API_KEY='old-key',
+            OPENAI_BASE_URL=f"http://127.0.0.1:{servers.ports[0]}/v1",
+        ):
+            provider = get_ai_provider()
+            self.assertEqual(_run_async(provider.analyze_async('buy phone', PRODUCT_LINKS, [])), ('N/A', 'N/A'))
+            self.assertTrue(provider.auth_failed)
+
+            # همون تنظیمات، ولی Provider با 401 دیگه از کش برنمی‌گرده
+            rebuilt = get_ai_provider()
+            self.assertIsNot(rebuilt, provider)
+            self.assertFalse(rebuilt.auth_failed)
+
+            with override_settings(OPENAI_API_KEY='new-key'):
+                result = _run_async(get_ai_provider().analyze_async('buy phone', PRODUCT_LINKS, []))
+
+        self.assertEqual(result, ('Transactional', 'product'))
+
+
+class DailyUsageViewTests(TestCase):
+
+    def setUp(self):
+        self.staff = create_request('staff').user
+        self.staff.is_staff = True
+        self.staff.save(update_fields=['is_staff'])
+        self.client.force_login(self.staff)
+
+    def test_user_filter_must_be_numeric(self):
+        response = self.client.get(reverse('ai_daily_usage'), {'user': 'abc'})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_user_filter(self):
+        response = self.client.get(reverse('ai_daily_usage'), {'user': self.staff.id, 'days': 7})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['days'], 7)
@@ -0,0 +1,7 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('usage/request/<int:pk>/', views.request_usage_view, name='ai_request_usage'),
+    path('usage/daily/', views.daily_usage_view, name='ai_daily_usage'),
+]
@@ -0,0 +1,133 @@
+"""
+AI Usage Accounting (Tokens, Cost, Latency, Cache Hits)
+"""
+
+from datetime import timedelta
+
+import numpy as np
+from django.db.models import Count, Sum, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import AIUsageRecord
+
+
+def save_usage(research_request, provider_name, model_name, calls, cache_hits=0, local_hits=0):
+    """
+    ذخیره مصرف یک Chunk
+
+    Args:
+        calls: خروجی provider.drain_usage()
+        provider_name / model_name: پیش‌فرض برای فراخوانی هایی که Provider ندارن + ردیف local
+        cache_hits / local_hits: تعداد PKW هایی که بدون LLM حل شدن (یک ردیف local)
+    """
+    # هر فراخوانی Provider و مدل خودش رو داره (با Router ممکنه Provider دوم جواب داده باشه)
+    records = [
+        AIUsageRecord(request=research_request, **{
+            **call,
+            'provider': call.get('provider') or provider_name,
+            'model_name': call.get('model_name') or model_name,
+        })
+        for call in calls
+    ]
+    if cache_hits or local_hits:
+        records.append(AIUsageRecord(
+            request=research_request,
+            provider=provider_name,
+            model_name=model_name,
+            kind='local',
+            keywords_count=cache_hits + local_hits,
+            cache_hits=cache_hits,
+            local_hits=local_hits,
+        ))
+
+    if records:
+        AIUsageRecord.objects.bulk_create(records, batch_size=500)
+    return len(records)
+
+
+def _latency_percentiles(queryset):
+    latencies = np.fromiter(
+        queryset.exclude(kind='local').values_list('latency_ms', flat=True), dtype=np.int64
+    )
+    if not len(latencies):
+        return {'p50': 0, 'p95': 0, 'max': 0}
+    p50, p95 = np.percentile(latencies, [50, 95])
+    return {'p50': int(p50), 'p95': int(p95), 'max': int(latencies.max())}
+
+
+def summarize_usage(queryset):
+    """جمع مصرف یک QuerySet از AIUsageRecord"""
+    totals = queryset.aggregate(
+        calls=Count('id', filter=~Q(kind='local')),
+        failed_calls=Count('id', filter=Q(success=False)),
+        batch_calls=Count('id', filter=Q(kind='batch')),
+        llm_keywords=Sum('keywords_count', filter=~Q(kind='local')),
+        input_tokens=Sum('input_tokens'),
+        output_tokens=Sum('output_tokens'),
+        cost=Sum('cost'),
+        cache_hits=Sum('cache_hits'),
+        local_hits=Sum('local_hits'),
+    )
+    totals = {key: value or 0 for key, value in totals.items()}
+    totals['cost'] = round(float(totals['cost']), 8)
+
+    resolved = totals['llm_keywords'] + totals['cache_hits'] + totals['local_hits']
+    totals['cache_hit_rate'] = round(totals['cache_hits'] / resolved, 4) if resolved else 0.0
+    totals['cost_per_keyword'] = round(totals['cost'] / totals['llm_keywords'], 8) if totals['llm_keywords'] else 0.0
+    totals['latency_ms'] = _latency_percentiles(queryset)
+    return totals
+
+
+def request_usage(research_request):
+    """مصرف یک درخواست (به تفکیک Provider)"""
+    queryset = AIUsageRecord.objects.filter(request=research_request)
+    providers = queryset.order_by('provider', 'model_name').values_list('provider', 'model_name').distinct()
+
+    return {
+        'request_id': research_request.id,
+        'total': summarize_usage(queryset),
+        'providers': [
+            {
+                'provider': provider,
+                'model_name': model_name,
+                **summarize_usage(queryset.filter(provider=provider, model_name=model_name)),
+            }
+            for provider, model_name in providers
+        ],
+    }
+
+
+def daily_usage(queryset, days=30):
+    """مصرف روزانه N روز اخیر (به تفکیک Provider)"""
+    since = timezone.now() - timedelta(days=days)
+    rows = (
+        queryset.filter(created_date__gte=since)
+        .annotate(day=TruncDate('created_date'))
+        .values('day', 'provider')
+        .annotate(
+            calls=Count('id', filter=~Q(kind='local')),
+            llm_keywords=Sum('keywords_count', filter=~Q(kind='local')),
+            input_tokens=Sum('input_tokens'),
+            output_tokens=Sum('output_tokens'),
+            cost=Sum('cost'),
+            cache_hits=Sum('cache_hits'),
+            local_hits=Sum('local_hits'),
+        )
+        .order_by('day', 'provider')
+    )
+
+    return [
+        {
+            'day': row['day'].isoformat(),
+            'provider': row['provider'],
+            'calls': row['calls'],
+            'llm_keywords': row['llm_keywords'] or 0,
+            'input_tokens': row['input_tokens'] or 0,
+            'output_tokens': row['output_tokens'] or 0,
+            'cost': round(float(row['cost'] or 0), 8),
+            'cache_hits': row['cache_hits'] or 0,
+            'local_hits': row['local_hits'] or 0,
+        }
+        for row in rows
+    ]
@@ -0,0 +1,42 @@
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from keyword_research.models import ResearchRequest
+from .models import AIUsageRecord
+from .usage import request_usage, daily_usage
+
+
+@login_required
+def request_usage_view(request, pk):
+    """مصرف AI یک درخواست (Token، هزینه، Latency، کش)"""
+    if request.user.is_staff:
+        req = get_object_or_404(ResearchRequest, pk=pk)
+    else:
+        req = get_object_or_404(ResearchRequest, pk=pk, user=request.user)
+    
+    return JsonResponse(request_usage(req))
+
+
+@login_required
+def daily_usage_view(request):
+    """
+    مصرف روزانه AI
+
+    کاربر عادی: فقط درخواست‌های خودش | Staff: همه (با ?user=<id> فیلتر میشه)
+    """
+    try:
+        days = min(max(int(request.GET.get('days', 30)), 1), 365)
+    except (TypeError, ValueError):
+        return JsonResponse({'error': 'days باید عدد باشد.'}, status=400)
+    
+    queryset = AIUsageRecord.objects.all()
+    if not request.user.is_staff:
+        queryset = queryset.filter(request__user=request.user)
+    elif request.GET.get('user'):
+        try:
+            user_id = int(request.GET['user'])
+        except ValueError:
+            return JsonResponse({'error': 'user باید عدد باشد.'}, status=400)
+        queryset = queryset.filter(request__user_id=user_id)
+    
+    return JsonResponse({'days': days, 'usage': daily_usage(queryset, days)})
@@ -1,16 +1,22 @@
 from django.contrib import admin
-from .models import GapRequest, GapKeyword
+from .models import GapRequest, GapCompetitor, GapKeywordRow
+
+
+class GapCompetitorInline(admin.TabularInline):
+    model = GapCompetitor
+    extra = 0
 
 
 @admin.register(GapRequest)
 class GapRequestAdmin(admin.ModelAdmin):
-    list_display = ('name', 'user', 'status', 'created_date', 'duration')
-    list_filter = ('status', 'created_date')
+    list_display = ('name', 'user', 'status', 'mode', 'credits_used', 'created_date', 'duration')
+    list_filter = ('status', 'mode', 'created_date')
     search_fields = ('name', 'user__username')
+    inlines = [GapCompetitorInline]
 
 
-@admin.register(GapKeyword)
-class GapKeywordAdmin(admin.ModelAdmin):
-    list_display = ('keyword', 'competitor', 'link', 'user')
-    list_filter = ('competitor', 'user')
-    search_fields = ('keyword', 'competitor')
\ No newline at end of file
+@admin.register(GapKeywordRow)
+class GapKeywordRowAdmin(admin.ModelAdmin):
+    list_display = ('keyword', 'request', 'position')
+    list_select_related = ('request',)
+    search_fields = ('keyword', 'request__name')
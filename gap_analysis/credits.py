@@ -0,0 +1,41 @@
+"""
+محاسبه کردیت Gap Analysis (حالت pair و reuse)
+"""
+
+from django.conf import settings
+from django.db.models import F
+
+
+def resolve_mode(mode, num_competitors):
+    """reuse فقط وقتی به‌صرفه‌ست که تعداد رقبا از هزینه یک SERP عمیق بیشتر باشه"""
+    if mode == 'reuse' and num_competitors > getattr(settings, 'GAP_DEEP_QUERY_CREDITS', 2):
+        return 'reuse'
+    return 'pair'
+
+
+def reserved_credits(num_keywords, num_competitors):
+    """
+    کردیت رزرو شده هنگام ثبت (در هر دو حالت: کلمه × رقیب)
+
+    در حالت reuse بعد از اتمام، کردیت مصرف نشده برگشت داده میشه.
+    """
+    return num_keywords * num_competitors
+
+
+def reuse_credits(num_keywords, fallback_queries):
+    """کردیت واقعی حالت reuse: یک SERP عمیق برای هر کلمه + Query های برند (Fallback)"""
+    return num_keywords * getattr(settings, 'GAP_DEEP_QUERY_CREDITS', 2) + fallback_queries
+
+
+def refund_unused_credits(gap_request, credits_used):
+    """ثبت مصرف واقعی + برگشت باقیمانده رزرو به موجودی کاربر"""
+    from billing.models import UserCredit
+
+    credits_used = min(credits_used, gap_request.credits_reserved)
+    refund = gap_request.credits_reserved - credits_used
+
+    if refund > 0:
+        UserCredit.objects.filter(user=gap_request.user).update(balance=F('balance') + refund)
+
+    gap_request.credits_used = credits_used
+    return refund
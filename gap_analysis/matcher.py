@@ -0,0 +1,95 @@
+"""
+Competitor Domain Matcher (Lookup پسوندی به جای جستجوی زیررشته)
+"""
+
+from urllib.parse import urlsplit
+
+
+def clean_domain(value):
+    """
+    دامنه رقیب از ورودی کاربر (digikala.com / https://www.digikala.com/ / DigiKala.com:443)
+    
+    Returns:
+        str: دامنه با حروف کوچک، بدون پروتکل/www/مسیر/پورت (یا '' اگه خالی بود)
+    """
+    value = str(value or '').strip().lower()
+    if '://' not in value:
+        value = '//' + value
+    
+    try:
+        host = urlsplit(value).hostname or ''
+    except ValueError:
+        return ''
+    
+    host = host.rstrip('.')
+    if host.startswith('www.'):
+        host = host[4:]
+    return host
+
+
+def link_host(link):
+    """Host یک لینک SERP (حروف کوچک، بدون پورت)"""
+    try:
+        return (urlsplit(link).hostname or '').rstrip('.')
+    except ValueError:
+        return ''
+
+
+class CompetitorMatcher:
+    """
+    دامنه همه رقبای یک درخواست یکبار کامپایل میشه
+    
+    - digikala.com → digikala.com و همه زیردامنه‌ها (www. / m. / blog.)
+    - mag.digikala.com → فقط همون زیردامنه و زیردامنه‌هاش
+    - ورودی بدون نقطه (digikala) → هر Host که یکی از Label هاش دقیقاً همین باشه
+    
+    هر لینک یکبار Parse میشه و پسوندهای Host (به تعداد Label ها) در دیکشنری چک میشن.
+    kala.com دیگه با digikala.com Match نمیشه.
+    """
+
+    def __init__(self, competitor_domains):
+        self.domains = list(competitor_domains)
+        self._suffixes = {}
+        self._labels = {}
+        self._compiled = 0
+        
+        for competitor_domain in self.domains:
+            key = clean_domain(competitor_domain)
+            if not key:
+                continue
+            lookup = self._suffixes if '.' in key else self._labels
+            lookup.setdefault(key, []).append(competitor_domain)
+            self._compiled += 1
+
+    def _competitors_for_host(self, host):
+        labels = host.split('.')
+        competitors = []
+        
+        for i in range(len(labels)):
+            competitors.extend(self._suffixes.get('.'.join(labels[i:]), ()))
+        
+        if self._labels:
+            for label in labels:
+                competitors.extend(self._labels.get(label, ()))
+        
+        return competitors
+
+    def match(self, links):
+        """
+        Returns:
+            {competitor_domain: اولین لینک Match شده} (فقط رقبایی که پیدا شدن)
+        """
+        found = {}
+        for link in links:
+            host = link_host(link)
+            if not host:
+                continue
+            for competitor_domain in self._competitors_for_host(host):
+                found.setdefault(competitor_domain, link)
+            if len(found) == self._compiled:
+                break
+        return found
+
+    def find(self, links, competitor_domain):
+        """اولین لینک یک رقیب خاص (یا None)"""
+        return self.match(links).get(competitor_domain)
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.2 on 2026-10-19 13:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gap_analysis', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gaprequest',
+            name='credits_reserved',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='gaprequest',
+            name='credits_used',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='gaprequest',
+            name='mode',
+            field=models.CharField(choices=[('pair', 'جستجوی هر کلمه + برند رقیب'), ('reuse', 'یک SERP عمیق برای هر کلمه')], default='pair', max_length=10),
+        ),
+    ]
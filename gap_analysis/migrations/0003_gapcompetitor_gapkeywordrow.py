@@ -0,0 +1,42 @@
+# Generated by Django 5.1.2 on 2026-10-19 13:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gap_analysis', '0002_gaprequest_credits_reserved_gaprequest_credits_used_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GapCompetitor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('domain', models.CharField(blank=True, max_length=255)),
+                ('brand', models.CharField(max_length=255)),
+                ('request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='competitors', to='gap_analysis.gaprequest')),
+            ],
+            options={
+                'ordering': ['position'],
+                'unique_together': {('request', 'position')},
+            },
+        ),
+        migrations.CreateModel(
+            name='GapKeywordRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(default=0)),
+                ('keyword', models.CharField(max_length=500)),
+                ('links', models.JSONField(default=list)),
+                ('request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rows', to='gap_analysis.gaprequest')),
+            ],
+            options={
+                'ordering': ['position'],
+                'unique_together': {('request', 'keyword')},
+            },
+        ),
+    ]
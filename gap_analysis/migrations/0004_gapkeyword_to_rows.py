@@ -0,0 +1,69 @@
+from django.db import migrations
+
+
+def gapkeyword_to_rows(apps, schema_editor):
+    """
+    GapKeyword (یک ردیف برای هر کلمه × رقیب) → GapCompetitor + GapKeywordRow
+
+    GapKeyword فقط برند رو داشت: رقبای درخواست‌های قدیمی با domain='' ساخته میشن
+    (فقط برای نمایش/خروجی؛ این درخواست‌ها Resume نمیشن و CompetitorMatcher روشون اجرا نمیشه).
+    """
+    GapRequest = apps.get_model('gap_analysis', 'GapRequest')
+    GapKeyword = apps.get_model('gap_analysis', 'GapKeyword')
+    GapCompetitor = apps.get_model('gap_analysis', 'GapCompetitor')
+    GapKeywordRow = apps.get_model('gap_analysis', 'GapKeywordRow')
+
+    for gap_request in GapRequest.objects.filter(keywords__isnull=False).distinct().iterator():
+        cells = GapKeyword.objects.filter(request=gap_request).order_by('id').values_list('keyword', 'competitor', 'link')
+
+        keywords = {}
+        brands = {}
+        for keyword, competitor, link in cells.iterator():
+            keywords.setdefault(keyword, {})[competitor] = link if link and link != '-' else None
+            brands.setdefault(competitor, len(brands))
+
+        # دامنه در GapKeyword ذخیره نمی‌شد؛ فقط برند
+        GapCompetitor.objects.bulk_create([
+            GapCompetitor(request=gap_request, position=position, domain='', brand=brand)
+            for brand, position in brands.items()
+        ])
+        GapKeywordRow.objects.bulk_create([
+            GapKeywordRow(
+                request=gap_request,
+                position=position,
+                keyword=keyword,
+                links=[links.get(brand) for brand in brands],
+            )
+            for position, (keyword, links) in enumerate(keywords.items())
+        ], batch_size=1000)
+
+
+def rows_to_gapkeyword(apps, schema_editor):
+    GapRequest = apps.get_model('gap_analysis', 'GapRequest')
+    GapKeyword = apps.get_model('gap_analysis', 'GapKeyword')
+    GapCompetitor = apps.get_model('gap_analysis', 'GapCompetitor')
+    GapKeywordRow = apps.get_model('gap_analysis', 'GapKeywordRow')
+
+    for gap_request in GapRequest.objects.filter(rows__isnull=False).distinct().iterator():
+        brands = list(GapCompetitor.objects.filter(request=gap_request).order_by('position').values_list('brand', flat=True))
+
+        cells = {}
+        for row in GapKeywordRow.objects.filter(request=gap_request).order_by('position').iterator():
+            for brand, link in zip(brands, row.links):
+                cells[(row.keyword, brand)] = link or '-'
+
+        GapKeyword.objects.bulk_create([
+            GapKeyword(user_id=gap_request.user_id, request=gap_request, keyword=keyword, competitor=brand, link=link)
+            for (keyword, brand), link in cells.items()
+        ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gap_analysis', '0003_gapcompetitor_gapkeywordrow'),
+    ]
+
+    operations = [
+        migrations.RunPython(gapkeyword_to_rows, rows_to_gapkeyword),
+    ]
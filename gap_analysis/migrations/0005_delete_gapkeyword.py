@@ -0,0 +1,16 @@
+# Generated by Django 5.1.2 on 2026-10-19 13:46
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gap_analysis', '0004_gapkeyword_to_rows'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='GapKeyword',
+        ),
+    ]
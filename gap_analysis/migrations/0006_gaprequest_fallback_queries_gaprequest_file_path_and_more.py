@@ -0,0 +1,33 @@
+# Generated by Django 5.1.2 on 2026-10-19 13:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gap_analysis', '0005_delete_gapkeyword'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gaprequest',
+            name='fallback_queries',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='gaprequest',
+            name='file_path',
+            field=models.CharField(blank=True, max_length=500),
+        ),
+        migrations.AddField(
+            model_name='gaprequest',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='gaprequest',
+            name='lease_owner',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
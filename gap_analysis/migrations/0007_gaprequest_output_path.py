@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-19 13:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gap_analysis', '0006_gaprequest_fallback_queries_gaprequest_file_path_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gaprequest',
+            name='output_path',
+            field=models.CharField(blank=True, max_length=500),
+        ),
+    ]
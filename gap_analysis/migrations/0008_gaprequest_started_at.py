@@ -0,0 +1,25 @@
+# Generated by Django 5.1.2 on 2026-10-19 14:19
+
+from django.db import migrations, models
+
+
+def mark_running_started(apps, schema_editor):
+    """درخواست‌های running که قبلاً Heartbeat داشتن (Worker برداشته) → همچنان قابل Resume"""
+    GapRequest = apps.get_model('gap_analysis', 'GapRequest')
+    GapRequest.objects.filter(status='running', heartbeat_at__isnull=False).update(started_at=models.F('heartbeat_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gap_analysis', '0007_gaprequest_output_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gaprequest',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(mark_running_started, migrations.RunPython.noop),
+    ]
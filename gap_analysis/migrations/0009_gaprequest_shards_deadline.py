@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-19 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gap_analysis', '0008_gaprequest_started_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gaprequest',
+            name='shards_deadline',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
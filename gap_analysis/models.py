@@ -3,21 +3,6 @@ from django.conf import settings
 from django.utils import timezone
 
 
-class GapKeyword(models.Model):
-    """مدل برای ذخیره کلمات و لینک‌های رقبا"""
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    request = models.ForeignKey('GapRequest', on_delete=models.CASCADE, related_name='keywords')
-    keyword = models.CharField(max_length=500)  # کلمه کلیدی
-    competitor = models.CharField(max_length=255)  # دامنه رقیب
-    link = models.TextField(blank=True, default="-")  # لینک پیدا شده یا "-"
-    
-    class Meta:
-        unique_together = ('request', 'keyword', 'competitor')
-    
-    def __str__(self):
-        return f"{self.keyword} - {self.competitor}"
-
-
 class GapRequest(models.Model):
     """مدل برای درخواست Gap Analysis"""
     STATUS_CHOICES = [
@@ -27,6 +12,11 @@ class GapRequest(models.Model):
         ('failed', 'ناموفق'),
     ]
     
+    MODE_CHOICES = [
+        ('pair', 'جستجوی هر کلمه + برند رقیب'),
+        ('reuse', 'یک SERP عمیق برای هر کلمه'),
+    ]
+    
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     name = models.CharField(max_length=100)  # 3 کلمه اول توضیحات + "..."
     description = models.TextField(blank=True)  # توضیحات کامل کاربر
@@ -35,6 +25,16 @@ class GapRequest(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     task_id = models.CharField(max_length=255, blank=True, null=True)
     error_message = models.TextField(blank=True, null=True)
+    mode = models.CharField(max_length=10, choices=MODE_CHOICES, default='pair')
+    credits_reserved = models.IntegerField(default=0)  # کسر شده هنگام ثبت
+    credits_used = models.IntegerField(null=True, blank=True)  # مصرف واقعی (reuse: بقیه برگشت داده میشه)
+    fallback_queries = models.IntegerField(default=0)  # reuse: Query های برند انجام شده (جمع همه Checkpoint ها)
+    file_path = models.CharField(max_length=500, blank=True)  # فایل آپلود شده (برای ادامه Task بعد از Restart)
+    lease_owner = models.CharField(max_length=255, blank=True)  # Task ای که الان روی درخواست کار میکنه
+    heartbeat_at = models.DateTimeField(null=True, blank=True)  # آخرین Heartbeat؛ قدیمی‌تر از GAP_LEASE_TIMEOUT = Task مرده
+    started_at = models.DateTimeField(null=True, blank=True)  # Worker واقعاً Task رو برداشت (None = هنوز در صف؛ Resume نمیشه)
+    shards_deadline = models.DateTimeField(null=True, blank=True)  # Chord در جریان: تا این لحظه بدون Heartbeat هم Task مرده حساب نمیشه
+    output_path = models.CharField(max_length=500, blank=True)  # Excel خروجی (بعد از تکمیل ساخته میشه)
     
     def __str__(self):
         return f"{self.name} - {self.user.username}"
@@ -47,4 +47,34 @@ class GapRequest(models.Model):
             minutes = int(delta.total_seconds() / 60)
             seconds = int(delta.total_seconds() % 60)
             return f"{minutes}m {seconds}s"
-        return "-"
\ No newline at end of file
+        return "-"
+
+
+class GapCompetitor(models.Model):
+    """رقبای یک درخواست (ستون‌های ماتریس نتایج)"""
+    request = models.ForeignKey('GapRequest', on_delete=models.CASCADE, related_name='competitors')
+    position = models.PositiveIntegerField()  # ایندکس در GapKeywordRow.links
+    domain = models.CharField(max_length=255, blank=True)  # دامنه رقیب
+    brand = models.CharField(max_length=255)  # اسم برند (عنوان ستون)
+    
+    class Meta:
+        unique_together = ('request', 'position')
+        ordering = ['position']
+    
+    def __str__(self):
+        return f"{self.brand} ({self.domain})"
+
+
+class GapKeywordRow(models.Model):
+    """یک سطر ماتریس نتایج: لینک پیدا شده هر رقیب به ترتیب GapCompetitor.position (None = یافت نشد)"""
+    request = models.ForeignKey('GapRequest', on_delete=models.CASCADE, related_name='rows')
+    position = models.PositiveIntegerField(default=0)  # ترتیب کلمه در فایل
+    keyword = models.CharField(max_length=500)  # کلمه کلیدی
+    links = models.JSONField(default=list)
+    
+    class Meta:
+        unique_together = ('request', 'keyword')
+        ordering = ['position']
+    
+    def __str__(self):
+        return self.keyword
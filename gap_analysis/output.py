@@ -0,0 +1,52 @@
+"""
+خروجی Gap Analysis (ماتریس کلمه × رقیب + فایل Excel)
+"""
+
+import os
+import uuid
+
+import pandas as pd
+from django.conf import settings
+
+
+def gap_matrix(gap_request):
+    """
+    ماتریس نتایج (مستقیم از GapKeywordRow، بدون Pivot)
+
+    Returns:
+        (brands, [(keyword, [link یا None به ترتیب brands])])
+    """
+    competitors = list(gap_request.competitors.order_by('position').values_list('brand', flat=True))
+    rows = [
+        (keyword, (links + [None] * len(competitors))[:len(competitors)])
+        for keyword, links in gap_request.rows.order_by('position').values_list('keyword', 'links')
+    ]
+    return competitors, rows
+
+
+def write_gap_excel(gap_request, target):
+    """نوشتن Excel خروجی در target (مسیر فایل یا HttpResponse)"""
+    competitors, rows = gap_matrix(gap_request)
+
+    df = pd.DataFrame(
+        [[keyword] + [link or '-' for link in links] for keyword, links in rows],
+        columns=['کلمات'] + competitors
+    )
+
+    with pd.ExcelWriter(target, engine='openpyxl') as writer:
+        df.to_excel(writer, sheet_name='Gap Analysis', index=False)
+
+
+def build_gap_output(gap_request):
+    """
+    ساخت Excel خروجی روی دیسک بعد از تکمیل (دانلود فقط فایل آماده رو میفرسته)
+
+    Returns:
+        str: مسیر فایل
+    """
+    output_dir = os.path.join(settings.MEDIA_ROOT, 'gap_outputs')
+    os.makedirs(output_dir, exist_ok=True)
+
+    output_path = os.path.join(output_dir, f"{gap_request.id}_{uuid.uuid4().hex}.xlsx")
+    write_gap_excel(gap_request, output_path)
+    return output_path
@@ -1,47 +1,387 @@
-from celery import shared_task
+from celery import shared_task, chord
 from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
 from django.utils import timezone
-import requests
+from datetime import timedelta
+import threading
 import time
+import uuid
 import pandas as pd
-from urllib.parse import urlparse
-from .models import GapRequest, GapKeyword
+from serp.client import get_serp_provider, search_many
+from .models import GapRequest, GapCompetitor, GapKeywordRow
+from .credits import refund_unused_credits, reuse_credits
+from .matcher import CompetitorMatcher
+from .output import build_gap_output
+from keyword_research.progress import ProgressReporter
 
 
-def extract_domain(url):
-    """استخراج دامنه از URL (با پشتیبانی subdomain)"""
-    try:
-        parsed = urlparse(url)
-        domain = parsed.netloc.lower()
-        if domain.startswith('www.'):
-            domain = domain[4:]
-        return domain if domain else None
-    except:
-        return None
+def save_gap_competitors(gap_request, competitors_dict):
+    """ستون‌های ماتریس: یک GapCompetitor برای هر دامنه (به ترتیب فایل)"""
+    GapCompetitor.objects.filter(request=gap_request).delete()
+    GapCompetitor.objects.bulk_create([
+        GapCompetitor(request=gap_request, position=position, domain=competitor_domain, brand=competitor_brand)
+        for position, (competitor_domain, competitor_brand) in enumerate(competitors_dict.items())
+    ])
+
+
+def save_gap_rows(gap_request, keywords, competitors_dict, found_links, chunk_size=None, positions=None):
+    """
+    ذخیره Bulk نتایج: یک GapKeywordRow برای هر کلمه (Upsert روی request/keyword)
+    
+    Args:
+        found_links: {(keyword, competitor_domain): link یا None}
+        chunk_size: تعداد ردیف در هر Flush (هر Flush یک Transaction)
+        positions: ترتیب هر کلمه در فایل (پیش‌فرض: ترتیب همین لیست)
+    
+    Returns:
+        int: تعداد ردیف ذخیره شده
+    """
+    chunk_size = chunk_size or getattr(settings, 'GAP_BULK_CHUNK_SIZE', 2000)
+    
+    objects = [
+        GapKeywordRow(
+            request=gap_request,
+            position=position,
+            keyword=keyword,
+            links=[found_links.get((keyword, competitor_domain)) or None for competitor_domain in competitors_dict],
+        )
+        for position, keyword in zip(positions or range(len(keywords)), keywords)
+    ]
+    
+    for i in range(0, len(objects), chunk_size):
+        with transaction.atomic():
+            GapKeywordRow.objects.bulk_create(
+                objects[i:i + chunk_size],
+                update_conflicts=True,
+                unique_fields=['request', 'keyword'],
+                update_fields=['position', 'links'],
+            )
+    
+    return len(objects)
+
+
+def _search_pairs(pairs, competitors_dict, matcher, provider, progress=None):
+    """
+    یک Query برند برای هر (keyword, competitor_domain) → top 10
+    
+    Returns:
+        ({(keyword, competitor_domain): link یا None}, failed_count)
+    """
+    results = search_many(
+        [f"{keyword} {competitors_dict[competitor_domain]}" for keyword, competitor_domain in pairs],
+        num=10, provider=provider, on_result=progress.on_result if progress else None
+    )
+    
+    found_links = {}
+    failed_count = 0
+    for (keyword, competitor_domain), result in zip(pairs, results):
+        if result.ok:
+            found_links[(keyword, competitor_domain)] = matcher.find(result.links[:10], competitor_domain)
+        else:
+            found_links[(keyword, competitor_domain)] = None
+            failed_count += 1
+    
+    return found_links, failed_count
+
+
+def _search_pair_mode(keywords, competitors_dict, matcher, provider, progress=None):
+    """حالت pair: همه keyword × competitor"""
+    pairs = [(keyword, competitor_domain) for keyword in keywords for competitor_domain in competitors_dict]
+    return _search_pairs(pairs, competitors_dict, matcher, provider, progress)
+
+
+def _search_reuse_mode(keywords, competitors_dict, matcher, provider, claim_fallback, progress=None):
+    """
+    حالت reuse: یک SERP عمیق (GAP_DEEP_SERP_DEPTH) برای هر کلمه، همه رقبا در یک مرحله چک میشن
+    
+    رقبایی که پیدا نشدن (اگه GAP_REUSE_FALLBACK فعال باشه) با Query برند جستجو میشن،
+    فقط به تعدادی که claim_fallback(wanted) از بودجه مشترک درخواست بده (تا هزینه از حالت pair بیشتر نشه).
+    
+    Returns:
+        ({(keyword, competitor_domain): link یا None}, failed_count, fallback_queries)
+    """
+    depth = getattr(settings, 'GAP_DEEP_SERP_DEPTH', 100)
+    
+    deep_results = search_many(keywords, num=depth, provider=provider, on_result=progress.on_result if progress else None)
+    
+    found_links = {}
+    failed_count = 0
+    for keyword, result in zip(keywords, deep_results):
+        if not result.ok:
+            failed_count += 1
+        # ✅ یک Pass روی لینک ها برای همه رقبا
+        matches = matcher.match(result.links) if result.ok else {}
+        for competitor_domain in competitors_dict:
+            found_links[(keyword, competitor_domain)] = matches.get(competitor_domain)
+    
+    if not getattr(settings, 'GAP_REUSE_FALLBACK', True):
+        return found_links, failed_count, 0
+    
+    missing = [pair for pair, found_link in found_links.items() if not found_link]
+    missing = missing[:claim_fallback(len(missing))] if missing else []
+    if not missing:
+        return found_links, failed_count, 0
+    
+    if progress:
+        progress.total += len(missing)
+    fallback_links, fallback_failed = _search_pairs(missing, competitors_dict, matcher, provider, progress)
+    
+    found_links.update(fallback_links)
+    return found_links, failed_count + fallback_failed, len(missing)
+
+
+class LeaseLost(Exception):
+    """Lease درخواست به Task دیگه ای رسیده (این Task مرده فرض شده بود)"""
+
+
+def _stale_before():
+    return timezone.now() - timedelta(seconds=getattr(settings, 'GAP_LEASE_TIMEOUT', 120))
+
+
+def _stale_lease():
+    """
+    Lease مرده: Heartbeat قدیمی‌تر از GAP_LEASE_TIMEOUT و Chord در جریان نیست (یا shards_deadline گذشته)
+    
+    Task اصلی بعد از ارسال Shard ها تموم میشه و Heartbeat ش قطع میشه؛ تا Shard ها در صف منتظر Worker ان،
+    shards_deadline جلوی Resume (و Fail شدن Lease خود Shard ها) رو میگیره.
+    """
+    return Q(heartbeat_at__lt=_stale_before()) & (Q(shards_deadline__isnull=True) | Q(shards_deadline__lt=timezone.now()))
+
+
+def _acquire_lease(request_id, owner):
+    """
+    گرفتن Lease درخواست (یک UPDATE شرطی، Atomic)
+    
+    فقط اگه درخواست تموم نشده و Lease مال همین Task ـه، یا Heartbeat نداره / قدیمی‌تر از GAP_LEASE_TIMEOUT ـه.
+    started_at همینجا ثبت میشه: فقط درخواستی که یک Worker واقعاً برداشته Resume میشه (نه درخواستی که هنوز در صفه).
+    
+    Returns:
+        bool: True اگه این Task صاحب درخواست شد
+    """
+    return GapRequest.objects.filter(
+        Q(lease_owner=owner) | Q(heartbeat_at__isnull=True) | _stale_lease(),
+        id=request_id,
+        status__in=['pending', 'running'],
+    ).update(
+        lease_owner=owner, heartbeat_at=timezone.now(), started_at=timezone.now(), shards_deadline=None, status='running'
+    ) == 1
+
+
+def _renew_lease(request_id, owner):
+    """تمدید Heartbeat (False = Lease از دست رفته)"""
+    return GapRequest.objects.filter(id=request_id, lease_owner=owner).update(heartbeat_at=timezone.now()) == 1
+
+
+def _extend_shards_deadline(request_id, owner):
+    """
+    ارسال Chord یا شروع هر Shard: Lease تا GAP_SHARD_QUEUE_TIMEOUT ثانیه بعد زنده ست (حتی بدون Heartbeat)
+    
+    Returns:
+        bool: False = Lease از دست رفته
+    """
+    now = timezone.now()
+    return GapRequest.objects.filter(id=request_id, lease_owner=owner).update(
+        heartbeat_at=now,
+        shards_deadline=now + timedelta(seconds=getattr(settings, 'GAP_SHARD_QUEUE_TIMEOUT', 3600)),
+    ) == 1
+
+
+def _start_heartbeat(request_id, owner):
+    """
+    Thread پس‌زمینه: هر GAP_HEARTBEAT_INTERVAL ثانیه heartbeat_at رو تمدید میکنه (حتی وسط یک Window طولانی)
+    
+    Returns:
+        threading.Event: set() → توقف Heartbeat
+    """
+    stop_event = threading.Event()
+    interval = getattr(settings, 'GAP_HEARTBEAT_INTERVAL', 30)
+    
+    def beat():
+        try:
+            while not stop_event.wait(interval):
+                try:
+                    if not _renew_lease(request_id, owner):
+                        print(f"[GAP ANALYSIS] Lease of request {request_id} lost → heartbeat stopped")
+                        break
+                except Exception as e:
+                    print(f"[GAP ANALYSIS] Heartbeat failed: {str(e)}")
+        finally:
+            connection.close()  # Connection مخصوص همین Thread
+    
+    threading.Thread(target=beat, name=f"gap-heartbeat-{request_id}", daemon=True).start()
+    return stop_event
+
+
+def _claim_fallback_budget(request_id, wanted, budget):
+    """
+    برداشت Atomic از بودجه مشترک Query های fallback (Shard ها همزمان برداشت میکنن)
+    
+    Returns:
+        int: تعداد Query مجاز (شمارنده fallback_queries همینجا زیاد میشه)
+    """
+    while wanted > 0:
+        used = GapRequest.objects.filter(id=request_id).values_list('fallback_queries', flat=True).first() or 0
+        granted = min(wanted, budget - used)
+        if granted <= 0:
+            return 0
+        # ✅ Compare-and-set: اگه Shard دیگه ای وسطش برداشت کرد، دوباره
+        if GapRequest.objects.filter(id=request_id, fallback_queries=used).update(fallback_queries=used + granted):
+            return granted
+    return 0
+
+
+def _checkpoint_windows(gap_request, pending, competitors_dict, owner, fallback_budget, progress=None, on_checkpoint=None):
+    """
+    جستجوی کلمات pending در Window های حدود GAP_CHECKPOINT_QUERIES Query ای + ذخیره هر Window (Checkpoint)
+    
+    Checkpoint در سطح کلمه ست (ردیف کلمه بعد از تموم شدن همه رقباش ذخیره میشه)؛
+    با Restart حداکثر یک Window (حدود GAP_CHECKPOINT_QUERIES Query) دوباره جستجو میشه.
+    
+    Args:
+        pending: [(position, keyword)]
+        fallback_budget: سقف کل Query های fallback درخواست (حالت reuse)
+        progress: ProgressReporter (پیشرفت به ازای هر Query) یا None
+        on_checkpoint: بعد از ذخیره هر Window صدا زده میشه
+    
+    Returns:
+        int: تعداد خطای API
+    
+    Raises:
+        LeaseLost: درخواست به Task دیگه ای رسیده
+    """
+    provider = get_serp_provider(settings.GAP_SERP_PROVIDER)
+    matcher = CompetitorMatcher(competitors_dict)
+    queries_per_keyword = 1 if gap_request.mode == 'reuse' else max(1, len(competitors_dict))
+    window_size = max(1, getattr(settings, 'GAP_CHECKPOINT_QUERIES', 200) // queries_per_keyword)
+    failed_count = 0
+    
+    def claim_fallback(wanted):
+        return _claim_fallback_budget(gap_request.id, wanted, fallback_budget)
+    
+    for i in range(0, len(pending), window_size):
+        window_positions = [position for position, keyword in pending[i:i + window_size]]
+        window_keywords = [keyword for position, keyword in pending[i:i + window_size]]
+        
+        if gap_request.mode == 'reuse':
+            found_links, window_failed, _ = _search_reuse_mode(
+                window_keywords, competitors_dict, matcher, provider, claim_fallback, progress
+            )
+        else:
+            found_links, window_failed = _search_pair_mode(window_keywords, competitors_dict, matcher, provider, progress)
+        
+        with transaction.atomic():
+            if not _renew_lease(gap_request.id, owner):
+                raise LeaseLost(f"Request {gap_request.id} taken over by another task")
+            save_gap_rows(gap_request, window_keywords, competitors_dict, found_links, positions=window_positions)
+        
+        failed_count += window_failed
+        if on_checkpoint:
+            on_checkpoint()
+    
+    return failed_count
 
 
-def check_competitor_in_links(links, competitor_domain):
+def _finish_gap_request(gap_request, keywords_count, owner, progress):
     """
-    چک کردن لینک‌ها برای پیدا کردن دامنه رقیب
-    Returns: لینک کامل اولین match یا None
+    مرحله آخر (Task تکی یا Aggregation بعد از Shard ها): کردیت، Excel خروجی، تکمیل درخواست
+    
+    Returns:
+        dict: نتیجه Task (completed / incomplete)
     """
-    competitor_clean = competitor_domain.lower().replace('www.', '').replace('https://', '').replace('http://', '')
+    gap_request.refresh_from_db()
+    competitors_count = gap_request.competitors.count()
+    
+    # ✅ کلمه ای که ردیف نداره (Shard کشته شده) → تکمیل نمیکنیم؛ resume_stale_gap_requests ادامه میده
+    done_count = GapKeywordRow.objects.filter(request=gap_request).count()
+    if done_count < keywords_count:
+        print(f"[GAP ANALYSIS] Request {gap_request.id}: {done_count}/{keywords_count} keywords done → waiting for resume")
+        return {'status': 'incomplete', 'done': done_count}
+    
+    if gap_request.mode == 'reuse':
+        total_queries = keywords_count + gap_request.fallback_queries
+        refund = refund_unused_credits(gap_request, reuse_credits(keywords_count, gap_request.fallback_queries))
+        print(f"[GAP ANALYSIS] Reuse: {keywords_count} deep + {gap_request.fallback_queries} fallback queries | Refund: {refund} credits")
+    else:
+        total_queries = keywords_count * competitors_count
+        gap_request.credits_used = gap_request.credits_reserved
+    
+    found_count = sum(
+        1
+        for links in GapKeywordRow.objects.filter(request=gap_request).values_list('links', flat=True).iterator()
+        for found_link in links if found_link
+    )
+    print(f"[GAP ANALYSIS] Found: {found_count}/{keywords_count * competitors_count}")
+    
+    progress.set_stage('output')
+    output_start = time.time()
+    gap_request.output_path = build_gap_output(gap_request)
+    print(f"[GAP ANALYSIS] Output built: {time.time() - output_start:.2f}s")
     
-    for link in links:
-        link_domain = extract_domain(link)
-        if link_domain and competitor_clean in link_domain:
-            return link
+    progress.finish(found=found_count)
     
-    return None
+    gap_request.status = 'completed'
+    gap_request.completed_date = timezone.now()
+    gap_request.lease_owner = ''
+    gap_request.heartbeat_at = timezone.now()
+    gap_request.save(update_fields=[
+        'status', 'completed_date', 'lease_owner', 'heartbeat_at', 'credits_used', 'output_path'
+    ])
+    
+    print(f"\n[GAP ANALYSIS] Completed successfully!")
+    
+    return {'status': 'completed', 'total': total_queries}
+
+
+def _fail_gap_request(request_id, owner, error):
+    """فقط اگه Lease هنوز مال همین Task ـه (Task زامبی درخواست ادامه داده شده رو Fail نکنه)"""
+    GapRequest.objects.filter(id=request_id, lease_owner=owner).update(
+        status='failed',
+        error_message=error,
+        completed_date=timezone.now(),
+        lease_owner='',
+    )
+    print(f"\n[GAP ANALYSIS] Failed: {error}")
+
+
+def _split_shards(pending):
+    """
+    تقسیم کلمات باقیمانده به Shard (حداقل GAP_SHARD_KEYWORDS کلمه، حداکثر GAP_MAX_SHARDS تا)
+    
+    Returns:
+        list: [[(position, keyword)]] (یک Shard = اجرای تکی بدون Chord)
+    """
+    shard_keywords = getattr(settings, 'GAP_SHARD_KEYWORDS', 500)
+    if shard_keywords <= 0 or len(pending) < 2 * shard_keywords:
+        return [pending]
+    
+    shards_count = min(max(1, getattr(settings, 'GAP_MAX_SHARDS', 32)), len(pending) // shard_keywords)
+    shard_size = -(-len(pending) // shards_count)
+    return [pending[i:i + shard_size] for i in range(0, len(pending), shard_size)]
 
 
 @shared_task(bind=True, max_retries=0)
 def process_gap_analysis(self, request_id, file_path, description):
-    """Task اصلی برای Gap Analysis"""
+    """
+    Task اصلی برای Gap Analysis
+    
+    ✅ قابل ادامه بعد از Restart (Deploy، OOM، stop_workers.sh):
+    کلمات در Window های حدود GAP_CHECKPOINT_QUERIES Query ای جستجو و همون لحظه ذخیره میشن (هر GapKeywordRow = یک کلمه تمام شده).
+    اجرای بعدی فقط کلماتی رو جستجو میکنه که هنوز ردیف ندارن؛ Lease/Heartbeat روی GapRequest جلوی اجرای همزمان دو Task رو میگیره.
+    
+    ✅ درخواست بزرگ: کلمات باقیمانده به Shard تقسیم میشن و به صورت Chord روی همه Worker ها اجرا میشن
+    (همه پشت همون Rate Limiter مشترک Serper)؛ finalize_gap_analysis درخواست رو تکمیل میکنه.
+    """
+    owner = self.request.id
+    
+    if not _acquire_lease(request_id, owner):
+        print(f"\n[GAP ANALYSIS] Request {request_id} is finished or owned by a live task → skipped")
+        return {'status': 'skipped'}
+    
+    stop_heartbeat = _start_heartbeat(request_id, owner)
+    
     try:
         gap_request = GapRequest.objects.get(id=request_id)
-        gap_request.status = 'running'
-        gap_request.save()
         
         if file_path.endswith('.csv'):
             df = pd.read_csv(file_path)
@@ -60,133 +400,169 @@ def process_gap_analysis(self, request_id, file_path, description):
         keywords = df.iloc[:, 1].dropna().astype(str).str.strip().unique().tolist()
         keywords = [k for k in keywords if k]
         
-        total_queries = len(keywords) * len(competitors_dict)
-        current_query = 0
-        
-        print(f"\n[GAP ANALYSIS] Starting: {len(keywords)} keywords × {len(competitors_dict)} competitors = {total_queries} queries")
-        
-        GapKeyword.objects.filter(request=gap_request).delete()
-        
-        for keyword in keywords:
-            for competitor_domain, competitor_brand in competitors_dict.items():
-                current_query += 1
-                
-                query = f"{keyword} {competitor_brand}"
-                
-                self.update_state(
-                    state='PROGRESS',
-                    meta={
-                        'current': current_query,
-                        'total': total_queries,
-                        'query': query
-                    }
-                )
-                
-                print(f"[{current_query}/{total_queries}] Searching: {query}")
-                
-                url = "https://api.apify.com/v2/acts/apify~google-search-scraper/runs"
-                payload = {
-                    "queries": query,
-                    "maxPagesPerQuery": 1
-                }
-                headers = {
-                    "Authorization": f"Bearer {settings.APIFY_TOKEN}",
-                    "Content-Type": "application/json"
-                }
-                
-                found_link = "-"
-                
-                try:
-                    response = None
-                    for attempt in range(5):
-                        try:
-                            response = requests.post(url, json=payload, headers=headers, timeout=120)
-                            if response.status_code == 429:
-                                wait_time = (2 ** attempt)
-                                print(f"  [Retry {attempt+1}] Rate limit! Waiting {wait_time}s...")
-                                time.sleep(wait_time)
-                                continue
-                            break
-                        except requests.exceptions.RequestException as e:
-                            if attempt < 4:
-                                print(f"  [Retry {attempt+1}] Error: {str(e)}")
-                                time.sleep(1)
-                            else:
-                                response = None
-                                break
-                    
-                    if response and response.status_code == 201:
-                        run_data = response.json()
-                        run_id = run_data['data']['id']
-                        
-                        max_wait = 600
-                        start_time = time.time()
-                        
-                        while time.time() - start_time < max_wait:
-                            status_url = f"https://api.apify.com/v2/actor-runs/{run_id}?token={settings.APIFY_TOKEN}"
-                            status_response = requests.get(status_url, timeout=30)
-                            status_data = status_response.json()
-                            
-                            if status_data['data']['status'] == 'SUCCEEDED':
-                                dataset_id = status_data['data']['defaultDatasetId']
-                                results_url = f"https://api.apify.com/v2/datasets/{dataset_id}/items?token={settings.APIFY_TOKEN}&format=json"
-                                results_response = requests.get(results_url, timeout=60)
-                                results = results_response.json()
-                                
-                                links = []
-                                for result in results:
-                                    if 'organicResults' in result:
-                                        links.extend([item['url'] for item in result['organicResults'] if 'url' in item])
-                                
-                                links = links[:10]
-                                
-                                found_link = check_competitor_in_links(links, competitor_domain)
-                                if found_link:
-                                    print(f"  Found: {found_link}")
-                                else:
-                                    found_link = "-"
-                                    print(f"  Not found in top 10")
-                                
-                                break
-                            
-                            elif status_data['data']['status'] in ['FAILED', 'ABORTED']:
-                                print(f"  API failed")
-                                break
-                            
-                            time.sleep(5)
-                        else:
-                            print(f"  Timeout")
-                    
-                    else:
-                        print(f"  API error: {response.status_code if response else 'No response'}")
-                
-                except Exception as e:
-                    print(f"  Exception: {str(e)}")
-                
-                GapKeyword.objects.update_or_create(
-                    user=gap_request.user,
-                    request=gap_request,
-                    keyword=keyword,
-                    competitor=competitor_brand,
-                    defaults={'link': found_link if found_link else "-"}
-                )
-                
-                time.sleep(1)
-        
-        gap_request.status = 'completed'
-        gap_request.completed_date = timezone.now()
-        gap_request.save()
-        
-        print(f"\n[GAP ANALYSIS] Completed successfully!")
-        
-        return {'status': 'completed', 'total': total_queries}
+        if not gap_request.competitors.exists():
+            save_gap_competitors(gap_request, competitors_dict)
+        
+        # ✅ Checkpoint: کلماتی که ردیف دارن قبلاً کامل شدن
+        done_keywords = set(GapKeywordRow.objects.filter(request=gap_request).values_list('keyword', flat=True))
+        pending = [(position, keyword) for position, keyword in enumerate(keywords) if keyword not in done_keywords]
+        resumed_count = len(keywords) - len(pending)
+        
+        fallback_budget = gap_request.credits_reserved - reuse_credits(len(keywords), 0)
+        shards = _split_shards(pending)
+        
+        print(f"\n[GAP ANALYSIS] Starting ({gap_request.mode}): {len(keywords)} keywords × {len(competitors_dict)} competitors ({settings.GAP_SERP_PROVIDER}, {len(shards)} shards)")
+        if resumed_count:
+            print(f"[GAP ANALYSIS] Resuming: {resumed_count} keywords already done, {len(pending)} left")
+        
+        if len(shards) > 1:
+            # ✅ قبل از ارسال: Heartbeat این Task با return قطع میشه و Shard ها ممکنه مدتی در صف بمونن
+            _extend_shards_deadline(request_id, owner)
+            chord(
+                [process_gap_shard.s(request_id, owner, shard, fallback_budget, len(keywords)) for shard in shards]
+            )(finalize_gap_analysis.s(request_id, owner, len(keywords)))
+            
+            print(f"[GAP ANALYSIS] {len(pending)} keywords queued in {len(shards)} shards of ~{len(shards[0])}")
+            return {'status': 'sharded', 'shards': len(shards)}
+        
+        queries_per_keyword = 1 if gap_request.mode == 'reuse' else len(competitors_dict)
+        progress = ProgressReporter(self, gap_request.user_id, 'gap', gap_request.id, total=len(keywords) * queries_per_keyword, stage='serp')
+        progress.current = resumed_count * queries_per_keyword
+        
+        start_time = time.time()
+        failed_count = _checkpoint_windows(gap_request, pending, competitors_dict, owner, fallback_budget, progress=progress)
+        print(f"[GAP ANALYSIS] SERP phase: {time.time() - start_time:.2f}s | API errors (this run): {failed_count}")
+        
+        return _finish_gap_request(gap_request, len(keywords), owner, progress)
+    
+    except LeaseLost as e:
+        print(f"\n[GAP ANALYSIS] {str(e)} → stopped")
+        
+        return {'status': 'skipped'}
+    
+    except Exception as e:
+        _fail_gap_request(request_id, owner, str(e))
+        
+        return {'status': 'failed', 'error': str(e)}
+    
+    finally:
+        stop_heartbeat.set()
+
+
+@shared_task(bind=True, max_retries=0)
+def process_gap_shard(self, request_id, owner, shard, fallback_budget, keywords_count):
+    """
+    یک Shard از کلمات درخواست (Heartbeat با Lease همون Task اصلی)
+    
+    شروع هر Shard shards_deadline رو تمدید میکنه (Shard های بعدی هنوز در صف ان).
+    
+    پیشرفت بر اساس تعداد کلمات ذخیره شده کل درخواست (همه Shard ها) بعد از هر Checkpoint روی Task اصلی
+    (gap_request.task_id) منتشر میشه.
+    """
+    worker_name = self.request.hostname
+    task_id_short = self.request.id[:8]
+    
+    # ✅ Shard های یک اجرای قدیمی (درخواست حذف یا ادامه داده شده) کاری نمیکنن
+    if not _extend_shards_deadline(request_id, owner):
+        print(f"[{worker_name}] [{task_id_short}] ⚠️ Gap shard of request {request_id}: lease lost → skipped")
+        return {'status': 'skipped'}
     
+    stop_heartbeat = _start_heartbeat(request_id, owner)
+    
+    try:
+        gap_request = GapRequest.objects.get(id=request_id)
+        competitors_dict = dict(gap_request.competitors.order_by('position').values_list('domain', 'brand'))
+        
+        done_keywords = set(GapKeywordRow.objects.filter(request=gap_request).values_list('keyword', flat=True))
+        pending = [(position, keyword) for position, keyword in shard if keyword not in done_keywords]
+        
+        progress = ProgressReporter(
+            self, gap_request.user_id, 'gap', gap_request.id, total=keywords_count, stage='serp', result_id=gap_request.task_id
+        )
+        
+        def on_checkpoint():
+            progress.update(GapKeywordRow.objects.filter(request=gap_request).count())
+        
+        start_time = time.time()
+        failed_count = _checkpoint_windows(gap_request, pending, competitors_dict, owner, fallback_budget, on_checkpoint=on_checkpoint)
+        
+        print(f"[{worker_name}] [{task_id_short}] 🔎 Gap shard: {len(pending)} keywords in {time.time() - start_time:.2f}s | API errors: {failed_count}")
+        return {'status': 'done', 'keywords': len(pending), 'failed': failed_count}
+    
+    except LeaseLost as e:
+        print(f"[{worker_name}] [{task_id_short}] ⚠️ {str(e)} → stopped")
+        return {'status': 'skipped'}
+    
+    # ✅ خطا نباید Chord رو متوقف کنه (کلمات این Shard با resume_stale_gap_requests ادامه پیدا میکنن)
     except Exception as e:
-        gap_request.status = 'failed'
-        gap_request.error_message = str(e)
-        gap_request.completed_date = timezone.now()
-        gap_request.save()
+        print(f"[{worker_name}] [{task_id_short}] ❌ Gap shard failed: {str(e)}")
+        return {'status': 'failed', 'error': str(e)}
+    
+    finally:
+        stop_heartbeat.set()
+
+
+@shared_task(bind=True, max_retries=0)
+def finalize_gap_analysis(self, shard_results, request_id, owner, keywords_count):
+    """
+    بعد از همه Shard ها: Aggregation (کردیت، Excel خروجی) و تکمیل درخواست
+    
+    Shard ناموفق درخواست رو Fail نمیکنه: کلماتش ردیف ندارن → _finish_gap_request نتیجه incomplete میده،
+    Heartbeat قدیمی میشه و resume_stale_gap_requests کلمات باقیمانده رو دوباره ارسال میکنه.
+    """
+    
+    # ✅ Chord تموم شده → از این به بعد فقط Heartbeat معتبره (shards_deadline پاک میشه)
+    if not GapRequest.objects.filter(id=request_id, lease_owner=owner).update(heartbeat_at=timezone.now(), shards_deadline=None):
+        print(f"\n[GAP ANALYSIS] Finalize of request {request_id}: lease lost → skipped")
+        return {'status': 'skipped'}
+    
+    errors = [result['error'] for result in shard_results if result.get('status') == 'failed']
+    if errors:
+        print(f"[GAP ANALYSIS] Request {request_id}: {len(errors)} shards failed ({errors[0]}) → left for resume")
+    
+    try:
+        gap_request = GapRequest.objects.get(id=request_id)
+        progress = ProgressReporter(
+            self, gap_request.user_id, 'gap', gap_request.id, total=keywords_count, stage='output', result_id=gap_request.task_id
+        )
+        progress.current = keywords_count
+        
+        return _finish_gap_request(gap_request, keywords_count, owner, progress)
+    
+    except Exception as e:
+        _fail_gap_request(request_id, owner, str(e))
         
-        print(f"\n[GAP ANALYSIS] Failed: {str(e)}")
+        return {'status': 'failed', 'error': str(e)}
+
+
+@shared_task(bind=True, max_retries=0)
+def resume_stale_gap_requests(self):
+    """
+    Periodic (Celery Beat، هر GAP_RESUME_INTERVAL ثانیه)
+    
+    درخواست‌های running که یک Worker شروعشون کرده (started_at) و Heartbeat شون از GAP_LEASE_TIMEOUT قدیمی‌تره
+    (Worker کشته شده؛ Chord در جریان تا shards_deadline مرده حساب نمیشه) دوباره ارسال میشن و از آخرین Checkpoint ادامه پیدا میکنن.
+    
+    درخواستی که هنوز در صف Celery ـه (started_at خالی) Resume نمیشه. Claim قبل از ارسال started_at رو خالی میکنه:
+    تا Worker ای Task جدید رو برنداشته، تیک های بعدی دوباره ارسالش نمیکنن (صف طولانی = بدون ارسال تکراری).
+    """
+    stale_filter = _stale_lease() & Q(status='running', started_at__isnull=False)
+    
+    stale_requests = GapRequest.objects.filter(stale_filter).exclude(file_path='')
+    
+    resumed = []
+    for gap_request in stale_requests:
+        task_id = str(uuid.uuid4())
+        claimed = GapRequest.objects.filter(stale_filter, id=gap_request.id).update(
+            lease_owner=task_id, heartbeat_at=timezone.now(), started_at=None, task_id=task_id
+        )
+        if not claimed:
+            continue
         
-        return {'status': 'failed', 'error': str(e)}
\ No newline at end of file
+        process_gap_analysis.apply_async(
+            (gap_request.id, gap_request.file_path, gap_request.description), task_id=task_id
+        )
+        resumed.append(gap_request.id)
+        print(f"[GAP ANALYSIS] Request {gap_request.id} stale (last heartbeat: {gap_request.heartbeat_at}) → resumed as {task_id[:8]}")
+    
+    return {'resumed': resumed}
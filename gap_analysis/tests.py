@@ -1,3 +1,203 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from .matcher import CompetitorMatcher, clean_domain
+from .models import GapCompetitor, GapKeywordRow, GapRequest
+from .tasks import (
+    _acquire_lease, _claim_fallback_budget, _extend_shards_deadline, _renew_lease,
+    finalize_gap_analysis, process_gap_analysis, resume_stale_gap_requests,
+)
+
+
+def create_gap_request(name='gap', **fields):
+    user = get_user_model().objects.create_user(
+        username=f"user-{name}", password='x', email=f"{name}@example.com", phone_number=f"0935{abs(hash(name)) % 10**7:07d}"
+    )
+    fields.setdefault('file_path', '/tmp/gap.xlsx')
+    return GapRequest.objects.create(user=user, name=name, **fields)
+
+
+def age(seconds):
+    return timezone.now() - timedelta(seconds=seconds)
+
+
+class GapLeaseTests(TestCase):
+
+    def setUp(self):
+        self.gap_request = create_gap_request()
+
+    def test_first_task_takes_lease_and_marks_started(self):
+        self.assertTrue(_acquire_lease(self.gap_request.id, 'task-a'))
+
+        self.gap_request.refresh_from_db()
+        self.assertEqual(self.gap_request.status, 'running')
+        self.assertEqual(self.gap_request.lease_owner, 'task-a')
+        self.assertIsNotNone(self.gap_request.started_at)
+
+    def test_live_lease_is_not_taken(self):
+        _acquire_lease(self.gap_request.id, 'task-a')
+
+        self.assertFalse(_acquire_lease(self.gap_request.id, 'task-b'))
+        self.assertTrue(_renew_lease(self.gap_request.id, 'task-a'))
+
+    def test_stale_lease_is_taken_over(self):
+        _acquire_lease(self.gap_request.id, 'task-a')
+        GapRequest.objects.filter(id=self.gap_request.id).update(heartbeat_at=age(600))
+
+        self.assertTrue(_acquire_lease(self.gap_request.id, 'task-b'))
+        self.assertFalse(_renew_lease(self.gap_request.id, 'task-a'))
+
+    def test_finished_request_is_not_taken(self):
+        GapRequest.objects.filter(id=self.gap_request.id).update(status='completed')
+
+        self.assertFalse(_acquire_lease(self.gap_request.id, 'task-a'))
+
+
+class ResumeStaleGapRequestsTests(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(process_gap_analysis, 'apply_async')
+        self.apply_async = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_queued_request_is_not_resumed(self):
+        create_gap_request(status='running', created_date=age(3600))
+
+        self.assertEqual(resume_stale_gap_requests()['resumed'], [])
+        self.apply_async.assert_not_called()
+
+    def test_stalled_request_is_resumed_once(self):
+        gap_request = create_gap_request(status='running', lease_owner='dead', started_at=age(3600), heartbeat_at=age(600))
+
+        self.assertEqual(resume_stale_gap_requests()['resumed'], [gap_request.id])
+        self.apply_async.assert_called_once()
+        task_id = self.apply_async.call_args.kwargs['task_id']
+
+        # Task جدید هنوز در صفه → تیک های بعدی (حتی بعد از GAP_LEASE_TIMEOUT) دوباره ارسالش نمیکنن
+        GapRequest.objects.filter(id=gap_request.id).update(heartbeat_at=age(600))
+        self.assertEqual(resume_stale_gap_requests()['resumed'], [])
+        self.assertEqual(self.apply_async.call_count, 1)
+
+        # Worker برداشت و بعد مرد → دوباره Resume میشه
+        self.assertTrue(_acquire_lease(gap_request.id, task_id))
+        GapRequest.objects.filter(id=gap_request.id).update(heartbeat_at=age(600))
+        self.assertEqual(resume_stale_gap_requests()['resumed'], [gap_request.id])
+
+    def test_live_request_is_not_resumed(self):
+        create_gap_request(status='running', lease_owner='alive', started_at=age(3600), heartbeat_at=timezone.now())
+
+        self.assertEqual(resume_stale_gap_requests()['resumed'], [])
+
+
+class ShardedGapRequestTests(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(process_gap_analysis, 'apply_async')
+        self.apply_async = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.gap_request = create_gap_request(status='running')
+        _acquire_lease(self.gap_request.id, 'parent')
+        GapCompetitor.objects.create(request=self.gap_request, position=0, domain='a.com', brand='A')
+
+    def dispatch_and_wait(self, seconds):
+        """Task اصلی Shard ها رو ارسال کرد و تموم شد؛ Shard ها seconds ثانیه در صف موندن"""
+        _extend_shards_deadline(self.gap_request.id, 'parent')
+        GapRequest.objects.filter(id=self.gap_request.id).update(heartbeat_at=age(seconds))
+
+    def test_queued_shards_keep_lease(self):
+        self.dispatch_and_wait(600)
+
+        self.assertEqual(resume_stale_gap_requests()['resumed'], [])
+        self.assertFalse(_acquire_lease(self.gap_request.id, 'other'))
+        # Shard بعد از GAP_LEASE_TIMEOUT هنوز Lease داره
+        self.assertTrue(_extend_shards_deadline(self.gap_request.id, 'parent'))
+
+    def test_lost_shards_are_resumed_after_deadline(self):
+        self.dispatch_and_wait(600)
+        GapRequest.objects.filter(id=self.gap_request.id).update(shards_deadline=age(1))
+
+        self.assertEqual(resume_stale_gap_requests()['resumed'], [self.gap_request.id])
+        self.assertFalse(_extend_shards_deadline(self.gap_request.id, 'parent'))
+
+    def test_failed_shard_leaves_request_resumable(self):
+        self.dispatch_and_wait(0)
+        GapKeywordRow.objects.create(request=self.gap_request, position=0, keyword='kw0', links=[None])
+
+        result = finalize_gap_analysis([{'status': 'done'}, {'status': 'failed', 'error': 'boom'}], self.gap_request.id, 'parent', 2)
+
+        self.assertEqual(result['status'], 'incomplete')
+        self.gap_request.refresh_from_db()
+        self.assertEqual(self.gap_request.status, 'running')
+        self.assertIsNone(self.gap_request.shards_deadline)
+
+        GapRequest.objects.filter(id=self.gap_request.id).update(heartbeat_at=age(600))
+        self.assertEqual(resume_stale_gap_requests()['resumed'], [self.gap_request.id])
+
+
+class FallbackBudgetTests(TestCase):
+
+    def test_claims_stop_at_budget(self):
+        gap_request = create_gap_request(mode='reuse')
+
+        self.assertEqual(_claim_fallback_budget(gap_request.id, 30, 50), 30)
+        self.assertEqual(_claim_fallback_budget(gap_request.id, 30, 50), 20)
+        self.assertEqual(_claim_fallback_budget(gap_request.id, 30, 50), 0)
+
+        gap_request.refresh_from_db()
+        self.assertEqual(gap_request.fallback_queries, 50)
+
+    def test_no_budget_claims_nothing(self):
+        gap_request = create_gap_request(mode='reuse')
+
+        self.assertEqual(_claim_fallback_budget(gap_request.id, 10, 0), 0)
+
+
+class CompetitorMatcherTests(SimpleTestCase):
+
+    def test_suffix_is_not_a_substring_match(self):
+        matcher = CompetitorMatcher(['kala.com', 'digikala.com'])
+
+        self.assertEqual(
+            matcher.match(['https://www.digikala.com/product/1', 'https://kala.com/p']),
+            {'digikala.com': 'https://www.digikala.com/product/1', 'kala.com': 'https://kala.com/p'},
+        )
+        self.assertIsNone(CompetitorMatcher(['kala.com']).find(['https://digikala.com/x'], 'kala.com'))
+
+    def test_subdomains_match_their_domain(self):
+        matcher = CompetitorMatcher(['https://www.DigiKala.com/'])
+
+        for link in ('https://www.digikala.com/a', 'https://m.digikala.com/a', 'http://digikala.com:443/a'):
+            with self.subTest(link=link):
+                self.assertEqual(matcher.find([link], 'https://www.DigiKala.com/'), link)
+
+    def test_subdomain_competitor_does_not_match_parent(self):
+        matcher = CompetitorMatcher(['mag.digikala.com'])
+
+        self.assertEqual(matcher.match(['https://www.digikala.com/a']), {})
+        self.assertEqual(matcher.find(['https://mag.digikala.com/a'], 'mag.digikala.com'), 'https://mag.digikala.com/a')
+
+    def test_bare_label_matches_whole_label_only(self):
+        matcher = CompetitorMatcher(['digikala'])
+
+        self.assertEqual(matcher.find(['https://digikala.ir/a'], 'digikala'), 'https://digikala.ir/a')
+        self.assertEqual(matcher.find(['https://m.digikala.com/a'], 'digikala'), 'https://m.digikala.com/a')
+        self.assertIsNone(matcher.find(['https://mydigikala.com/a'], 'digikala'))
+
+    def test_domain_inside_another_host_is_not_matched(self):
+        matcher = CompetitorMatcher(['digikala.com'])
+
+        self.assertIsNone(matcher.find(['https://digikala.com.evil.com/a', 'https://evil.com/digikala.com'], 'digikala.com'))
+
+    def test_first_link_wins(self):
+        matcher = CompetitorMatcher(['digikala.com'])
+
+        self.assertEqual(matcher.find(['https://digikala.com/1', 'https://digikala.com/2'], 'digikala.com'), 'https://digikala.com/1')
+
+    def test_clean_domain(self):
+        self.assertEqual(clean_domain(' https://WWW.Digikala.com:443/path '), 'digikala.com')
+        self.assertEqual(clean_domain(None), '')
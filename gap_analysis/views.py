@@ -3,9 +3,11 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from celery.result import AsyncResult
 from WowDash.celery import app as celery_app
-from django.http import HttpResponse
-from .models import GapRequest, GapKeyword
+from django.http import HttpResponse, FileResponse
+from .models import GapRequest
 from .tasks import process_gap_analysis
+from .credits import resolve_mode, reserved_credits
+from .output import gap_matrix, write_gap_excel
 from billing.models import UserCredit, Transaction
 import pandas as pd
 from django.conf import settings
@@ -23,6 +25,7 @@ def gap_analysis(request):
     if request.method == 'POST':
         file = request.FILES.get('file')
         description = request.POST.get('description', '')
+        mode = request.POST.get('mode', 'pair')
         
         if not file:
             messages.error(request, 'لطفاً فایل را انتخاب کنید.')
@@ -47,7 +50,9 @@ def gap_analysis(request):
             competitors = df.iloc[:, 0].dropna().astype(str).str.strip().unique()
             num_competitors = len(competitors)
             
-            required_credits = num_keywords * num_competitors  # سطر × ستون
+            # سطر × ستون (در حالت reuse بعد از اتمام، کردیت مصرف نشده برگشت داده میشه)
+            mode = resolve_mode(mode, num_competitors)
+            required_credits = reserved_credits(num_keywords, num_competitors)
             file.seek(0)  # Reset file pointer
             
         except Exception as e:
@@ -103,7 +108,10 @@ def gap_analysis(request):
             user=request.user,
             name=name,
             description=description,
-            status='pending'
+            status='pending',
+            mode=mode,
+            credits_reserved=required_credits,
+            file_path=file_path
         )
         
         # ✅ کم کردن کردیت از حساب کاربر
@@ -114,7 +122,7 @@ def gap_analysis(request):
         
         gap_request.task_id = task.id
         gap_request.status = 'running'
-        gap_request.save()
+        gap_request.save(update_fields=['task_id', 'status'])
         
         messages.success(request, f'درخواست "{gap_request.name}" در حال پردازش است. ({required_credits} کردیت کسر شد)')
         return redirect('gap_requests_list')
@@ -137,73 +145,34 @@ def gap_request_detail(request, pk):
     if request.GET.get('download'):
         return _generate_gap_output_file(req)
     
-    # دریافت داده‌ها
-    keywords_data = GapKeyword.objects.filter(request=req)
-    
-    # لیست یونیک برای نمایش
-    unique_keywords = list(
-        keywords_data.values_list('keyword', flat=True).distinct()
-    )
-    unique_competitors = list(
-        keywords_data.values_list('competitor', flat=True).distinct()
-    )
+    competitors, rows = gap_matrix(req)
     
     return render(request, 'gap_analysis/request_detail.html', {
         'req': req,
-        'keywords_data': keywords_data,
-        'unique_keywords': unique_keywords,
-        'unique_competitors': unique_competitors
+        'rows': rows,
+        'unique_keywords': [keyword for keyword, _ in rows],
+        'unique_competitors': competitors
     })
 
 
 def _generate_gap_output_file(req):
-    """ساخت فایل Excel خروجی - FIX distinct()"""
-    
-    # دریافت تمام داده‌ها (بدون order_by برای distinct درست!)
-    keywords_data = GapKeyword.objects.filter(request=req)
-    
-    # لیست کلمات یونیک (بدون order_by!)
-    unique_keywords = list(
-        keywords_data.values_list('keyword', flat=True).distinct()
-    )
+    """فایل Excel خروجی (از قبل در Task ساخته شده؛ درخواست‌های قدیمی همینجا ساخته میشن)"""
     
-    # لیست برندها یونیک (بدون order_by!)
-    unique_brands = list(
-        keywords_data.values_list('competitor', flat=True).distinct()
-    )
-    
-    # ساخت dictionary برای DataFrame
-    data = {'کلمات': unique_keywords}
-    
-    # برای هر برند، یک ستون بساز
-    for brand in unique_brands:
-        brand_links = []
-        for keyword in unique_keywords:
-            try:
-                kw_obj = keywords_data.get(keyword=keyword, competitor=brand)
-                brand_links.append(kw_obj.link)
-            except GapKeyword.DoesNotExist:
-                brand_links.append('-')
-            except GapKeyword.MultipleObjectsReturned:
-                kw_obj = keywords_data.filter(keyword=keyword, competitor=brand).first()
-                brand_links.append(kw_obj.link if kw_obj else '-')
-        
-        data[brand] = brand_links
-    
-    df = pd.DataFrame(data)
-    
-    # ساخت Excel
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
+    if req.output_path and os.path.exists(req.output_path):
+        response = FileResponse(
+            open(req.output_path, 'rb'),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+    else:
+        response = HttpResponse(
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+        write_gap_excel(req, response)
     
     # FIX Unicode: encode filename
     filename = f"{req.name}_gap_analysis.xlsx"
     response['Content-Disposition'] = f'attachment; filename="{filename}"'
     
-    with pd.ExcelWriter(response, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name='Gap Analysis', index=False)
-    
     return response
 
 
@@ -221,10 +190,10 @@ def delete_gap_request(request, request_id):
         except Exception as e:
             messages.error(request, f'❌ خطا در متوقف کردن task: {str(e)}')
     
-    # حذف کلمات مرتبط
-    GapKeyword.objects.filter(request=req).delete()
+    if req.output_path and os.path.exists(req.output_path):
+        os.remove(req.output_path)
     
-    # حذف درخواست
+    # حذف درخواست (رقبا و نتایج با CASCADE حذف میشن)
     req_name = req.name
     req.delete()
     
@@ -0,0 +1,703 @@
+"""
+PKW/AKW Clustering based on SERP overlap
+"""
+
+import io
+import os
+import logging
+import multiprocessing
+import django
+import numpy as np
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from .models import Keyword, ResearchRequest, ClusterHierarchy
+
+
+logger = logging.getLogger(__name__)
+
+
+LINK_SEPARATOR = " -------------- "
+ERROR_MARK = "خطا"
+
+# آستانه پیش‌فرض: حداقل تعداد لینک مشترک برای ادغام دو کیوورد
+DEFAULT_THRESHOLD = 6
+MIN_THRESHOLD = 1
+MAX_THRESHOLD = 10
+
+
+def split_links(links):
+    """تبدیل رشته لینک‌ها به set (لینک‌های خطا = خالی)"""
+    if not links or ERROR_MARK in links:
+        return set()
+    return set(links.split(LINK_SEPARATOR))
+
+
+def base_search_volume(search_volume, original_search_volume, akw_str):
+    """
+    Search Volume اولیه کیوورد (قبل از جمع شدن AKW ها)
+
+    برای ردیف‌های قدیمی که original_search_volume ندارن، از akw_str بازسازی میشه:
+    هر بار که کیووردی AKW جذب می‌کنه، دقیقاً همون مقدار به akw_str اضافه میشه.
+    """
+    if original_search_volume is not None:
+        return original_search_volume
+
+    absorbed = 0
+    if akw_str:
+        for part in akw_str.split(" - "):
+            if ":" in part:
+                try:
+                    absorbed += int(part.rsplit(":", 1)[1])
+                except ValueError:
+                    continue
+    return search_volume - absorbed
+
+
+def _gather_rows(indptr, indices, rows):
+    """
+    لینک‌های چند ردیف CSR پشت سر هم
+
+    Returns:
+        tuple: (lengths, values) - تعداد لینک هر ردیف و لینک‌های پشت سر هم
+    """
+    lengths = (indptr[rows + 1] - indptr[rows]).astype(np.int64)
+    offsets = np.cumsum(lengths) - lengths
+    positions = np.repeat(indptr[rows] - offsets, lengths) + np.arange(int(lengths.sum()), dtype=np.int64)
+    return lengths, indices[positions]
+
+
+class ClusterInput:
+    """
+    ورودی فشرده خوشه‌بندی (به جای Model instance ها)
+
+    - keyword_ids: int64 - id کیووردها به ترتیب
+    - volumes: int32 - Search Volume اولیه
+    - indptr / indices: ماتریس CSR کیوورد × لینک (indices = شماره یکتای لینک، int32، مرتب در هر ردیف)
+    """
+    __slots__ = ('keyword_ids', 'volumes', 'indptr', 'indices')
+
+    def __init__(self, keyword_ids, volumes, indptr, indices):
+        self.keyword_ids = keyword_ids
+        self.volumes = volumes
+        self.indptr = indptr
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.keyword_ids)
+
+    @property
+    def lengths(self):
+        return np.diff(self.indptr)
+
+    def subset(self, rows):
+        """ورودی فقط برای ردیف‌های مشخص (برای پردازش هر مؤلفه جداگانه)"""
+        rows = np.asarray(rows, dtype=np.int64)
+        lengths, indices = _gather_rows(self.indptr, self.indices, rows)
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        return ClusterInput(self.keyword_ids[rows], self.volumes[rows], indptr, indices)
+
+    @classmethod
+    def _build(cls, keyword_ids, volumes, lengths, link_hashes):
+        indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(np.frombuffer(lengths, dtype=np.int64), out=indptr[1:])
+
+        hashes = np.frombuffer(link_hashes, dtype=np.int64)
+        _, url_ids = np.unique(hashes, return_inverse=True)
+        url_ids = url_ids.astype(np.int32)
+
+        # مرتب‌سازی لینک‌ها داخل هر ردیف (برای Intersection سریع)
+        row_of_entry = np.repeat(np.arange(len(lengths), dtype=np.int64), np.diff(indptr))
+        order = np.lexsort((url_ids, row_of_entry))
+
+        return cls(
+            np.frombuffer(keyword_ids, dtype=np.int64).copy(),
+            np.frombuffer(volumes, dtype=np.int32).copy(),
+            indptr,
+            url_ids[order],
+        )
+
+    @classmethod
+    def from_link_sets(cls, link_sets, keyword_ids=None, volumes=None):
+        """ساخت از لیست set لینک‌ها (برای Benchmark / داده ضبط شده)"""
+        total = len(link_sets)
+        ids_array = array('q', keyword_ids if keyword_ids is not None else range(total))
+        volumes_array = array('i', volumes if volumes is not None else [0] * total)
+        lengths, link_hashes = array('q'), array('q')
+        for links in link_sets:
+            lengths.append(len(links))
+            link_hashes.extend(hash(link) for link in links)
+        return cls._build(ids_array, volumes_array, lengths, link_hashes)
+
+    @classmethod
+    def from_request(cls, research_request):
+        """
+        خواندن Stream وار کیووردهای درخواست از دیتابیس
+
+        فقط آرایه‌ها نگه داشته میشن؛ رشته لینک‌ها بعد از Hash شدن دور ریخته میشن.
+        """
+        rows = (
+            Keyword.objects.filter(request=research_request)
+            .order_by('id')
+            .values_list('id', 'search_volume', 'original_search_volume', 'akw_str', 'links')
+        )
+        ids_array, volumes_array = array('q'), array('i')
+        lengths, link_hashes = array('q'), array('q')
+
+        for kw_id, search_volume, original_search_volume, akw_str, links in rows.iterator(chunk_size=2000):
+            ids_array.append(kw_id)
+            volumes_array.append(base_search_volume(search_volume, original_search_volume, akw_str))
+            link_set = split_links(links)
+            lengths.append(len(link_set))
+            link_hashes.extend(hash(link) for link in link_set)
+
+        return cls._build(ids_array, volumes_array, lengths, link_hashes)
+
+
+def _empty_overlaps():
+    return (
+        np.array([], dtype=np.int32),
+        np.array([], dtype=np.int32),
+        np.array([], dtype=np.uint8),
+    )
+
+
+def _group_pair_keys(members, starts, sizes, total):
+    """
+    همه جفت‌های (i < j) داخل هر گروه، به صورت کلید i * total + j
+
+    members باید داخل هر گروه صعودی باشه. گروه‌های هم‌اندازه با هم Vectorize میشن.
+    """
+    keys = []
+    for size in np.unique(sizes[sizes > 1]).tolist():
+        block = members[starts[sizes == size][:, None] + np.arange(size)]
+        first, second = np.triu_indices(size, k=1)
+        keys.append((block[:, first] * total + block[:, second]).ravel())
+    return keys
+
+
+def compute_overlaps(data):
+    """
+    محاسبه تعداد لینک مشترک همه جفت‌ها با Inverted Index (Vectorized)
+
+    برای هر لینک، همه جفت‌های کیووردهای آن لینک ساخته و شمارش میشن.
+    فقط جفت‌هایی که حداقل 1 لینک مشترک دارن برمی‌گردن (i < j، مرتب).
+
+    Returns:
+        tuple: (left, right, score) به صورت numpy array
+    """
+    total = len(data)
+    if not len(data.indices):
+        return _empty_overlaps()
+
+    rows = np.repeat(np.arange(total, dtype=np.int64), data.lengths)
+    order = np.argsort(data.indices, kind='stable')
+    urls, rows = data.indices[order], rows[order]
+
+    starts = np.flatnonzero(np.r_[True, urls[1:] != urls[:-1]])
+    sizes = np.diff(np.r_[starts, len(urls)])
+
+    keys = _group_pair_keys(rows, starts, sizes, total)
+    if not keys:
+        return _empty_overlaps()
+
+    pairs, counts = np.unique(np.concatenate(keys), return_counts=True)
+    return (
+        (pairs // total).astype(np.int32),
+        (pairs % total).astype(np.int32),
+        counts.astype(np.uint8),
+    )
+
+
+# ============================================================================
+# Approximate Overlaps (MinHash + LSH) - برای آپلودهای خیلی بزرگ
+# ============================================================================
+
+_MERSENNE_PRIME = (1 << 31) - 1
+
+
+def minhash_signatures(data, num_perm=64, seed=1):
+    """
+    امضای MinHash برای مجموعه لینک‌های هر کیوورد
+
+    Returns:
+        tuple: (signatures, non_empty) - signatures با شکل (n, num_perm)
+    """
+    total = len(data)
+    lengths = data.lengths
+    non_empty = lengths > 0
+    signatures = np.full((total, num_perm), _MERSENNE_PRIME, dtype=np.uint64)
+    if not len(data.indices):
+        return signatures, non_empty
+
+    indices = data.indices.astype(np.uint64)
+    starts = data.indptr[:-1][non_empty]
+
+    rng = np.random.RandomState(seed)
+    coef_a = rng.randint(1, _MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+    coef_b = rng.randint(0, _MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+
+    for perm in range(num_perm):
+        hashed = (coef_a[perm] * indices + coef_b[perm]) % _MERSENNE_PRIME
+        signatures[non_empty, perm] = np.minimum.reduceat(hashed, starts)
+
+    return signatures, non_empty
+
+
+def lsh_candidate_pairs(signatures, non_empty, bands, rows):
+    """
+    جفت‌های کاندید با LSH Banding (کیووردهایی که حداقل در یک Band هم‌سطل هستن)
+
+    Returns:
+        tuple: (left, right) یکتا و مرتب، left < right
+    """
+    total = len(signatures)
+    candidates = []
+    members = np.flatnonzero(non_empty)
+    if not len(members):
+        empty = np.array([], dtype=np.int32)
+        return empty, empty
+
+    for band in range(bands):
+        band_rows = np.ascontiguousarray(signatures[members, band * rows:(band + 1) * rows])
+        keys = band_rows.view(np.dtype((np.void, band_rows.dtype.itemsize * rows))).ravel()
+        _, buckets = np.unique(keys, return_inverse=True)
+
+        order = np.argsort(buckets, kind='stable')
+        sorted_buckets = buckets[order]
+        starts = np.flatnonzero(np.r_[True, sorted_buckets[1:] != sorted_buckets[:-1]])
+        sizes = np.diff(np.r_[starts, len(sorted_buckets)])
+        candidates.extend(_group_pair_keys(members[order], starts, sizes, total))
+
+    if not candidates:
+        empty = np.array([], dtype=np.int32)
+        return empty, empty
+
+    encoded = np.unique(np.concatenate(candidates))
+    return (encoded // total).astype(np.int32), (encoded % total).astype(np.int32)
+
+
+def compute_overlaps_approx(data, bands=32, rows=2, seed=1):
+    """
+    محاسبه تقریبی Overlap ها: کاندیدها از MinHash/LSH، امتیاز دقیق فقط روی کاندیدها
+
+    جفت‌هایی که LSH پیدا نکنه حذف میشن (Recall کمتر از 100%)،
+    ولی امتیاز جفت‌های برگشتی همیشه دقیق هست.
+    """
+    signatures, non_empty = minhash_signatures(data, num_perm=bands * rows, seed=seed)
+    candidate_left, candidate_right = lsh_candidate_pairs(signatures, non_empty, bands, rows)
+    if not len(candidate_left):
+        return _empty_overlaps()
+
+    # Intersection دقیق: هر لینک کیوورد left در لیست مرتب (ردیف، لینک) کیوورد right جستجو میشه
+    url_count = int(data.indices.max()) + 1
+    entry_keys = np.repeat(np.arange(len(data), dtype=np.int64), data.lengths) * url_count + data.indices
+
+    lengths, left_urls = _gather_rows(data.indptr, data.indices, candidate_left.astype(np.int64))
+    probes = np.repeat(candidate_right.astype(np.int64), lengths) * url_count + left_urls
+    positions = np.minimum(np.searchsorted(entry_keys, probes), len(entry_keys) - 1)
+    hits = entry_keys[positions] == probes
+
+    scores = np.bincount(
+        np.repeat(np.arange(len(candidate_left)), lengths),
+        weights=hits,
+        minlength=len(candidate_left),
+    ).astype(np.uint8)
+
+    found = scores > 0
+    return candidate_left[found], candidate_right[found], scores[found]
+
+
+def resolve_clustering_mode(total):
+    """
+    انتخاب موتور Overlap: 'exact' یا 'approx'
+
+    در حالت auto، از تعداد کیووردها به بعد CLUSTERING_APPROX_MIN_KEYWORDS تقریبی میشه.
+    """
+    mode = getattr(settings, 'CLUSTERING_MODE', 'auto')
+    if mode == 'auto':
+        min_keywords = getattr(settings, 'CLUSTERING_APPROX_MIN_KEYWORDS', 100000)
+        return 'approx' if total >= min_keywords else 'exact'
+    return mode
+
+
+def compute_overlaps_for_mode(data, mode=None):
+    """محاسبه Overlap ها با موتور مناسب اندازه درخواست"""
+    mode = mode or resolve_clustering_mode(len(data))
+    if mode == 'approx':
+        return compute_overlaps_approx(
+            data,
+            bands=getattr(settings, 'CLUSTERING_LSH_BANDS', 32),
+            rows=getattr(settings, 'CLUSTERING_LSH_ROWS', 2),
+        )
+    return compute_overlaps(data)
+
+
+class _UnionFind:
+    """Union-Find ساده با Path Compression"""
+
+    def __init__(self, size):
+        self.parent = list(range(size))
+
+    def find(self, item):
+        parent = self.parent
+        root = item
+        while parent[root] != root:
+            root = parent[root]
+        while parent[item] != root:
+            parent[item], item = root, parent[item]
+        return root
+
+    def union(self, first, second):
+        first_root, second_root = self.find(first), self.find(second)
+        if first_root == second_root:
+            return False
+        if first_root > second_root:
+            first_root, second_root = second_root, first_root
+        self.parent[second_root] = first_root
+        return True
+
+
+def build_hierarchy(total, overlaps):
+    """
+    ساختار خوشه‌بندی یک درخواست: گراف Overlap کیووردها
+
+    خوشه‌بندی Greedy (ادغام به ترتیب id) به یال‌ها به ترتیب (left, right) نیاز داره،
+    پس همه یال‌ها با امتیازشون نگه داشته میشن و برش در هر آستانه فقط فیلتر level هست.
+
+    Returns:
+        tuple: (left, right, level) - مرتب بر اساس (left, right)، left < right
+    """
+    left, right, scores = overlaps
+    order = np.lexsort((right, left))
+    return (
+        left[order].astype(np.int32),
+        right[order].astype(np.int32),
+        scores[order].astype(np.uint8),
+    )
+
+
+def _greedy_merges(volumes, hierarchy, threshold):
+    """
+    خوشه‌بندی Greedy در یک آستانه (همون الگوریتم قبلی مقایسه PKW/AKW)
+
+    کیووردها به ترتیب id پیمایش میشن؛ هر کیوورد فعال با همسایه‌های بعدیش (overlap >= threshold)
+    مقایسه میشه: Search Volume بیشتر (در تساوی، id کمتر) برنده ست، Volume بازنده رو جذب می‌کنه
+    و بازنده AKW میشه. اگه کیوورد فعلی ببازه، پیمایش همسایه‌هاش تموم میشه.
+
+    Returns:
+        tuple: (winners, losers) - ادغام‌ها به ترتیب انجام (هر کیوورد حداکثر یکبار می‌بازه)
+    """
+    total = len(volumes)
+    left, right, level = hierarchy
+    keep = level >= threshold
+    starts = np.searchsorted(left[keep], np.arange(total + 1)).tolist()
+    neighbors = right[keep].tolist()
+
+    volume = np.asarray(volumes).tolist()
+    active = [True] * total
+    winners, losers = array('i'), array('i')
+
+    for i in range(total):
+        if not active[i]:
+            continue
+        for j in neighbors[starts[i]:starts[i + 1]]:
+            if not active[j]:
+                continue
+            if volume[i] >= volume[j]:
+                winners.append(i)
+                losers.append(j)
+                volume[i] += volume[j]
+                active[j] = False
+            else:
+                winners.append(j)
+                losers.append(i)
+                volume[j] += volume[i]
+                active[i] = False
+                break
+
+    return np.frombuffer(winners, dtype=np.int32), np.frombuffer(losers, dtype=np.int32)
+
+
+def apply_merges(names, volumes, merges):
+    """
+    نتیجه خوشه‌بندی از ادغام‌های _greedy_merges
+
+    بازنده بعد از باختن چیزی جذب نمیکنه، پس Volume ش موقع ادغام همون Volume نهایی تا اون لحظه ست
+    و تکرار ادغام‌ها به ترتیب، همون akw_str الگوریتم Greedy رو میسازه.
+
+    Returns:
+        list: برای هر کیوورد (status, search_volume, akw_str)
+    """
+    total = len(names)
+    volume = np.asarray(volumes).tolist()
+    status = [1] * total
+    akw_parts = [[] for _ in range(total)]
+
+    winners, losers = merges
+    for i, j in zip(winners.tolist(), losers.tolist()):
+        akw_parts[i].append(f"{names[j]}:{volume[j]}")
+        volume[i] += volume[j]
+        status[j] = 2
+
+    return [(status[i], volume[i], " - ".join(akw_parts[i])) for i in range(total)]
+
+
+def cut_hierarchy(names, volumes, hierarchy, threshold=DEFAULT_THRESHOLD):
+    """
+    خوشه‌بندی Greedy در یک آستانه از گراف Overlap
+
+    Returns:
+        list: برای هر کیوورد (status, search_volume, akw_str)
+    """
+    return apply_merges(names, volumes, _greedy_merges(volumes, hierarchy, threshold))
+
+
+def build_cuts(volumes, hierarchy):
+    """
+    ادغام‌های همه آستانه‌های قابل انتخاب (MIN_THRESHOLD تا MAX_THRESHOLD)
+
+    گراف Overlap درخواست‌های پرتکرار (URL های محبوب) ده‌ها میلیون یال داره؛ به جای ذخیره یال‌ها
+    برای هر آستانه فقط ادغام‌ها (حداکثر n جفت) ذخیره میشه → حجم O(10n) و برش بدون پیمایش یال‌ها.
+
+    Returns:
+        dict: threshold → (winners, losers)
+    """
+    return {
+        threshold: _greedy_merges(volumes, hierarchy, threshold)
+        for threshold in range(MIN_THRESHOLD, MAX_THRESHOLD + 1)
+    }
+
+
+# ============================================================================
+# Parallel Hierarchy (Connected Components + ProcessPoolExecutor)
+# ============================================================================
+
+def link_components(data):
+    """
+    مؤلفه‌های همبند گراف Overlap (کیووردهایی که حداقل یک لینک مشترک دارن)
+
+    بدون محاسبه جفت‌ها: هر کیوورد با اولین کیوورد هر لینکش Union میشه.
+
+    Returns:
+        list: لیست مؤلفه‌ها، هر مؤلفه لیست مرتب index ها (به ترتیب کوچکترین عضو)
+    """
+    total = len(data)
+    union_find = _UnionFind(total)
+
+    rows = np.repeat(np.arange(total, dtype=np.int64), data.lengths)
+    order = np.argsort(data.indices, kind='stable')
+    urls, rows = data.indices[order], rows[order]
+    starts = np.flatnonzero(np.r_[True, urls[1:] != urls[:-1]]) if len(urls) else np.array([], dtype=np.int64)
+    owners = np.repeat(rows[starts], np.diff(np.r_[starts, len(urls)]))
+
+    linked = owners != rows
+    for owner, index in zip(owners[linked].tolist(), rows[linked].tolist()):
+        union_find.union(owner, index)
+
+    components = {}
+    for index in range(total):
+        components.setdefault(union_find.find(index), []).append(index)
+    return sorted(components.values(), key=lambda members: members[0])
+
+
+def _components_hierarchy(job):
+    """
+    ساخت گراف Overlap چند مؤلفه (داخل Process جداگانه اجرا میشه)
+
+    Returns:
+        tuple: (left, right, level) با index های سراسری
+    """
+    components, mode = job
+    left, right, level = [], [], []
+    for members, component in components:
+        local = build_hierarchy(len(members), compute_overlaps_for_mode(component, mode))
+        left.append(members[local[0]])
+        right.append(members[local[1]])
+        level.append(local[2])
+
+    return np.concatenate(left), np.concatenate(right), np.concatenate(level)
+
+
+def _merge_hierarchies(parts):
+    """ادغام قطعی: مرتب بر اساس (left, right) مثل build_hierarchy"""
+    left = np.concatenate([part[0] for part in parts])
+    right = np.concatenate([part[1] for part in parts])
+    level = np.concatenate([part[2] for part in parts])
+    order = np.lexsort((right, left))
+    return left[order], right[order], level[order]
+
+
+def build_request_hierarchy(data):
+    """
+    ساختار خوشه‌بندی کامل یک درخواست
+
+    درخواست‌های بزرگ بر اساس مؤلفه‌های همبند تقسیم میشن و هر بخش
+    در یک ProcessPoolExecutor پردازش میشه (مؤلفه‌ها از هم مستقل هستن،
+    Greedy هم هیچ‌وقت از یک مؤلفه بیرون نمیره).
+    """
+    total = len(data)
+    mode = resolve_clustering_mode(total)
+    workers = getattr(settings, 'CLUSTERING_WORKERS', None) or os.cpu_count() or 1
+    min_keywords = getattr(settings, 'CLUSTERING_PARALLEL_MIN_KEYWORDS', 20000)
+
+    if workers > 1 and total >= min_keywords:
+        components = [members for members in link_components(data) if len(members) > 1]
+
+        if len(components) > 1:
+            # بسته‌بندی مؤلفه‌ها در job های هم‌اندازه (بزرگترین‌ها اول)
+            job_count = min(len(components), workers * 4)
+            jobs = [[] for _ in range(job_count)]
+            loads = [0] * job_count
+            for members in sorted(components, key=len, reverse=True):
+                target = loads.index(min(loads))
+                members = np.array(members, dtype=np.int32)
+                jobs[target].append((members, data.subset(members)))
+                loads[target] += len(members)
+
+            # ✅ spawn به جای fork: داخل Child های prefork سلری، fork کردن Process ای که
+            # Thread / Connection باز داره امن نیست؛ Child ها با django.setup بالا میان
+            try:
+                with ProcessPoolExecutor(
+                    max_workers=min(workers, job_count),
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=django.setup,
+                ) as executor:
+                    parts = list(executor.map(_components_hierarchy, [(job, mode) for job in jobs]))
+                return _merge_hierarchies(parts)
+            except (OSError, AssertionError, NotImplementedError, BrokenProcessPool) as e:
+                # فقط خطای راه‌اندازی Pool (مثلاً Process daemon یا محدودیت منابع)؛ خطای محاسبه بالا میره
+                logger.warning(f"⚠️ Parallel clustering unavailable, falling back to single process: {str(e)}")
+
+    return build_hierarchy(total, compute_overlaps_for_mode(data, mode))
+
+
+def _pack_cuts(keyword_ids, volumes, cuts):
+    thresholds = sorted(cuts)
+    sizes = [len(cuts[threshold][0]) for threshold in thresholds]
+    buffer = io.BytesIO()
+    np.savez_compressed(
+        buffer,
+        keyword_ids=keyword_ids.astype(np.int64),
+        volumes=volumes.astype(np.int32),
+        thresholds=np.array(thresholds, dtype=np.int32),
+        offsets=np.cumsum([0] + sizes).astype(np.int64),
+        winners=np.concatenate([cuts[threshold][0] for threshold in thresholds]).astype(np.int32),
+        losers=np.concatenate([cuts[threshold][1] for threshold in thresholds]).astype(np.int32),
+    )
+    return buffer.getvalue()
+
+
+def _unpack_cuts(data):
+    """ساختارهای قدیمی (گراف Overlap کامل یا سلسله‌مراتب Single Linkage) None برمی‌گردونن تا دوباره ساخته بشن"""
+    with np.load(io.BytesIO(bytes(data))) as packed:
+        if 'winners' not in packed.files:
+            return None
+        offsets = packed['offsets'].tolist()
+        winners, losers = packed['winners'], packed['losers']
+        cuts = {
+            threshold: (winners[offsets[index]:offsets[index + 1]], losers[offsets[index]:offsets[index + 1]])
+            for index, threshold in enumerate(packed['thresholds'].tolist())
+        }
+        return packed['keyword_ids'], packed['volumes'], cuts
+
+
+def get_request_cuts(research_request, rebuild=False):
+    """
+    خوشه‌بندی‌های از پیش محاسبه شده یک درخواست (همه آستانه‌ها)
+
+    اگه ذخیره شده باشه و با کیووردهای فعلی بخونه همون خونده میشه،
+    وگرنه گراف Overlap از لینک‌های ذخیره شده (بدون درخواست SERP جدید) ساخته، برش خورده و ذخیره میشه.
+
+    Returns:
+        tuple: (keyword_ids, volumes, cuts) - به ترتیب id
+    """
+    if not rebuild:
+        stored = ClusterHierarchy.objects.filter(request=research_request).first()
+        unpacked = _unpack_cuts(stored.data) if stored else None
+        if unpacked:
+            keyword_ids, volumes, cuts = unpacked
+            current_ids = np.fromiter(
+                Keyword.objects.filter(request=research_request).order_by('id').values_list('id', flat=True),
+                dtype=np.int64,
+            )
+            if np.array_equal(keyword_ids, current_ids):
+                return keyword_ids, volumes, cuts
+
+    data = ClusterInput.from_request(research_request)
+    cuts = build_cuts(data.volumes, build_request_hierarchy(data))
+
+    ClusterHierarchy.objects.update_or_create(
+        request=research_request,
+        defaults={'data': _pack_cuts(data.keyword_ids, data.volumes, cuts)},
+    )
+    return data.keyword_ids, data.volumes, cuts
+
+
+def cluster_request(research_request, threshold=DEFAULT_THRESHOLD, rebuild=False):
+    """
+    خوشه‌بندی کیووردهای یک درخواست با آستانه دلخواه (بدون درخواست SERP جدید)
+
+    Returns:
+        tuple: (keyword_ids, names, volumes, results) - همه به ترتیب id
+    """
+    keyword_ids, volumes, cuts = get_request_cuts(research_request, rebuild=rebuild)
+    names = list(
+        Keyword.objects.filter(request=research_request).order_by('id').values_list('keyword', flat=True)
+    )
+
+    results = apply_merges(names, volumes, cuts[threshold])
+    return keyword_ids.tolist(), names, volumes.tolist(), results
+
+
+def clustered_pkw_keywords(research_request, threshold):
+    """
+    PKW های درخواست در یک آستانه دلخواه (بدون ذخیره) - برای صفحه جزئیات و خروجی
+
+    در آستانه فعال، همون ردیف‌های ذخیره شده برمی‌گرده.
+    """
+    pkw_keywords = Keyword.objects.filter(request=research_request, status=1).order_by('id')
+    if threshold == research_request.cluster_threshold:
+        return pkw_keywords
+
+    keyword_ids, _, _, results = cluster_request(research_request, threshold)
+    pkw_results = {
+        kw_id: (volume, akw_str)
+        for kw_id, (status, volume, akw_str) in zip(keyword_ids, results)
+        if status == 1
+    }
+
+    pkw_list = []
+    pkw_ids = list(pkw_results)
+    for start in range(0, len(pkw_ids), 500):
+        for kw in Keyword.objects.filter(id__in=pkw_ids[start:start + 500]).order_by('id'):
+            kw.search_volume, kw.akw_str = pkw_results[kw.id]
+            pkw_list.append(kw)
+    return pkw_list
+
+
+def save_clustering(research_request, keyword_ids, volumes, results, threshold):
+    """ذخیره خوشه‌بندی به عنوان خوشه‌بندی فعال درخواست (bulk_update دسته‌ای)"""
+    fields = ['status', 'search_volume', 'akw_str', 'original_search_volume']
+    batch = []
+
+    for kw_id, volume, (status, search_volume, akw_str) in zip(keyword_ids, volumes, results):
+        batch.append(Keyword(
+            id=kw_id,
+            status=status,
+            search_volume=search_volume,
+            akw_str=akw_str,
+            original_search_volume=volume,
+        ))
+        if len(batch) >= 1000:
+            Keyword.objects.bulk_update(batch, fields)
+            batch = []
+
+    if batch:
+        Keyword.objects.bulk_update(batch, fields)
+
+    # update() به جای save() تا Signal تکمیل Task دوباره ارسال نشه
+    ResearchRequest.objects.filter(pk=research_request.pk).update(cluster_threshold=threshold)
+    research_request.cluster_threshold = threshold
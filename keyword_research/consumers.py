@@ -42,4 +42,13 @@ class TaskStatusConsumer(AsyncWebsocketConsumer):
         await self.send(text_data=json.dumps({
             'type': 'task_completed',
             'data': event['data']
-        }))
\ No newline at end of file
+        }))
+    
+    async def task_progress(self, event):
+        """
+        پیشرفت Task (Throttled از ProgressReporter)
+        """
+        await self.send(text_data=json.dumps({
+            'type': 'task_progress',
+            'data': event['data']
+        }))
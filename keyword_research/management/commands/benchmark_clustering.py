@@ -0,0 +1,86 @@
+"""
+مقایسه موتور تقریبی (MinHash/LSH) با موتور دقیق روی یک دیتاست ضبط شده
+"""
+
+import time
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+from keyword_research.models import ResearchRequest
+from keyword_research.clustering import (
+    LINK_SEPARATOR, ClusterInput, compute_overlaps, compute_overlaps_approx,
+    build_hierarchy, cut_hierarchy,
+)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark exact vs approximate (MinHash/LSH) keyword clustering on a recorded dataset'
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument('--request', type=int, help='ResearchRequest id (SERP links از دیتابیس)')
+        source.add_argument('--file', help='فایل CSV/XLSX با ستون لینک‌ها')
+        parser.add_argument('--links-column', default='Links', help='نام ستون لینک‌ها در فایل')
+        parser.add_argument('--bands', type=int, default=32)
+        parser.add_argument('--rows', type=int, default=2)
+        parser.add_argument('--thresholds', default='4,5,6,7', help='آستانه‌ها برای گزارش Recall')
+
+    def handle(self, *args, **options):
+        data = self._load_dataset(options)
+        total = len(data)
+        thresholds = [int(value) for value in options['thresholds'].split(',')]
+        names = [str(index) for index in range(total)]
+
+        self.stdout.write(f"Dataset: {total} keywords")
+
+        start = time.time()
+        exact = compute_overlaps(data)
+        exact_hierarchy = build_hierarchy(total, exact)
+        exact_time = time.time() - start
+
+        start = time.time()
+        approx = compute_overlaps_approx(data, bands=options['bands'], rows=options['rows'])
+        approx_hierarchy = build_hierarchy(total, approx)
+        approx_time = time.time() - start
+
+        self.stdout.write(f"Exact:  {exact_time:.2f}s | {len(exact[0])} pairs")
+        self.stdout.write(
+            f"Approx: {approx_time:.2f}s | {len(approx[0])} pairs "
+            f"(bands={options['bands']}, rows={options['rows']}) | speedup x{exact_time / max(approx_time, 1e-9):.1f}"
+        )
+
+        for threshold in thresholds:
+            exact_pairs = int(np.count_nonzero(exact[2] >= threshold))
+            approx_pairs = int(np.count_nonzero(approx[2] >= threshold))
+            pair_recall = approx_pairs / exact_pairs if exact_pairs else 1.0
+
+            # کیوورد درسته اگه وضعیت، Search Volume و AKW هاش در هر دو موتور یکی باشه
+            exact_results = cut_hierarchy(names, data.volumes, exact_hierarchy, threshold)
+            approx_results = cut_hierarchy(names, data.volumes, approx_hierarchy, threshold)
+            agreement = (
+                sum(exact == approx for exact, approx in zip(exact_results, approx_results)) / total
+                if total else 1.0
+            )
+
+            self.stdout.write(
+                f"  threshold={threshold}: pair recall {pair_recall:.2%} ({approx_pairs}/{exact_pairs}) "
+                f"| keywords with identical clustering {agreement:.2%}"
+            )
+
+    def _load_dataset(self, options):
+        if options['request']:
+            research_request = ResearchRequest.objects.filter(id=options['request']).first()
+            if not research_request:
+                raise CommandError(f"Request {options['request']} not found")
+            return ClusterInput.from_request(research_request)
+
+        path = options['file']
+        df = pd.read_csv(path) if path.endswith('.csv') else pd.read_excel(path)
+        if options['links_column'] not in df.columns:
+            raise CommandError(f"Column '{options['links_column']}' not found in {path}")
+
+        link_sets = []
+        for value in df[options['links_column']].fillna(''):
+            value = str(value).replace(LINK_SEPARATOR, "\n")
+            link_sets.append({link.strip() for link in value.split("\n") if link.strip()})
+        return ClusterInput.from_link_sets(link_sets)
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-19 13:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('keyword_research', '0005_keyword_intent_mapping_keyword_meta_titles_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='keyword',
+            name='original_search_volume',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='researchrequest',
+            name='cluster_threshold',
+            field=models.IntegerField(default=6),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-19 13:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('keyword_research', '0006_keyword_original_search_volume_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClusterHierarchy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.BinaryField()),
+                ('created_date', models.DateTimeField(auto_now=True)),
+                ('request', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='cluster_hierarchy', to='keyword_research.researchrequest')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-19 13:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('keyword_research', '0007_clusterhierarchy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='researchrequest',
+            name='ai_stats',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-19 14:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('keyword_research', '0008_researchrequest_ai_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='keyword',
+            name='intent_source',
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-19 14:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('keyword_research', '0009_keyword_intent_source'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='researchrequest',
+            name='ai_heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-19 14:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('keyword_research', '0010_researchrequest_ai_heartbeat_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='researchrequest',
+            name='ai_chunk_task_ids',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
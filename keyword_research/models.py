@@ -18,6 +18,10 @@ class ResearchRequest(models.Model):
     task_id = models.CharField(max_length=255, blank=True, null=True)
     error_message = models.TextField(blank=True, null=True)
     ai_analysis_enabled = models.BooleanField(default=False)  # ✅ جدید
+    cluster_threshold = models.IntegerField(default=6)  # حداقل لینک مشترک برای ادغام PKW/AKW
+    ai_stats = models.JSONField(default=dict, blank=True)  # تعداد PKW حل‌شده با Heuristic / کش / LLM
+    ai_heartbeat_at = models.DateTimeField(null=True, blank=True)  # آخرین فعالیت Chunk های AI (برای پیدا کردن Chord گیرکرده)
+    ai_chunk_task_ids = models.JSONField(default=list, blank=True)  # Task id های Chunk های AI (چک صف Broker قبل از تکمیل درخواست گیرکرده)
     
     def __str__(self):
         return f"{self.name} - {self.user.username}"
@@ -44,6 +48,7 @@ class Keyword(models.Model):
     original_id = models.IntegerField(null=True, blank=True)
     keyword = models.CharField(max_length=255)
     search_volume = models.IntegerField()
+    original_search_volume = models.IntegerField(null=True, blank=True)  # قبل از جمع شدن AKW ها
     links = models.TextField(blank=True)
     word_count = models.IntegerField(null=True, blank=True)  # ✅ آپدیت: nullable
     status = models.IntegerField(choices=STATUS_CHOICES, default=0)
@@ -55,6 +60,16 @@ class Keyword(models.Model):
     meta_titles = models.TextField(blank=True, null=True)
     search_intent = models.CharField(max_length=100, blank=True, null=True)
     intent_mapping = models.CharField(max_length=50, blank=True, null=True)
+    intent_source = models.CharField(max_length=20, blank=True, null=True)  # llm / cache / heuristic / model (آموزش مدل محلی فقط از llm و cache)
     
     def __str__(self):
-        return self.keyword
\ No newline at end of file
+        return self.keyword
+
+class ClusterHierarchy(models.Model):
+    """خوشه‌بندی از پیش محاسبه شده کیووردهای یک درخواست در همه آستانه‌ها (بدون محاسبه مجدد)"""
+    request = models.OneToOneField(ResearchRequest, on_delete=models.CASCADE, related_name='cluster_hierarchy')
+    data = models.BinaryField()  # npz فشرده: keyword_ids, volumes, thresholds, offsets, winners, losers
+    created_date = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Hierarchy - {self.request.name}"
@@ -0,0 +1,159 @@
+"""
+Throttled Progress Reporter (Result Backend + WebSocket Group کاربر)
+"""
+
+import asyncio
+import time
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+
+class ProgressReporter:
+    """
+    گزارش پیشرفت Task با Coalesce کردن Update ها
+
+    فقط وقتی منتشر میشه که حداقل PROGRESS_MIN_INTERVAL ثانیه از انتشار قبلی گذشته باشه
+    و پیشرفت حداقل PROGRESS_MIN_STEP (کسری از total) جلو رفته باشه؛ شروع/پایان/تغییر مرحله همیشه منتشر میشن.
+
+    هر انتشار: task.update_state(PROGRESS) + پیام task_progress به گروه user_{id}
+    (همراه با درصد، سرعت و ETA)
+
+    result_id: Task id ای که پیشرفت روش ذخیره میشه (پیش‌فرض خود Task)؛ Task های فرعی (Shard / Finalize یک Chord)
+    روی Task اصلی درخواست گزارش میدن، همون id ای که صفحه وضعیت Poll میکنه.
+    """
+
+    def __init__(self, task, user_id, kind, request_id, total=0, stage='', min_interval=None, min_step=None, result_id=None):
+        self.task = task
+        self.result_id = result_id
+        self.group_name = f"user_{user_id}"
+        self.kind = kind
+        self.request_id = request_id
+        self.total = total
+        self.stage = stage
+        self.current = 0
+        self.extra = {}
+
+        self.min_interval = getattr(settings, 'PROGRESS_MIN_INTERVAL', 0.5) if min_interval is None else min_interval
+        self.min_step = getattr(settings, 'PROGRESS_MIN_STEP', 0.01) if min_step is None else min_step
+
+        self.start_time = time.time()
+        self._stage_start = self.start_time
+        self._stage_start_current = 0
+        self._last_time = 0
+        self._last_current = None
+        self._channel_layer = get_channel_layer()
+        self._pending = set()
+        self.published = 0
+
+    # ------------------------------------------------------------------
+    # Update
+    # ------------------------------------------------------------------
+
+    def advance(self, count=1, **extra):
+        self.current += count
+        self.extra.update(extra)
+        self._maybe_publish()
+
+    def update(self, current, **extra):
+        self.current = current
+        self.extra.update(extra)
+        self._maybe_publish()
+
+    def on_result(self, index, result):
+        """callback برای serp search_many"""
+        self.advance(query=result.query)
+
+    def set_stage(self, stage, total=None):
+        """مرحله جدید (مثلاً serp → clustering)، همیشه منتشر میشه"""
+        self.stage = stage
+        if total is not None:
+            self.total = total
+            self.current = 0
+        self._stage_start = time.time()
+        self._stage_start_current = self.current
+        self.publish()
+
+    def finish(self, **extra):
+        self.current = max(self.current, self.total)
+        self.extra.update(extra)
+        self.publish()
+
+    def _maybe_publish(self):
+        now = time.time()
+        if self._last_current is None or self.current >= self.total:
+            self.publish()
+            return
+
+        if now - self._last_time < self.min_interval:
+            return
+        if self.total and (self.current - self._last_current) / self.total < self.min_step:
+            return
+
+        self.publish()
+
+    # ------------------------------------------------------------------
+    # Publish
+    # ------------------------------------------------------------------
+
+    def snapshot(self):
+        elapsed = time.time() - self._stage_start
+        done = self.current - self._stage_start_current
+        rate = done / elapsed if elapsed > 0 else 0.0
+        remaining = max(0, self.total - self.current)
+
+        return {
+            'kind': self.kind,
+            'request_id': self.request_id,
+            'stage': self.stage,
+            'current': self.current,
+            'total': self.total,
+            'percent': round(self.current / self.total * 100, 1) if self.total else 0.0,
+            'rate': round(rate, 2),
+            'eta_seconds': int(remaining / rate) if rate > 0 else None,
+            'elapsed_seconds': int(time.time() - self.start_time),
+            **self.extra,
+        }
+
+    def publish(self):
+        payload = self.snapshot()
+        self._last_time = time.time()
+        self._last_current = self.current
+        self.published += 1
+
+        try:
+            if self.task is not None and self.result_id and self.result_id != self.task.request.id:
+                self.task.backend.store_result(self.result_id, payload, 'PROGRESS')
+            elif self.task is not None and self.task.request.id:
+                self.task.update_state(state='PROGRESS', meta=payload)
+        except Exception as e:
+            print(f"⚠️ Progress update_state failed: {str(e)}")
+
+        self._send_group(payload)
+
+    def _send_group(self, payload):
+        if not self._channel_layer:
+            return
+
+        message = {'type': 'task_progress', 'data': payload}
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+
+        try:
+            if loop is None:
+                async_to_sync(self._channel_layer.group_send)(self.group_name, message)
+            else:
+                # داخل Event Loop (callback های search_many) → بدون Block کردن
+                future = loop.create_task(self._channel_layer.group_send(self.group_name, message))
+                self._pending.add(future)
+                future.add_done_callback(self._on_sent)
+        except Exception as e:
+            print(f"⚠️ Progress group_send failed: {str(e)}")
+
+    def _on_sent(self, future):
+        self._pending.discard(future)
+        if not future.cancelled() and future.exception() is not None:
+            print(f"⚠️ Progress group_send failed: {str(future.exception())}")
@@ -1,3 +1,204 @@
-from django.test import TestCase
-
-# Create your tests here.
+import random
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from .clustering import (
+    ClusterInput, apply_merges, build_cuts, build_hierarchy, compute_overlaps, cut_hierarchy,
+    link_components, _components_hierarchy, _merge_hierarchies, _pack_cuts, _unpack_cuts,
+)
+from .progress import ProgressReporter
+
+
+def baseline_clustering(names, volumes, link_sets, threshold):
+    """همون حلقه قدیمی _process_pkw_akw_comparison_in_task (بدون دیتابیس) برای مقایسه"""
+    keywords = [
+        {'id': index, 'keyword': names[index], 'search_volume': volumes[index],
+         'links': link_sets[index], 'status': 0, 'akw_str': ''}
+        for index in range(len(names))
+    ]
+    pending = list(keywords)
+
+    i = 0
+    while i < len(pending):
+        kw1 = pending[i]
+        j = i + 1
+        while j < len(pending):
+            kw2 = pending[j]
+            if len(kw1['links'] & kw2['links']) >= threshold:
+                if kw1['search_volume'] > kw2['search_volume'] or (
+                    kw1['search_volume'] == kw2['search_volume'] and kw1['id'] < kw2['id']
+                ):
+                    kw1['status'] = 1
+                    part = f"{kw2['keyword']}:{kw2['search_volume']}"
+                    kw1['akw_str'] = f"{kw1['akw_str']} - {part}" if kw1['akw_str'] else part
+                    kw1['search_volume'] += kw2['search_volume']
+                    kw2['status'] = 2
+                    pending.pop(j)
+                    continue
+                else:
+                    kw2['status'] = 1
+                    part = f"{kw1['keyword']}:{kw1['search_volume']}"
+                    kw2['akw_str'] = f"{kw2['akw_str']} - {part}" if kw2['akw_str'] else part
+                    kw2['search_volume'] += kw1['search_volume']
+                    kw1['status'] = 2
+                    pending.pop(i)
+                    i -= 1
+                    break
+            j += 1
+        i += 1
+
+    for kw in pending:
+        kw['status'] = 1
+
+    return [(kw['status'], kw['search_volume'], kw['akw_str']) for kw in keywords]
+
+
+def random_dataset(seed, total=120, domains=40, links=10):
+    rng = random.Random(seed)
+    names = [f"kw{index}" for index in range(total)]
+    # Volume های تکراری تا قانون تساوی (id کمتر) هم تست بشه
+    volumes = [rng.choice([0, 10, 10, 50, 100, 500, 1000]) for _ in range(total)]
+    link_sets = [
+        {f"https://site{rng.randrange(domains)}.com/" for _ in range(links)}
+        for _ in range(total)
+    ]
+    return names, volumes, link_sets
+
+
+class ClusteringTests(SimpleTestCase):
+
+    def test_cut_matches_baseline_greedy(self):
+        for seed in range(5):
+            names, volumes, link_sets = random_dataset(seed)
+            data = ClusterInput.from_link_sets(link_sets, volumes=volumes)
+            hierarchy = build_hierarchy(len(names), compute_overlaps(data))
+
+            for threshold in (1, 3, 4, 6, 10):
+                with self.subTest(seed=seed, threshold=threshold):
+                    self.assertEqual(
+                        cut_hierarchy(names, data.volumes, hierarchy, threshold),
+                        baseline_clustering(names, volumes, link_sets, threshold),
+                    )
+
+    def test_stored_cuts_match_greedy(self):
+        names, volumes, link_sets = random_dataset(3)
+        data = ClusterInput.from_link_sets(link_sets, volumes=volumes)
+        hierarchy = build_hierarchy(len(names), compute_overlaps(data))
+        keyword_ids = np.arange(len(names), dtype=np.int64)
+
+        stored_ids, stored_volumes, cuts = _unpack_cuts(_pack_cuts(keyword_ids, data.volumes, build_cuts(data.volumes, hierarchy)))
+
+        np.testing.assert_array_equal(stored_ids, keyword_ids)
+        self.assertEqual(sorted(cuts), list(range(1, 11)))
+        for threshold, merges in cuts.items():
+            with self.subTest(threshold=threshold):
+                self.assertEqual(
+                    apply_merges(names, stored_volumes, merges),
+                    baseline_clustering(names, volumes, link_sets, threshold),
+                )
+
+    def test_components_build_same_structure(self):
+        names, volumes, link_sets = random_dataset(7, total=200, domains=300, links=2)
+        data = ClusterInput.from_link_sets(link_sets, volumes=volumes)
+        whole = build_hierarchy(len(names), compute_overlaps(data))
+
+        components = [members for members in link_components(data) if len(members) > 1]
+        self.assertGreater(len(components), 1)
+        jobs = [
+            ([(np.array(members, dtype=np.int32), data.subset(members))], 'exact')
+            for members in components
+        ]
+        merged = _merge_hierarchies([_components_hierarchy(job) for job in jobs])
+
+        for expected, actual in zip(whole, merged):
+            np.testing.assert_array_equal(expected, actual)
+
+    def test_no_overlap_keeps_everyone_pkw(self):
+        names = ["a", "b"]
+        data = ClusterInput.from_link_sets([{"x"}, {"y"}], volumes=[5, 7])
+        hierarchy = build_hierarchy(2, compute_overlaps(data))
+        self.assertEqual(cut_hierarchy(names, data.volumes, hierarchy, 1), [(1, 5, ""), (1, 7, "")])
+
+
+class FakeTask:
+    def __init__(self):
+        self.request = SimpleNamespace(id='task-id')
+        self.states = []
+        self.backend = mock.Mock()
+
+    def update_state(self, state, meta):
+        self.states.append((state, meta))
+
+
+class ProgressReporterTests(SimpleTestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('keyword_research.progress.time.time', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.task = FakeTask()
+        self.progress = ProgressReporter(self.task, 1, 'research', 7, total=1000, stage='serp', min_interval=0.5, min_step=0.01)
+        self.progress._channel_layer = None
+
+    def test_updates_are_coalesced_by_interval_and_step(self):
+        self.progress.advance()  # اولین Update همیشه منتشر میشه
+        self.assertEqual(self.progress.published, 1)
+
+        # زمان گذشته ولی پیشرفت کمتر از PROGRESS_MIN_STEP (1%)
+        self.now += 1
+        self.progress.advance(5)
+        self.assertEqual(self.progress.published, 1)
+
+        self.progress.advance(20)
+        self.assertEqual(self.progress.published, 2)
+        self.assertEqual(self.task.states[-1][1]['current'], 26)
+
+        # پیشرفت زیاد ولی زیر PROGRESS_MIN_INTERVAL
+        self.progress.advance(500)
+        self.assertEqual(self.progress.published, 2)
+
+        # آخرین Update (current == total) همیشه منتشر میشه
+        self.progress.update(1000)
+        self.assertEqual(self.progress.published, 3)
+
+    def test_many_results_publish_a_bounded_number_of_times(self):
+        for _ in range(1000):
+            self.now += 0.01
+            self.progress.advance()
+
+        # 10 ثانیه، هر 0.5 ثانیه حداکثر یکبار (+ اولی و آخری)
+        self.assertLessEqual(self.progress.published, 22)
+        self.assertEqual(self.task.states[-1][1]['percent'], 100.0)
+
+    def test_stage_change_and_finish_always_publish(self):
+        self.progress.advance()
+        self.progress.set_stage('clustering', total=10)
+        self.progress.finish(found=3)
+
+        self.assertEqual(self.progress.published, 3)
+        self.assertEqual([meta['stage'] for state, meta in self.task.states], ['serp', 'clustering', 'clustering'])
+        self.assertEqual(self.task.states[-1][1]['found'], 3)
+
+    def test_snapshot_reports_rate_and_eta(self):
+        self.progress.advance(100)
+        self.now += 10
+        self.progress.update(300)
+        snapshot = self.progress.snapshot()
+
+        self.assertEqual(snapshot['rate'], 30.0)
+        self.assertEqual(snapshot['eta_seconds'], 23)
+        self.assertEqual(snapshot['percent'], 30.0)
+
+    def test_subtask_reports_on_parent_task(self):
+        progress = ProgressReporter(self.task, 1, 'gap', 7, total=10, result_id='parent-id')
+        progress._channel_layer = None
+        progress.update(4)
+
+        self.assertEqual(self.task.states, [])
+        result_id, meta, state = self.task.backend.store_result.call_args.args
+        self.assertEqual((result_id, state, meta['current']), ('parent-id', 'PROGRESS', 4))
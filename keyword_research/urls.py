@@ -5,6 +5,7 @@ urlpatterns = [
     path('', views.keyword_research, name='keyword_research'),
     path('requests/', views.requests_list, name='requests_list'),
     path('request/<int:pk>/', views.request_detail, name='request_detail'),
+    path('request/<int:pk>/recluster/', views.recluster_request, name='recluster_request'),
     path('request/<int:request_id>/delete/', views.delete_request, name='delete_request'),
     path('download-sample/', views.download_sample_file, name='download_sample_file'),
     path('check-status/', views.check_task_status, name='check_task_status'),  # ✅ جدید
@@ -6,9 +6,13 @@ from celery.result import AsyncResult
 from WowDash.celery import app as celery_app
 from .models import Keyword, ResearchRequest
 from .tasks import process_keyword_research
+from .clustering import (
+    cluster_request, clustered_pkw_keywords, save_clustering, MIN_THRESHOLD, MAX_THRESHOLD
+)
 import pandas as pd
 from django.conf import settings
 import os
+import time
 import uuid
 from urllib.parse import urlparse
 from collections import Counter
@@ -124,14 +128,80 @@ def requests_list(request):
 def request_detail(request, pk):
     req = get_object_or_404(ResearchRequest, pk=pk, user=request.user)
     
-    pkw_keywords = Keyword.objects.filter(request=req, status=1).order_by('id')
+    # ✅ تغییر سطح خوشه‌بندی از روی Overlap های ذخیره شده
+    threshold = req.cluster_threshold
+    if req.status == 'completed':
+        try:
+            threshold = int(request.GET.get('threshold', threshold))
+        except ValueError:
+            pass
+        threshold = min(max(threshold, MIN_THRESHOLD), MAX_THRESHOLD)
+    
+    pkw_keywords = clustered_pkw_keywords(req, threshold)
     
     if request.GET.get('download'):
         return _generate_output_file(pkw_keywords, req)
     
     return render(request, 'keyword_research/request_detail.html', {
         'req': req,
-        'keywords': pkw_keywords
+        'keywords': pkw_keywords,
+        'threshold': threshold,
+        'threshold_choices': range(MIN_THRESHOLD, MAX_THRESHOLD + 1),
+    })
+
+
+@login_required
+def recluster_request(request, pk):
+    """
+    خوشه‌بندی مجدد با آستانه دلخواه از روی SERP های ذخیره شده (بدون هزینه Serper)
+
+    GET: پیش‌نمایش نتیجه | POST با save=1: ذخیره به عنوان خوشه‌بندی فعال
+    (با AI فعال، PKW های تازه به صف AI میرن و درخواست تا پایان تحلیل running میشه)
+    """
+    req = get_object_or_404(ResearchRequest, pk=pk, user=request.user)
+    
+    if req.status != 'completed':
+        return JsonResponse({'error': 'درخواست هنوز تکمیل نشده است.'}, status=400)
+    
+    params = request.POST if request.method == 'POST' else request.GET
+    
+    try:
+        threshold = int(params.get('threshold', req.cluster_threshold))
+    except (TypeError, ValueError):
+        threshold = None
+    
+    if threshold is None or not MIN_THRESHOLD <= threshold <= MAX_THRESHOLD:
+        return JsonResponse(
+            {'error': f'آستانه باید بین {MIN_THRESHOLD} و {MAX_THRESHOLD} باشد.'},
+            status=400
+        )
+    
+    start_time = time.time()
+    keyword_ids, names, volumes, results = cluster_request(req, threshold)
+    
+    saved = request.method == 'POST' and params.get('save') == '1'
+    ai_queued = False
+    if saved:
+        save_clustering(req, keyword_ids, volumes, results, threshold)
+        if req.ai_analysis_enabled:
+            from ai_analyzer.tasks import analyze_reclustered_pkws
+            ai_queued = analyze_reclustered_pkws(req)
+    
+    pkw_list = [
+        {'id': kw_id, 'keyword': name, 'search_volume': volume, 'akw_str': akw_str}
+        for kw_id, name, (status, volume, akw_str) in zip(keyword_ids, names, results)
+        if status == 1
+    ]
+    
+    return JsonResponse({
+        'threshold': threshold,
+        'saved': saved,
+        'ai_queued': ai_queued,
+        'total': len(keyword_ids),
+        'pkw_count': len(pkw_list),
+        'akw_count': len(keyword_ids) - len(pkw_list),
+        'duration_ms': int((time.time() - start_time) * 1000),
+        'keywords': pkw_list,
     })
 
 
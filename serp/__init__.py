@@ -0,0 +1,6 @@
+"""
+SERP Providers مشترک (Serper / Apify / Fake) برای Keyword Research و Gap Analysis
+
+استفاده:
+    from serp.client import get_serp_provider, search_many
+"""
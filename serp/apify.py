@@ -0,0 +1,175 @@
+"""
+Apify Provider (google-search-scraper Actor)
+"""
+
+import asyncio
+import math
+import time
+from django.conf import settings
+
+from .base import SerpProvider, SerpResult, SerpError
+
+
+def normalize_term(query):
+    """Actor فاصله های اضافه رو حذف میکنه؛ برای برگرداندن Item ها به Query خودشون"""
+    return " ".join(query.split())
+
+
+class ApifyProvider(SerpProvider):
+    """
+    Apify: شروع Actor Run → Poll وضعیت (Async) → خواندن Dataset
+
+    search_many چند صد Query رو در یک Run می‌فرسته (APIFY_QUERIES_PER_RUN)،
+    Run ها همزمان Poll میشن و نتایج با searchQuery.term به Query ها برمی‌گردن.
+    """
+
+    NAME = 'apify'
+    RUN_URL = "https://api.apify.com/v2/acts/apify~google-search-scraper/runs"
+    STATUS_URL = "https://api.apify.com/v2/actor-runs/{run_id}"
+    ITEMS_URL = "https://api.apify.com/v2/datasets/{dataset_id}/items"
+
+    POLL_INTERVAL = 5
+    MAX_WAIT = 600
+    WAIT_PER_QUERY = 3  # زمان اضافه برای هر Query در Run های بزرگ
+    ITEMS_PAGE_SIZE = 1000
+
+    def __init__(self, token=None, max_pages_per_query=None, queries_per_run=None, **kwargs):
+        kwargs.setdefault('concurrency', getattr(settings, 'APIFY_MAX_CONCURRENT_RUNS', 5))
+        super().__init__(**kwargs)
+        self.token = token or settings.APIFY_TOKEN
+        self.max_pages_per_query = max_pages_per_query or getattr(settings, 'APIFY_MAX_PAGES_PER_QUERY', 2)
+        self.queries_per_run = max(1, queries_per_run or getattr(settings, 'APIFY_QUERIES_PER_RUN', 200))
+
+    async def start_run(self, queries, num=10):
+        """شروع یک Run (Query ها با خط جدید جدا میشن) → run_id"""
+        payload = {
+            "queries": "\n".join(queries),
+            "maxPagesPerQuery": max(self.max_pages_per_query, math.ceil(num / 10))
+        }
+        headers = {
+            "Authorization": f"Bearer {self.token}",
+            "Content-Type": "application/json"
+        }
+        data = await self.request_json('POST', self.RUN_URL, expected=(201,), timeout=120, json=payload, headers=headers)
+        return data['data']['id']
+
+    async def wait_for_run(self, run_id, queries_count=1):
+        """Poll تا SUCCEEDED → dataset_id"""
+        start_time = time.time()
+        url = self.STATUS_URL.format(run_id=run_id)
+        max_wait = self.MAX_WAIT + (queries_count - 1) * self.WAIT_PER_QUERY
+
+        while time.time() - start_time < max_wait:
+            data = await self.request_json('GET', url, params={'token': self.token})
+            status = data['data']['status']
+
+            if status == 'SUCCEEDED':
+                return data['data']['defaultDatasetId']
+            if status in ('FAILED', 'ABORTED', 'TIMED-OUT'):
+                raise SerpError(f"[{self.NAME}] Run {run_id} {status}")
+
+            await asyncio.sleep(self.POLL_INTERVAL)
+
+        raise SerpError(f"[{self.NAME}] Run {run_id} timeout ({max_wait}s)")
+
+    async def fetch_items(self, dataset_id):
+        """همه Item های Dataset (صفحه به صفحه)"""
+        url = self.ITEMS_URL.format(dataset_id=dataset_id)
+        items = []
+
+        while True:
+            page = await self.request_json('GET', url, timeout=60, params={
+                'token': self.token,
+                'format': 'json',
+                'offset': len(items),
+                'limit': self.ITEMS_PAGE_SIZE,
+            })
+            items.extend(page)
+            if len(page) < self.ITEMS_PAGE_SIZE:
+                return items
+
+    @staticmethod
+    def parse_items(items, num):
+        """
+        Dataset → {term: (links, titles)}
+
+        هر Item یک صفحه از یک Query هست (searchQuery.term / searchQuery.page)
+        """
+        pages = {}
+        for item in items:
+            search_query = item.get('searchQuery') or {}
+            term = normalize_term(search_query.get('term', ''))
+            pages.setdefault(term, []).append((search_query.get('page', 1), item.get('organicResults') or []))
+
+        parsed = {}
+        for term, term_pages in pages.items():
+            organic = [result for _, results in sorted(term_pages, key=lambda page: page[0]) for result in results]
+            organic = [result for result in organic if 'url' in result][:num]
+            parsed[term] = (
+                [result['url'] for result in organic],
+                [result.get('title', '') for result in organic],
+            )
+        return parsed
+
+    async def _search(self, query, num):
+        run_id = await self.start_run([query], num)
+        dataset_id = await self.wait_for_run(run_id)
+        items = await self.fetch_items(dataset_id)
+
+        # یک Query در Run → همه Item ها مال همونه
+        links, titles = next(iter(self.parse_items(items, num).values()), ([], []))
+        return SerpResult(query, links=links, titles=titles)
+
+    async def _run_batch(self, terms, num):
+        """
+        یک Run برای چند Query
+
+        Returns:
+            {term: SerpResult}
+        """
+        try:
+            run_id = await self.start_run(terms, num)
+            dataset_id = await self.wait_for_run(run_id, len(terms))
+            parsed = self.parse_items(await self.fetch_items(dataset_id), num)
+        except Exception as e:
+            return {term: SerpResult(term, error=str(e)) for term in terms}
+
+        return {
+            term: SerpResult(term, *parsed[term]) if term in parsed else SerpResult(term, error="Missing in dataset")
+            for term in terms
+        }
+
+    async def search_many(self, queries, num=10, on_result=None):
+        """
+        Query ها در Run های APIFY_QUERIES_PER_RUN تایی (حداکثر self.concurrency Run همزمان)
+
+        Returns:
+            list[SerpResult] به ترتیب queries
+        """
+        queries = list(queries)
+        indexes = {}
+        for index, query in enumerate(queries):
+            indexes.setdefault(normalize_term(query), []).append(index)
+
+        terms = [term for term in indexes if term]
+        batches = [terms[i:i + self.queries_per_run] for i in range(0, len(terms), self.queries_per_run)]
+        results = [None] * len(queries)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(batch):
+            async with semaphore:
+                batch_results = await self._run_batch(batch, num)
+            for term, result in batch_results.items():
+                for index in indexes[term]:
+                    results[index] = SerpResult(queries[index], result.links, result.titles, result.error)
+                    if on_result is not None:
+                        on_result(index, results[index])
+
+        await asyncio.gather(*[run(batch) for batch in batches])
+
+        for index in indexes.get('', []):
+            results[index] = SerpResult(queries[index], error="Empty query")
+            if on_result is not None:
+                on_result(index, results[index])
+
+        return results
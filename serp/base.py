@@ -0,0 +1,162 @@
+"""
+SERP Provider Base (Connection Pooling + Retry + Rate Limiting مشترک)
+"""
+
+import asyncio
+import aiohttp
+from django.conf import settings
+
+
+LINK_SEPARATOR = " -------------- "
+ERROR_VALUE = "خطا"
+
+
+class SerpError(Exception):
+    """خطای API بعد از تمام شدن Retry ها"""
+
+
+class SerpResult:
+    """نتیجه یک Query (لینک ها و عنوان ها به ترتیب رتبه)"""
+
+    __slots__ = ('query', 'links', 'titles', 'error')
+
+    def __init__(self, query, links=None, titles=None, error=None):
+        self.query = query
+        self.links = links or []
+        self.titles = titles or []
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def links_str(self, count=10):
+        """فرمت ذخیره Keyword.links (کمتر از count لینک → خطا)"""
+        if not self.ok or len(self.links) < count:
+            return ERROR_VALUE
+        return LINK_SEPARATOR.join(self.links[:count])
+
+    def titles_str(self, count=10):
+        if not self.ok or len(self.links) < count:
+            return ""
+        return "\n".join(self.titles[:count])
+
+    def __repr__(self):
+        return f"<SerpResult '{self.query}' links={len(self.links)} error={self.error}>"
+
+
+class SerpProvider:
+    """
+    کلاس پایه همه SERP Provider ها
+
+    - یک aiohttp Session برای هر Event Loop (Keep-Alive بین Query ها و Task ها)
+    - Retry با Backoff برای 429 / 5xx / خطای شبکه
+    - rate_limiter (اختیاری): SerpRateLimiter مشترک بین Worker ها
+    """
+
+    NAME = None
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self, timeout=None, max_retries=None, concurrency=None, rate_limiter=None):
+        self.timeout = timeout or getattr(settings, 'SERP_REQUEST_TIMEOUT', 30)
+        self.max_retries = max_retries or getattr(settings, 'SERP_MAX_RETRIES', 3)
+        self.concurrency = concurrency or getattr(settings, 'SERP_CONCURRENCY', 50)
+        self.rate_limiter = rate_limiter
+        self._session = None
+        self._session_loop = None
+
+    # ------------------------------------------------------------------
+    # HTTP
+    # ------------------------------------------------------------------
+
+    def _get_session(self):
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=max(self.concurrency, 10), ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+            self._session_loop = loop
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        if self.rate_limiter is not None:
+            await self.rate_limiter.close()
+
+    async def request_json(self, method, url, expected=(200,), timeout=None, **kwargs):
+        """
+        درخواست HTTP با Retry
+
+        Raises:
+            SerpError: بعد از max_retries تلاش ناموفق
+        """
+        if timeout is not None:
+            kwargs['timeout'] = aiohttp.ClientTimeout(total=timeout)
+
+        last_error = None
+        for attempt in range(self.max_retries):
+            try:
+                async with self._get_session().request(method, url, **kwargs) as response:
+                    if response.status in expected:
+                        return await response.json(content_type=None)
+
+                    last_error = f"HTTP {response.status}"
+                    if response.status not in self.RETRY_STATUSES:
+                        break
+
+                    # 429 → Backoff نمایی، بقیه → 1 ثانیه
+                    wait_time = (2 ** attempt) if response.status == 429 else 1
+
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                last_error = str(e) or type(e).__name__
+                wait_time = 1
+
+            if attempt < self.max_retries - 1:
+                await asyncio.sleep(wait_time)
+
+        raise SerpError(f"[{self.NAME}] {method} {url.split('?')[0]}: {last_error}")
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+
+    async def _search(self, query, num):
+        """
+        Returns:
+            SerpResult
+        """
+        raise NotImplementedError
+
+    async def search(self, query, num=10):
+        """یک Query (خطا → SerpResult با error، نه Exception)"""
+        if self.rate_limiter is not None and not await self.rate_limiter.acquire(count=1, timeout=30):
+            return SerpResult(query, error="Rate limit timeout")
+
+        try:
+            return await self._search(query, num)
+        except Exception as e:
+            return SerpResult(query, error=str(e))
+
+    async def search_many(self, queries, num=10, on_result=None):
+        """
+        چند Query به صورت همزمان (حداکثر self.concurrency در جریان)
+
+        Args:
+            on_result: callback(index, result) بعد از هر Query (برای Progress)
+
+        Returns:
+            list[SerpResult] به ترتیب queries
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(index, query):
+            async with semaphore:
+                result = await self.search(query, num)
+            if on_result is not None:
+                on_result(index, result)
+            return result
+
+        return await asyncio.gather(*[run(index, query) for index, query in enumerate(queries)])
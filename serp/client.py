@@ -0,0 +1,98 @@
+"""
+انتخاب SERP Provider + اجرای Sync (برای Celery Task ها)
+"""
+
+import asyncio
+import hashlib
+from django.conf import settings
+
+from .apify import ApifyProvider
+from .dispatcher import dispatch_many
+from .fake import FakeSerpProvider
+from .rate_limiter import SerpRateLimiter
+from .serper import SerperProvider
+
+
+# ✅ Provider مشترک هر Worker Process (Connection ها بین Task ها گرم می‌مونن)
+_PROVIDER_CACHE = {}
+
+# هر تغییری در این تنظیمات (از جمله کلیدها) Provider جدید می‌سازه
+_PROVIDER_SETTINGS = (
+    'SERPER_API_KEY', 'APIFY_TOKEN', 'SERP_MAX_QPS', 'SERP_CONCURRENCY', 'SERP_REQUEST_TIMEOUT',
+    'SERP_MAX_RETRIES', 'APIFY_MAX_CONCURRENT_RUNS', 'APIFY_MAX_PAGES_PER_QUERY', 'APIFY_QUERIES_PER_RUN',
+    'SERP_FAKE_DELAY',
+)
+
+# ✅ Event Loop ثابت برای هر Process (Session های aiohttp به Loop خودشون وابسته هستن)
+_EVENT_LOOP = None
+
+
+def run_async(coro):
+    global _EVENT_LOOP
+    if _EVENT_LOOP is None or _EVENT_LOOP.is_closed():
+        _EVENT_LOOP = asyncio.new_event_loop()
+    return _EVENT_LOOP.run_until_complete(coro)
+
+
+def _build_provider(name):
+    if name == 'serper':
+        return SerperProvider(rate_limiter=SerpRateLimiter('serper'))
+    if name == 'apify':
+        return ApifyProvider()
+    if name == 'fake':
+        return FakeSerpProvider()
+    raise ValueError(f"Unknown SERP provider: {name}")
+
+
+def _provider_cache_key(name):
+    values = "\n".join([name] + [repr(getattr(settings, key, None)) for key in _PROVIDER_SETTINGS])
+    return hashlib.sha256(values.encode('utf-8')).hexdigest()
+
+
+def get_serp_provider(name=None):
+    """
+    Provider کش‌شده این Process
+
+    Args:
+        name: 'serper' / 'apify' / 'fake' (پیش‌فرض: SERP_PROVIDER)
+    """
+    name = name or settings.SERP_PROVIDER
+    key = _provider_cache_key(name)
+    provider = _PROVIDER_CACHE.get(key)
+
+    if provider is None:
+        # Provider قبلی با همین اسم (تنظیمات عوض شده) بسته میشه
+        for old_key, old_provider in list(_PROVIDER_CACHE.items()):
+            if old_provider.NAME == name:
+                try:
+                    run_async(old_provider.close())
+                except Exception as e:
+                    print(f"⚠️ SERP provider close failed: {str(e)}")
+                del _PROVIDER_CACHE[old_key]
+
+        provider = _build_provider(name)
+        _PROVIDER_CACHE[key] = provider
+
+    return provider
+
+
+def search_many(queries, num=10, provider=None, on_result=None):
+    """
+    اجرای همزمان Query ها از کد Sync
+
+    SERP_DISPATCH_MODE='stream': Query ها به SERP Dispatcher مرکزی سپرده میشن و Task فقط منتظر نتیجه میمونه
+    (اگه Dispatcher در حال اجرا نباشه، مستقیم اجرا میشن).
+
+    Returns:
+        list[SerpResult] به ترتیب queries
+    """
+    provider = provider or get_serp_provider()
+    queries = list(queries)
+
+    if getattr(settings, 'SERP_DISPATCH_MODE', 'direct') == 'stream':
+        results = run_async(dispatch_many(queries, num=num, provider_name=provider.NAME, on_result=on_result))
+        if results is not None:
+            return results
+        print(f"⚠️ SERP dispatcher [{provider.NAME}] is not running → direct")
+
+    return run_async(provider.search_many(queries, num=num, on_result=on_result))
@@ -0,0 +1,412 @@
+"""
+SERP Dispatcher مرکزی (Redis Stream)
+
+Task ها (تحقیق و گپ) Query ها رو در Stream همون Provider میذارن و منتظر نتیجه در لیست Job خودشون میمونن؛
+یک Process (python manage.py serp_dispatcher) همه Query ها رو با نرخ دقیق Provider اجرا میکنه
+(به جای اینکه هر Worker Event Loop خودش رو داشته باشه و Rate Limiter رو Poll کنه).
+
+- Stream:  serp_dispatch:{provider}            (هر Entry = یک Query: job, index, query, num)
+- نتیجه:   serp_dispatch:result:{job_id}       (لیست JSON، بعد از SERP_DISPATCH_RESULT_TTL پاک میشه)
+- زنده بودن Dispatcher: serp_dispatch:{provider}:heartbeat
+"""
+
+import asyncio
+import json
+import socket
+import time
+import uuid
+
+import redis.asyncio as aioredis
+from django.conf import settings
+
+from .apify import ApifyProvider
+from .base import SerpResult
+from .fake import FakeSerpProvider
+from .rate_limiter import SerpRateLimiter
+from .serper import SerperProvider
+
+
+GROUP = 'serp_dispatchers'
+
+HEARTBEAT_TTL = 10  # ثانیه
+HEARTBEAT_INTERVAL = 2
+
+ENQUEUE_CHUNK = 1000
+
+
+def stream_key(provider_name):
+    return f"serp_dispatch:{provider_name}"
+
+
+def heartbeat_key(provider_name):
+    return f"serp_dispatch:{provider_name}:heartbeat"
+
+
+def result_key(job_id):
+    return f"serp_dispatch:result:{job_id}"
+
+
+def _redis():
+    return aioredis.Redis(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        db=settings.REDIS_DB,
+        decode_responses=True
+    )
+
+
+def _dump_result(index, result):
+    return json.dumps({
+        'index': index,
+        'query': result.query,
+        'links': result.links,
+        'titles': result.titles,
+        'error': result.error,
+    }, ensure_ascii=False)
+
+
+def _load_result(payload):
+    data = json.loads(payload)
+    return data['index'], SerpResult(data['query'], data['links'], data['titles'], data['error'])
+
+
+class IntervalPacer:
+    """
+    Rate Limiter محلی Dispatcher: هر Query دقیقاً 1/max_qps ثانیه بعد از قبلی (بدون Burst)
+
+    همون قرارداد SerpRateLimiter (acquire / close) رو داره.
+    shared (اختیاری): SerpRateLimiter مشترک Worker ها؛ هر Slot اونجا هم ثبت میشه تا Task هایی که
+    (بدون Heartbeat Dispatcher) مستقیم جستجو میکنن با Dispatcher از همون سقف SERP_MAX_QPS سهم بگیرن.
+    """
+
+    def __init__(self, max_qps, shared=None):
+        self.max_qps = max_qps
+        self.interval = 1.0 / max_qps
+        self.shared = shared
+        self._next_slot = 0.0
+
+    async def acquire(self, count=1, timeout=60):
+        now = time.monotonic()
+        slot = max(now, self._next_slot)
+        if slot - now > timeout:
+            return False
+
+        # ✅ رزرو Slot قبل از await (Coroutine های همزمان Slot های پشت سر هم میگیرن)
+        self._next_slot = slot + self.interval * count
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+        if self.shared is not None:
+            return await self.shared.acquire(count=count, timeout=max(0.0, timeout - (slot - now)))
+        return True
+
+    async def close(self):
+        if self.shared is not None:
+            await self.shared.close()
+
+
+async def dispatch_many(queries, num=10, provider_name='serper', on_result=None, timeout=None):
+    """
+    سپردن Query ها به Dispatcher و انتظار برای نتایج
+
+    Args:
+        on_result: callback(index, result) به محض رسیدن هر نتیجه (برای Progress)
+        timeout: اگه Dispatcher این مدت (ثانیه) Heartbeat نداشت، Query های باقیمانده خطا میشن
+
+    Returns:
+        list[SerpResult] به ترتیب queries، یا None اگه Dispatcher در حال اجرا نیست
+    """
+    timeout = timeout or getattr(settings, 'SERP_DISPATCH_TIMEOUT', 120)
+    client = _redis()
+
+    try:
+        if not await client.exists(heartbeat_key(provider_name)):
+            return None
+
+        job_id = uuid.uuid4().hex
+        reply_key = result_key(job_id)
+        stream = stream_key(provider_name)
+
+        for i in range(0, len(queries), ENQUEUE_CHUNK):
+            async with client.pipeline(transaction=False) as pipe:
+                for index in range(i, min(i + ENQUEUE_CHUNK, len(queries))):
+                    pipe.xadd(stream, {'job': job_id, 'index': index, 'query': queries[index], 'num': num})
+                await pipe.execute()
+
+        results = [None] * len(queries)
+        remaining = len(queries)
+        last_alive = time.time()
+
+        while remaining:
+            popped = await client.blpop([reply_key], timeout=HEARTBEAT_INTERVAL)
+
+            if popped is None:
+                # صف طولانیه (Job های قبلی) ولی Dispatcher زنده ست → صبر
+                if await client.exists(heartbeat_key(provider_name)):
+                    last_alive = time.time()
+                elif time.time() - last_alive > timeout:
+                    print(f"⚠️ SERP dispatcher [{provider_name}] gone for {timeout}s → {remaining} queries failed")
+                    break
+                continue
+
+            payloads = [popped[1]] + (await client.lpop(reply_key, 500) or [])
+            for payload in payloads:
+                index, result = _load_result(payload)
+                if results[index] is None:
+                    remaining -= 1
+                    if on_result is not None:
+                        on_result(index, result)
+                results[index] = result
+
+            last_alive = time.time()
+
+        await client.delete(reply_key)
+
+        return [
+            result if result is not None else SerpResult(queries[index], error="SERP dispatcher timeout")
+            for index, result in enumerate(results)
+        ]
+
+    finally:
+        await client.aclose()
+
+
+class SerpDispatcher:
+    """
+    Consumer Stream یک Provider
+
+    - Serper: یک IntervalPacer با SERP_MAX_QPS (نرخ دقیق) + ثبت در Limiter مشترک (مسیر مستقیم Worker ها)
+    - حداکثر SERP_DISPATCH_MAX_INFLIGHT Query در جریان (حداقل یک Batch کامل Provider)
+    - Entry ها تا Batch کامل Provider (Apify: APIFY_QUERIES_PER_RUN) جمع میشن؛ Batch ناقص بعد از
+      SERP_DISPATCH_LINGER ثانیه یا خالی شدن Stream ارسال میشه
+    - Entry های Ack نشده یک Dispatcher مرده (بعد از SERP_DISPATCH_CLAIM_IDLE ثانیه) دوباره اجرا میشن؛
+      Idle Entry های در حال اجرا (Run طولانی Apify) با هر Heartbeat صفر میشه تا Dispatcher دیگه برشون نداره
+    """
+
+    def __init__(self, provider_name, consumer=None, max_inflight=None):
+        self.provider_name = provider_name
+        self.stream = stream_key(provider_name)
+        self.consumer = consumer or f"{socket.gethostname()}:{provider_name}"
+        self.max_inflight = max_inflight or getattr(settings, 'SERP_DISPATCH_MAX_INFLIGHT', 100)
+        self.result_ttl = getattr(settings, 'SERP_DISPATCH_RESULT_TTL', 3600)
+        self.claim_idle = getattr(settings, 'SERP_DISPATCH_CLAIM_IDLE', 60)
+        self.linger = getattr(settings, 'SERP_DISPATCH_LINGER', 1.0)
+
+        self.provider = self._build_provider()
+        self.batch_size = getattr(self.provider, 'queries_per_run', 1)
+        self.max_inflight = max(self.max_inflight, self.batch_size)
+        self.processed = 0
+
+        self._client = None
+        self._stopping = False
+        self._inflight_ids = set()
+        self._buffer = {}  # num → [job]: خونده شده، منتظر Batch کامل
+        self._buffer_since = None
+        self._tasks = set()
+        self._slot_freed = None
+
+    def _build_provider(self):
+        if self.provider_name == 'serper':
+            max_qps = getattr(settings, 'SERP_MAX_QPS', 45)
+            return SerperProvider(
+                rate_limiter=IntervalPacer(max_qps, shared=SerpRateLimiter('serper', max_qps=max_qps)),
+                concurrency=self.max_inflight
+            )
+        if self.provider_name == 'apify':
+            return ApifyProvider()
+        if self.provider_name == 'fake':
+            return FakeSerpProvider()
+        raise ValueError(f"Unknown SERP provider: {self.provider_name}")
+
+    def stop(self):
+        self._stopping = True
+
+    # ------------------------------------------------------------------
+    # Loop
+    # ------------------------------------------------------------------
+
+    async def run(self):
+        self._client = _redis()
+        self._slot_freed = asyncio.Event()
+
+        try:
+            await self._client.xgroup_create(self.stream, GROUP, id='0', mkstream=True)
+        except aioredis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+        heartbeat = asyncio.create_task(self._heartbeat())
+        print(f"🚦 SERP dispatcher [{self.provider_name}] started ({self.consumer}, max in-flight {self.max_inflight})")
+
+        try:
+            # ✅ Entry های Ack نشده همین Consumer (قبل از Restart)
+            await self._consume('0')
+
+            last_claim = time.time()
+            while not self._stopping:
+                if time.time() - last_claim > self.claim_idle:
+                    await self._claim_stale()
+                    last_claim = time.time()
+                await self._consume('>')
+
+        finally:
+            self._flush(force=True)
+            if self._tasks:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+            heartbeat.cancel()
+            await self._client.delete(heartbeat_key(self.provider_name))
+            await self.provider.close()
+            await self._client.aclose()
+            print(f"🛑 SERP dispatcher [{self.provider_name}] stopped ({self.processed} queries)")
+
+    async def _heartbeat(self):
+        last_report = time.time()
+        last_processed = 0
+
+        while True:
+            try:
+                await self._client.set(heartbeat_key(self.provider_name), self.consumer, ex=HEARTBEAT_TTL)
+                await self._refresh_inflight()
+            except Exception as e:
+                print(f"❌ SERP dispatcher heartbeat failed: {str(e)}")
+
+            if time.time() - last_report >= 60:
+                rate = (self.processed - last_processed) / (time.time() - last_report)
+                print(f"📊 SERP dispatcher [{self.provider_name}] {rate:.1f} q/s | in-flight {len(self._inflight_ids)} | total {self.processed}")
+                last_report, last_processed = time.time(), self.processed
+
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+    async def _refresh_inflight(self):
+        """XCLAIM JUSTID Entry های در حال اجرا به خود همین Consumer → Idle صفر (xautoclaim بقیه نمیگیرتشون)"""
+        entry_ids = list(self._inflight_ids)
+        for start in range(0, len(entry_ids), ENQUEUE_CHUNK):
+            await self._client.xclaim(
+                self.stream, GROUP, self.consumer, min_idle_time=0,
+                message_ids=entry_ids[start:start + ENQUEUE_CHUNK], idle=0, justid=True
+            )
+
+    async def _consume(self, start_id):
+        free = self.max_inflight - len(self._inflight_ids)
+        if free <= 0:
+            # ✅ Buffer کل ظرفیت رو گرفته → Batch ناقص الان ارسال میشه
+            self._flush(force=True)
+            try:
+                await asyncio.wait_for(self._slot_freed.wait(), timeout=1)
+            except asyncio.TimeoutError:
+                pass
+            self._slot_freed.clear()
+            return
+
+        block = None
+        if start_id == '>':
+            block = 1000
+            if self._buffer_since is not None:
+                block = max(1, int((self._buffer_since + self.linger - time.monotonic()) * 1000))
+
+        try:
+            response = await self._client.xreadgroup(
+                GROUP, self.consumer, {self.stream: start_id}, count=free, block=block
+            )
+        except Exception as e:
+            print(f"❌ SERP dispatcher read failed: {str(e)}")
+            await asyncio.sleep(1)
+            return
+
+        entries = response[0][1] if response else []
+        self._dispatch(entries)
+        # Stream خالیه → منتظر Batch کامل نمیمونیم
+        self._flush(force=not entries)
+
+    async def _claim_stale(self):
+        """Entry هایی که Consumer دیگه ای گرفته و بیشتر از claim_idle ثانیه Ack نشدن (Dispatcher مرده)"""
+        free = self.max_inflight - len(self._inflight_ids)
+        if free <= 0:
+            return
+
+        try:
+            response = await self._client.xautoclaim(
+                self.stream, GROUP, self.consumer,
+                min_idle_time=self.claim_idle * 1000, start_id='0-0', count=free
+            )
+        except Exception as e:
+            print(f"❌ SERP dispatcher claim failed: {str(e)}")
+            return
+
+        entries = response[1]
+        if entries:
+            print(f"♻️ SERP dispatcher [{self.provider_name}] reclaimed {len(entries)} stale queries")
+            self._dispatch(entries)
+            self._flush()
+
+    def _dispatch(self, entries):
+        """Entry ها → Buffer همون num (ارسال با _flush)"""
+        for entry_id, fields in entries:
+            if entry_id in self._inflight_ids:
+                continue
+            if not fields:
+                # Entry حذف شده
+                asyncio.create_task(self._client.xack(self.stream, GROUP, entry_id))
+                continue
+
+            self._inflight_ids.add(entry_id)
+            self._buffer.setdefault(int(fields['num']), []).append(
+                (entry_id, fields['job'], int(fields['index']), fields['query'])
+            )
+            if self._buffer_since is None:
+                self._buffer_since = time.monotonic()
+
+    def _flush(self, force=False):
+        """
+        Buffer → یک search_many برای هر num، فقط مضرب batch_size (Run های کامل Apify)
+
+        باقیمانده (Batch ناقص) تا force یا گذشتن SERP_DISPATCH_LINGER ثانیه از قدیمی‌ترین Entry میمونه.
+        """
+        if self._buffer_since is None:
+            return
+        force = force or time.monotonic() - self._buffer_since >= self.linger
+
+        for num in list(self._buffer):
+            jobs = self._buffer[num]
+            ready = len(jobs) if force else len(jobs) - len(jobs) % self.batch_size
+            if ready:
+                task = asyncio.create_task(self._run_jobs(num, jobs[:ready]))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            if ready == len(jobs):
+                del self._buffer[num]
+            else:
+                self._buffer[num] = jobs[ready:]
+
+        if not self._buffer:
+            self._buffer_since = None
+
+    async def _run_jobs(self, num, jobs):
+        publishes = []
+
+        def on_result(position, result):
+            publishes.append(asyncio.ensure_future(self._publish(jobs[position], result)))
+
+        try:
+            await self.provider.search_many([job[3] for job in jobs], num=num, on_result=on_result)
+            await asyncio.gather(*publishes)
+        except Exception as e:
+            # Ack نشده → بعد از claim_idle دوباره اجرا میشه
+            print(f"❌ SERP dispatcher [{self.provider_name}] batch failed: {str(e)}")
+        finally:
+            for entry_id, job_id, index, query in jobs:
+                self._inflight_ids.discard(entry_id)
+            self._slot_freed.set()
+
+    async def _publish(self, job, result):
+        entry_id, job_id, index, query = job
+        reply_key = result_key(job_id)
+
+        async with self._client.pipeline(transaction=True) as pipe:
+            pipe.rpush(reply_key, _dump_result(index, result))
+            pipe.expire(reply_key, self.result_ttl)
+            pipe.xack(self.stream, GROUP, entry_id)
+            pipe.xdel(self.stream, entry_id)
+            await pipe.execute()
+
+        self.processed += 1
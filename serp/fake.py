@@ -0,0 +1,57 @@
+"""
+Fake SERP Provider (بدون شبکه و هزینه) برای توسعه محلی و تست بار
+
+نتایج قطعی هستن: هر کلمه چند URL ثابت داره، پس Keyword های با کلمات مشترک لینک مشترک هم دارن
+"""
+
+import asyncio
+import random
+import zlib
+from django.conf import settings
+
+from .base import SerpProvider, SerpResult
+
+
+_DOMAINS = (
+    'digikala.com', 'torob.com', 'emalls.ir', 'divar.ir', 'namnak.com', 'digiato.com',
+    'zoomit.ir', 'technolife.ir', 'snappshop.ir', 'basalam.com', 'okala.com', 'modiseh.com',
+    'fa.wikipedia.org', 'aparat.com', 'beytoote.com', 'chetor.com', 'filimo.com', 'khanoumi.com',
+)
+
+
+def _seed(text):
+    return zlib.crc32(text.encode('utf-8'))
+
+
+class FakeSerpProvider(SerpProvider):
+    """Provider محلی (SERP_PROVIDER=fake)"""
+
+    NAME = 'fake'
+    URLS_PER_WORD = 6
+
+    def __init__(self, delay=None, **kwargs):
+        super().__init__(**kwargs)
+        self.delay = getattr(settings, 'SERP_FAKE_DELAY', 0.0) if delay is None else delay
+
+    def _word_urls(self, word):
+        rng = random.Random(_seed(word))
+        return [
+            f"https://{rng.choice(_DOMAINS)}/{word}-{rng.randrange(1000)}"
+            for _ in range(self.URLS_PER_WORD)
+        ]
+
+    async def _search(self, query, num):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+
+        candidates = [url for word in query.split() for url in self._word_urls(word.lower())]
+        random.Random(_seed(query)).shuffle(candidates)
+
+        links = list(dict.fromkeys(candidates))
+        index = 0
+        while len(links) < num:
+            links.append(f"https://{_DOMAINS[index % len(_DOMAINS)]}/{_seed(query)}-{index}")
+            index += 1
+
+        links = links[:num]
+        return SerpResult(query, links=links, titles=[f"{query} | {link.split('/')[2]}" for link in links])
@@ -0,0 +1,39 @@
+"""
+SERP Dispatcher مرکزی: مصرف Stream Query ها و اجرا با نرخ دقیق Provider (SERP_DISPATCH_MODE='stream')
+"""
+
+import asyncio
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from serp.dispatcher import SerpDispatcher
+
+
+class Command(BaseCommand):
+    help = 'Run the central SERP dispatcher (Redis Stream → provider at its exact rate)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'providers', nargs='*',
+            help='Provider ها (پیش‌فرض: SERP_PROVIDER و GAP_SERP_PROVIDER)'
+        )
+        parser.add_argument('--max-inflight', type=int, default=None, help='پیش‌فرض SERP_DISPATCH_MAX_INFLIGHT')
+
+    def handle(self, *args, **options):
+        providers = options['providers'] or sorted({settings.SERP_PROVIDER, settings.GAP_SERP_PROVIDER})
+
+        if getattr(settings, 'SERP_DISPATCH_MODE', 'direct') != 'stream':
+            self.stdout.write(self.style.WARNING("⚠️ SERP_DISPATCH_MODE is not 'stream' → tasks won't use the dispatcher"))
+
+        asyncio.run(self._run(providers, options['max_inflight']))
+
+    async def _run(self, providers, max_inflight):
+        dispatchers = [SerpDispatcher(name, max_inflight=max_inflight) for name in providers]
+
+        # ✅ SIGTERM/SIGINT: Query های در جریان تموم و Ack میشن، بعد خروج
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, lambda: [dispatcher.stop() for dispatcher in dispatchers])
+
+        await asyncio.gather(*[dispatcher.run() for dispatcher in dispatchers])
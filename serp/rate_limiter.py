@@ -0,0 +1,116 @@
+"""
+Global Async Rate Limiter for SERP Providers (QPS)
+"""
+
+import asyncio
+import time
+import uuid
+import redis.asyncio as aioredis
+from django.conf import settings
+
+
+# اسکریپت اتمیک: پنجره 1 ثانیه‌ای (چک و ثبت در یک مرحله، بدون Race بین Worker ها)
+_ACQUIRE_SCRIPT = """
+local key = KEYS[1]
+local now = tonumber(ARGV[1])
+local max_qps = tonumber(ARGV[2])
+local count = tonumber(ARGV[3])
+local member = ARGV[4]
+
+redis.call('ZREMRANGEBYSCORE', key, 0, now - 1.0)
+
+if redis.call('ZCARD', key) + count > max_qps then
+    return 0
+end
+
+for i = 1, count do
+    redis.call('ZADD', key, now, member .. ':' .. i)
+end
+redis.call('EXPIRE', key, 2)
+return 1
+"""
+
+
+class SerpRateLimiter:
+    """Rate Limiter مشترک بین همه Worker ها برای یک SERP Provider (Queries/Second)"""
+
+    def __init__(self, provider_name, max_qps=None):
+        self.max_qps = max_qps or getattr(settings, 'SERP_MAX_QPS', 45)
+        self.key = f"serp_rate_limiter:{provider_name}"
+        self._client = None
+        self._client_loop = None
+        self._script = None
+        self._lock = None
+
+    def _get_client(self):
+        """یک Client برای هر Event Loop (Connection های redis.asyncio به Loop وابسته هستن)"""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            self._client = aioredis.Redis(
+                host=settings.REDIS_HOST,
+                port=settings.REDIS_PORT,
+                db=settings.REDIS_DB,
+                decode_responses=True
+            )
+            self._client_loop = loop
+            self._script = self._client.register_script(_ACQUIRE_SCRIPT)
+            # فقط یک Coroutine در هر Process از Redis Poll میکنه، بقیه پشت Lock صبر میکنن
+            self._lock = asyncio.Lock()
+        return self._client
+
+    async def acquire(self, count=1, timeout=60):
+        """
+        درخواست Token برای ارسال Query
+
+        Args:
+            count: تعداد Query که می‌خوایم بفرستیم
+            timeout: حداکثر زمان انتظار (ثانیه)
+
+        Returns:
+            bool: True اگه Token گرفت، False اگه Timeout شد
+        """
+        self._get_client()
+        start_time = time.time()
+
+        try:
+            await asyncio.wait_for(self._lock.acquire(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return False
+
+        try:
+            return await self._poll(count, start_time, timeout)
+        finally:
+            self._lock.release()
+
+    async def _poll(self, count, start_time, timeout):
+        while time.time() - start_time < timeout:
+            try:
+                granted = await self._script(
+                    keys=[self.key],
+                    args=[time.time(), self.max_qps, count, uuid.uuid4().hex]
+                )
+                if granted:
+                    return True
+
+                await asyncio.sleep(0.02)
+
+            except Exception as e:
+                print(f"❌ SERP Rate Limiter Error: {str(e)}")
+                await asyncio.sleep(0.1)
+
+        return False
+
+    async def current_qps(self):
+        """QPS فعلی (همه Worker ها)"""
+        try:
+            client = self._get_client()
+            await client.zremrangebyscore(self.key, 0, time.time() - 1.0)
+            return await client.zcard(self.key)
+        except Exception:
+            return 0
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+        self._client = None
+        self._client_loop = None
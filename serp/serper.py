@@ -0,0 +1,43 @@
+"""
+Serper.dev Provider (Google Search API)
+"""
+
+from django.conf import settings
+
+from .base import SerpProvider, SerpResult
+
+
+class SerperProvider(SerpProvider):
+    """Serper: هر Query یک درخواست POST (سریع، با Rate Limit مشترک)"""
+
+    NAME = 'serper'
+    URL = "https://google.serper.dev/search"
+
+    def __init__(self, api_key=None, gl='ir', hl='fa', location='Germany', **kwargs):
+        super().__init__(**kwargs)
+        self.api_key = api_key or settings.SERPER_API_KEY
+        self.gl = gl
+        self.hl = hl
+        self.location = location
+
+    async def _search(self, query, num):
+        payload = {
+            "q": query,
+            "gl": self.gl,
+            "hl": self.hl,
+            "num": num,
+            "location": self.location
+        }
+        headers = {
+            "X-API-KEY": self.api_key,
+            "Content-Type": "application/json"
+        }
+
+        data = await self.request_json('POST', self.URL, json=payload, headers=headers)
+        organic = data.get('organic', [])[:num]
+
+        return SerpResult(
+            query,
+            links=[result.get('link', '') for result in organic],
+            titles=[result.get('title', '') for result in organic],
+        )
@@ -0,0 +1,277 @@
+import asyncio
+import time
+import uuid
+from unittest import skipUnless
+
+import redis
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from .apify import ApifyProvider
+from .dispatcher import GROUP, SerpDispatcher, IntervalPacer, _redis, dispatch_many, heartbeat_key, stream_key
+from .fake import FakeSerpProvider
+from .rate_limiter import SerpRateLimiter
+
+
+def redis_available():
+    try:
+        return redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB).ping()
+    except redis.RedisError:
+        return False
+
+
+def entries(start, count, num=10):
+    return [
+        (f"{index}-0", {'job': 'job', 'index': index, 'query': f"query {index}", 'num': num})
+        for index in range(start, start + count)
+    ]
+
+
+# Item های Dataset یک Run واقعی google-search-scraper (فقط فیلدهای استفاده شده، کوتاه شده)
+APIFY_ITEMS = [
+    {
+        'searchQuery': {'term': 'buy phone', 'page': 2, 'type': 'SEARCH', 'countryCode': 'ir'},
+        'organicResults': [
+            {'title': 'Phone 11', 'url': 'https://shop-b.ir/11', 'position': 11},
+            {'title': 'Phone 12', 'url': 'https://shop-b.ir/12', 'position': 12},
+        ],
+    },
+    {
+        'searchQuery': {'term': 'buy phone', 'page': 1, 'type': 'SEARCH', 'countryCode': 'ir'},
+        'organicResults': [
+            {'title': 'Phone 1', 'url': 'https://shop-a.ir/1', 'position': 1},
+            {'title': 'No url (ad block)', 'position': 2},
+            {'title': 'Phone 3', 'url': 'https://shop-a.ir/3', 'position': 3},
+        ],
+    },
+    {
+        'searchQuery': {'term': 'laptop   price', 'page': 1, 'type': 'SEARCH', 'countryCode': 'ir'},
+        'organicResults': [{'url': 'https://laptop.ir/'}],
+    },
+    {
+        'searchQuery': {'term': 'no results', 'page': 1, 'type': 'SEARCH', 'countryCode': 'ir'},
+        'organicResults': None,
+    },
+]
+
+
+class ApifyParseTests(SimpleTestCase):
+
+    def test_pages_are_ordered_and_terms_normalized(self):
+        parsed = ApifyProvider.parse_items(APIFY_ITEMS, num=10)
+
+        self.assertEqual(parsed['buy phone'], (
+            ['https://shop-a.ir/1', 'https://shop-a.ir/3', 'https://shop-b.ir/11', 'https://shop-b.ir/12'],
+            ['Phone 1', 'Phone 3', 'Phone 11', 'Phone 12'],
+        ))
+        self.assertEqual(parsed['laptop price'], (['https://laptop.ir/'], ['']))
+        self.assertEqual(parsed['no results'], ([], []))
+
+    def test_results_are_cut_at_num(self):
+        self.assertEqual(len(ApifyProvider.parse_items(APIFY_ITEMS, num=3)['buy phone'][0]), 3)
+
+    def test_search_many_maps_items_back_to_queries(self):
+        provider = ApifyProvider(token='test', queries_per_run=2)
+        runs = []
+
+        async def start_run(terms, num=10):
+            runs.append(list(terms))
+            return f"run-{len(runs)}"
+
+        async def wait_for_run(run_id, queries_count=1):
+            return run_id
+
+        async def fetch_items(dataset_id):
+            terms = runs[int(dataset_id.split('-')[1]) - 1]
+            return [item for item in APIFY_ITEMS if " ".join(item['searchQuery']['term'].split()) in terms]
+
+        provider.start_run, provider.wait_for_run, provider.fetch_items = start_run, wait_for_run, fetch_items
+        queries = ['buy phone', ' laptop  price ', 'buy  phone', 'missing term', '   ']
+        seen = []
+
+        results = asyncio.run(provider.search_many(queries, num=10, on_result=lambda index, result: seen.append(index)))
+
+        # Query تکراری (بعد از Normalize) فقط یکبار فرستاده میشه
+        self.assertEqual(runs, [['buy phone', 'laptop price'], ['missing term']])
+        self.assertEqual(sorted(seen), [0, 1, 2, 3, 4])
+
+        self.assertEqual(results[0].links[0], 'https://shop-a.ir/1')
+        self.assertEqual(results[2].links, results[0].links)
+        self.assertEqual(results[2].query, 'buy  phone')
+        self.assertEqual(results[1].links, ['https://laptop.ir/'])
+        self.assertEqual(results[3].error, "Missing in dataset")
+        self.assertEqual(results[4].error, "Empty query")
+
+
+class IntervalPacerTests(SimpleTestCase):
+
+    def test_slots_are_spaced(self):
+        async def run():
+            pacer = IntervalPacer(50)
+            start = time.monotonic()
+            await asyncio.gather(*[pacer.acquire() for _ in range(6)])
+            return time.monotonic() - start
+
+        # Slot اول فوری، 5 تای بعدی هر کدوم 20ms بعد از قبلی
+        self.assertGreaterEqual(asyncio.run(run()), 0.09)
+
+    def test_slot_beyond_timeout_is_refused(self):
+        async def run():
+            pacer = IntervalPacer(1)
+            return [await pacer.acquire(timeout=0.5), await pacer.acquire(timeout=0.5)]
+
+        self.assertEqual(asyncio.run(run()), [True, False])
+
+
+class DispatcherBatchingTests(SimpleTestCase):
+
+    def setUp(self):
+        self.dispatcher = SerpDispatcher('fake', consumer='test')
+        self.dispatcher.batch_size = 200
+        self.dispatcher.linger = 60
+        self.batches = []
+
+        async def run_jobs(num, jobs):
+            self.batches.append((num, [job[2] for job in jobs]))
+
+        self.dispatcher._run_jobs = run_jobs
+
+    def flush(self, *chunks, force=False):
+        async def run():
+            for chunk in chunks:
+                self.dispatcher._dispatch(chunk)
+                self.dispatcher._flush()
+            if force:
+                self.dispatcher._flush(force=True)
+            await asyncio.gather(*self.dispatcher._tasks)
+
+        asyncio.run(run())
+
+    def test_reads_are_accumulated_into_full_batches(self):
+        self.flush(entries(0, 100), entries(100, 100), entries(200, 50))
+
+        self.assertEqual(self.batches, [(10, list(range(200)))])
+        self.assertEqual(len(self.dispatcher._buffer[10]), 50)
+
+    def test_partial_batch_is_sent_on_force(self):
+        self.flush(entries(0, 250), force=True)
+
+        self.assertEqual(self.batches, [(10, list(range(200))), (10, list(range(200, 250)))])
+        self.assertEqual(self.dispatcher._buffer, {})
+        self.assertIsNone(self.dispatcher._buffer_since)
+
+    def test_partial_batch_is_sent_after_linger(self):
+        self.dispatcher.linger = 0
+        self.flush(entries(0, 30))
+
+        self.assertEqual(self.batches, [(10, list(range(30)))])
+
+    def test_batches_are_per_num(self):
+        self.flush(entries(0, 200, num=10) + entries(200, 200, num=100))
+
+        self.assertEqual(sorted(num for num, indexes in self.batches), [10, 100])
+
+    @override_settings(APIFY_QUERIES_PER_RUN=200)
+    def test_inflight_covers_a_full_batch(self):
+        dispatcher = SerpDispatcher('apify', consumer='test', max_inflight=100)
+
+        self.assertEqual(dispatcher.batch_size, 200)
+        self.assertEqual(dispatcher.max_inflight, 200)
+
+
+@skipUnless(redis_available(), "Redis is not running")
+@override_settings(SERP_DISPATCH_CLAIM_IDLE=1)
+class DispatcherRoundTripTests(SimpleTestCase):
+
+    def tearDown(self):
+        client = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB)
+        client.delete(stream_key('fake'), heartbeat_key('fake'))
+        client.close()
+
+    def test_results_come_back_in_order(self):
+        queries = [f"query {index}" for index in range(25)]
+
+        async def run():
+            dispatcher = SerpDispatcher('fake', consumer=f"test-{uuid.uuid4().hex[:8]}")
+            runner = asyncio.create_task(dispatcher.run())
+            try:
+                for _ in range(50):
+                    results = await dispatch_many(queries, num=10, provider_name='fake', timeout=5)
+                    if results is not None:
+                        return results
+                    await asyncio.sleep(0.1)
+            finally:
+                dispatcher.stop()
+                await runner
+
+        results = asyncio.run(run())
+
+        expected = asyncio.run(FakeSerpProvider().search_many(queries, num=10))
+        self.assertEqual([result.links for result in results], [result.links for result in expected])
+
+
+@skipUnless(redis_available(), "Redis is not running")
+@override_settings(SERP_DISPATCH_CLAIM_IDLE=1)
+class DispatcherClaimTests(SimpleTestCase):
+
+    def tearDown(self):
+        client = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB)
+        client.delete(stream_key('fake'))
+        client.close()
+
+    def test_inflight_entries_are_not_reclaimed(self):
+        async def run():
+            owner = SerpDispatcher('fake', consumer='test-owner')
+            other = SerpDispatcher('fake', consumer='test-other')
+            owner._client, other._client = _redis(), _redis()
+            try:
+                await owner._client.xgroup_create(owner.stream, GROUP, id='0', mkstream=True)
+                await owner._client.xadd(owner.stream, {'job': 'job', 'index': 0, 'query': 'q', 'num': 10})
+                response = await owner._client.xreadgroup(GROUP, owner.consumer, {owner.stream: '>'}, count=1)
+                owner._inflight_ids = {entry_id for entry_id, fields in response[0][1]}
+
+                # Run طولانی: بیشتر از claim_idle بدون Ack، ولی Heartbeat صاحبش زنده ست
+                await asyncio.sleep(1.2)
+                await owner._refresh_inflight()
+                claimed = await other._client.xautoclaim(other.stream, GROUP, other.consumer, min_idle_time=1000, start_id='0-0')
+                return claimed[1]
+            finally:
+                await owner._client.aclose()
+                await other._client.aclose()
+
+        self.assertEqual(asyncio.run(run()), [])
+
+
+@skipUnless(redis_available(), "Redis is not running")
+class SerpRateLimiterTests(SimpleTestCase):
+
+    def test_window_caps_queries_per_second(self):
+        async def run():
+            limiter = SerpRateLimiter(f"test-{uuid.uuid4().hex}", max_qps=5)
+            try:
+                granted = [await limiter.acquire(timeout=1) for _ in range(5)]
+                return granted, await limiter.acquire(timeout=0.2)
+            finally:
+                await limiter.close()
+
+        granted, extra = asyncio.run(run())
+        self.assertEqual(granted, [True] * 5)
+        self.assertFalse(extra)
+
+    def test_dispatcher_pacer_uses_shared_budget(self):
+        name = f"test-{uuid.uuid4().hex}"
+
+        async def run():
+            pacer = IntervalPacer(100, shared=SerpRateLimiter(name, max_qps=3))
+            direct = SerpRateLimiter(name, max_qps=3)
+            try:
+                paced = [await pacer.acquire(timeout=1) for _ in range(3)]
+                # Worker ای که مستقیم جستجو میکنه از همون سقف سهم میگیره
+                return paced, await direct.acquire(timeout=0.2)
+            finally:
+                await pacer.close()
+                await direct.close()
+
+        paced, direct_granted = asyncio.run(run())
+        self.assertEqual(paced, [True] * 3)
+        self.assertFalse(direct_granted)
@@ -16,6 +16,7 @@ source $VENV_PATH
 if ! pgrep -f "celery.*WowDash worker" > /dev/null; then
     echo "[$(date)] Starting Celery Worker..." >> $LOG_FILE
     celery -A WowDash worker \
+        -Q chaboktool_queue,chaboktool_ai_queue \
         --loglevel=info \
         --concurrency=8 \
         --logfile=$LOG_FILE \
@@ -7,6 +7,7 @@ source /home/dncboti1/virtualenv/ChabokTool/3.11/bin/activate
 # Kill old workers
 echo "🛑 Stopping old workers..."
 pkill -9 -f celery
+pkill -f serp_dispatcher
 sleep 2
 
 # Create logs directory
@@ -30,9 +31,48 @@ for i in $(seq 1 $NUM_WORKERS); do
     sleep 1
 done
 
+# ✅ Worker های تحلیل AI (صف جدا، Worker های تحقیق منتظر AI نمی‌مونن)
+NUM_AI_WORKERS=2
+
+echo "🤖 Starting $NUM_AI_WORKERS AI workers..."
+
+for i in $(seq 1 $NUM_AI_WORKERS); do
+    nohup celery -A WowDash worker \
+        -Q chaboktool_ai_queue \
+        --loglevel=info \
+        --concurrency=4 \
+        -n ai_worker$i@%h \
+        --logfile=logs/ai_worker_$i.log \
+        > /dev/null 2>&1 &
+    
+    echo "✅ Started ai_worker$i"
+    sleep 1
+done
+
+# ✅ Celery Beat (ادامه خودکار Gap Analysis های متوقف شده)
+nohup celery -A WowDash beat \
+    --loglevel=info \
+    --schedule=logs/celerybeat-schedule \
+    --logfile=logs/beat.log \
+    > /dev/null 2>&1 &
+
+echo "⏰ Started beat"
+
+# ✅ SERP Dispatcher مرکزی (فقط با SERP_DISPATCH_MODE=stream)
+SERP_DISPATCH_MODE=$(python -c "from decouple import config; print(config('SERP_DISPATCH_MODE', default='direct'))")
+
+if [ "$SERP_DISPATCH_MODE" = "stream" ]; then
+    nohup python -u manage.py serp_dispatcher \
+        > logs/serp_dispatcher.log 2>&1 &
+
+    echo "🚦 Started SERP dispatcher"
+else
+    echo "⏭️ SERP dispatcher skipped (SERP_DISPATCH_MODE=$SERP_DISPATCH_MODE)"
+fi
+
 echo ""
 echo "✅ All workers started!"
-echo "📊 Total capacity: $(($NUM_WORKERS * 4)) parallel tasks"
+echo "📊 Total capacity: $(($NUM_WORKERS * 4)) parallel tasks + $(($NUM_AI_WORKERS * 4)) AI tasks"
 echo ""
 echo "Check logs:"
 echo "  tail -f logs/worker_1.log"
@@ -3,6 +3,7 @@
 
 echo "🛑 Stopping all workers..."
 pkill -9 -f celery
+pkill -f serp_dispatcher  # SIGTERM: Query های در جریان Ack میشن
 
 sleep 2
 